@@ -0,0 +1,72 @@
+"""
+Process-wide registry of Redis clients shared by the bot, consumer and notification services.
+
+Every process keeps one client per response mode: 'text' decodes responses to str,
+'binary' returns raw bytes for msgpack cards and seen sets. Both sit on a bounded
+BlockingConnectionPool sized from settings, so a burst of requests waits for a free
+connection instead of opening new sockets without limit. Clients are created lazily
+on first use, which keeps pools out of parent processes that fork workers.
+"""
+
+from typing import Dict
+
+from prometheus_client import Gauge
+from redis import asyncio as aioredis
+
+from config.settings import settings
+
+REDIS_POOL_CONNECTIONS = Gauge(
+    'redis_pool_connections',
+    'Connections of the shared Redis pool by state',
+    ['pool', 'state'],
+)
+
+_clients: Dict[str, aioredis.Redis] = {}
+
+
+def _create_pool(decode_responses: bool) -> aioredis.BlockingConnectionPool:
+    return aioredis.BlockingConnectionPool(
+        host=settings.REDIS_HOST,
+        port=int(settings.REDIS_PORT),
+        db=settings.REDIS_DB,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        decode_responses=decode_responses,
+    )
+
+
+def _observe_pool(name: str, pool: aioredis.BlockingConnectionPool) -> None:
+    # Gauges are read at scrape time, so they never lag behind the pool
+    REDIS_POOL_CONNECTIONS.labels(pool=name, state='in_use').set_function(lambda: len(pool._in_use_connections))
+    REDIS_POOL_CONNECTIONS.labels(pool=name, state='idle').set_function(lambda: len(pool._available_connections))
+
+
+def get_redis_client(decode_responses: bool = True) -> aioredis.Redis:
+    """
+    Get the shared Redis client of this process.
+
+    The client must not be closed by callers: it is reused for the lifetime of the process.
+
+    Args:
+        decode_responses: Decode responses to str; pass False for binary values
+
+    Returns:
+        Shared Redis client
+    """
+    name = 'text' if decode_responses else 'binary'
+    client = _clients.get(name)
+    if client is None:
+        pool = _create_pool(decode_responses)
+        _observe_pool(name, pool)
+        client = _clients[name] = aioredis.Redis(connection_pool=pool)
+    return client
+
+
+async def close_redis_clients() -> None:
+    """Close all shared clients and disconnect their pools."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.connection_pool.disconnect()
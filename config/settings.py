@@ -18,6 +18,11 @@ class Settings(BaseSettings):
 
     REDIS_HOST: str
     REDIS_PORT: str
+    REDIS_DB: int = 0
+    REDIS_MAX_CONNECTIONS: int = 50  # Максимум соединений в общем пуле Redis одного процесса
+    REDIS_POOL_TIMEOUT: int = 5  # Сколько секунд ждать свободное соединение, когда пул исчерпан
+    REDIS_SOCKET_KEEPALIVE: bool = True  # TCP keepalive, чтобы простаивающие соединения не обрывались молча
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # Через сколько секунд простоя проверять соединение PING перед командой
 
     # Добавляем MinIO настройки
     MINIO_URL: str  # = 'http://localhost:9000'
@@ -25,6 +30,35 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str  # = 'minioadmin'
     MINIO_BUCKET_NAME: str  # = 'documents'
 
+    # Настройки ранжирования анкет
+    # 'sql' - запрос в PostgreSQL, 'memory' - колоночный скорер в консюмере, 'pool' - готовые пулы сегментов в Redis,
+    # 'index' - колоночный скорер по кандидатам из инвертированного индекса
+    RANKING_ENGINE: str = 'sql'
+    DECK_MEMORY_MAX_USERS: int = 100000  # Сколько колод держит MemoryDeckStore в бенчмарках, старые вытесняются
+    DECK_MEMORY_MAX_CARDS: int = 500000  # Сколько карточек анкет держит MemoryDeckStore в бенчмарках
+    DECK_TTL: int = 86400  # Сколько секунд колода анкет живет в Redis после записи
+    DECK_LOW_WATERMARK: int = 2  # При скольких оставшихся анкетах бот заранее просит пополнить колоду
+    DECK_REFILL_FLAG_TTL: int = 30  # Через сколько секунд можно повторить запрос пополнения, если колода не пришла
+    SWIPE_GUARD_TTL: int = 5  # Сколько секунд повторное нажатие кнопки под той же карточкой считается дублем
+    DECK_WAIT_TTL: int = 300  # Сколько секунд бот ждет колоду, чтобы сам показать первую анкету вместо "Обновить"
+    USER_IDLE_DAYS: int = 14  # Через сколько дней без активности удалять колоду и лайки пользователя из Redis
+    IDLE_SWEEP_INTERVAL: int = 3600  # Как часто (в секундах) искать в Redis ключи неактивных пользователей
+    OUTBOX_MAX_SIZE: int = 1000  # Сколько событий свайпов бот держит до публикации в RabbitMQ, дальше свайпы ждут
+    OUTBOX_BATCH_SIZE: int = 50  # Сколько событий публиковать за один захват канала
+    CARD_CACHE_SIZE: int = 10000  # Сколько карточек анкет бот держит в памяти (0 - кэш выключен)
+    RANKING_SNAPSHOT_TTL: int = 60  # Как часто (в секундах) перечитывать снимок пользователей для 'memory'
+    RANKING_CURSOR_EPOCH: int = 600  # Сколько секунд курсор выдачи считается актуальным до пересортировки с начала
+    SEARCH_BATCH_WINDOW_MS: int = 10  # Сколько миллисекунд копить запросы поиска перед пакетным ранжированием
+    SEARCH_BATCH_MAX_SIZE: int = 10  # Максимум пользователей в одной пачке
+    RANKING_RECIPROCAL: bool = False  # Поднимать кандидатов, чьим предпочтениям подходит и сам пользователь
+    CITY_DISTANCE_DECAY_KM: int = 300  # На каком расстоянии бонус за близость города падает в e раз
+    SIMILARITY_REBUILD_INTERVAL: int = 600  # Как часто (в секундах) перестраивать индекс похожих профилей
+    SIMILAR_RECENT_LIKES: int = 10  # По скольким последним лайкам искать похожие профили
+    COLIKE_MATRIX_PATH: str = '/tmp/colike_matrix.bin'  # Файл матрицы совместных лайков, читается через mmap
+    COLIKE_REBUILD_INTERVAL: int = 900  # Как часто (в секундах) scripts/build_colike_matrix.py перестраивает матрицу
+    COLIKE_TOP_N: int = 50  # Сколько соседей хранить для каждого профиля
+    COLIKE_DECK_SLOTS: int = 2  # Сколько мест в колоде отдавать кандидатам из матрицы совместных лайков
+
     @property
     def db_url(self) -> str:
         return f'postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}'
@@ -1,3 +1,4 @@
+import asyncio
 import logging.config
 from collections import defaultdict
 
@@ -8,21 +9,45 @@ from consumer.handlers.registration import handle_registration
 from consumer.handlers.upload_file import upload_file_handler
 from consumer.handlers.show_file import show_files
 from consumer.handlers.profile import handle_profile_redis_update
-from consumer.handlers.interaction import handle_like, handle_dislike
+from consumer.handlers.interaction import handle_like, handle_dislike, handle_similar
+from consumer.handlers.profile_update import handle_profile_update
 from consumer.logger import LOGGING_CONFIG, correlation_id_ctx, logger
 from consumer.metrics import TOTAL_RECEIVED_MESSAGES
 from consumer.schema.registration import RegistrationMessage
 from consumer.schema.file import FileMessage
+from consumer.schema.profile import ProfileUpdateMessage
 from consumer.schema.interaction import InteractionMessage
 from consumer.storage import rabbit
-from consumer.services.profile_service import load_and_store_matching_profiles
-from consumer.storage.db import async_session
+from consumer.services.search_batcher import search_batcher
 
 
 # Track processed messages per user
 processed_messages = defaultdict(int)
 # Batch size for triggering profile updates
 BATCH_SIZE = 10
+# Search messages waiting for their batch to be ranked
+search_tasks: set[asyncio.Task] = set()
+
+
+def get_search_user_id(body: bytes) -> int | None:
+    """Return user_id if the message is a search request, otherwise None."""
+    try:
+        message = InteractionMessage.model_validate(msgpack.unpackb(body))
+    except Exception:
+        return None
+    return message.user_id if message.action == 'search' else None
+
+
+async def process_search_message(message: aio_pika.abc.AbstractIncomingMessage, user_id: int) -> None:
+    async with message.process():
+        correlation_id_ctx.set(message.correlation_id or 'default_correlation_id')
+        logger.info('Search request received for user %s', user_id)
+
+        try:
+            await search_batcher.submit(user_id)
+            logger.info('Matching profiles loaded for user %s', user_id)
+        except Exception as e:
+            logger.error('Error processing search for user %s: %s', user_id, e)
 
 
 async def start_consumer() -> None:
@@ -51,6 +76,15 @@ async def start_consumer() -> None:
         async with queue.iterator() as queue_iter:
             async for message in queue_iter:
                 TOTAL_RECEIVED_MESSAGES.inc()
+
+                search_user_id = get_search_user_id(message.body)
+                if search_user_id is not None:
+                    # Searches are ranked in batches, so don't block the queue while one is pending
+                    task = asyncio.create_task(process_search_message(message, search_user_id))
+                    search_tasks.add(task)
+                    task.add_done_callback(search_tasks.discard)
+                    continue
+
                 async with message.process():
                     # Set correlation_id if available, otherwise use a default
                     correlation_id = message.correlation_id or 'default_correlation_id'
@@ -61,6 +95,8 @@ async def start_consumer() -> None:
                         try:
                             body: InteractionMessage = InteractionMessage.model_validate(msgpack.unpackb(message.body))
                             logger.info('Interaction message received: %s', body)
+                            # A search published before this swipe is ranked first, so batching keeps the user's order
+                            await search_batcher.wait_for(body.user_id)
 
                             if body.action == 'like':
                                 await handle_like(body)
@@ -94,28 +130,12 @@ async def start_consumer() -> None:
                                     )
                                     # Reset counter
                                     processed_messages[body.user_id] = 0
-                            elif body.action == 'search':
-                                # Handle search request
-                                async with async_session() as db:
-                                    # Get user preferences from profile
-                                    from sqlalchemy import select
-                                    from src.model.profile import Profile
-
-                                    result = await db.execute(select(Profile).where(Profile.user_id == body.user_id))
-                                    profile = result.scalar_one_or_none()
-
-                                    if profile:
-                                        # Load and store matching profiles
-                                        await load_and_store_matching_profiles(
-                                            db=db,
-                                            user_id=body.user_id,
-                                            preferred_gender=profile.preferred_gender,
-                                            preferred_age_min=profile.preferred_age_min,
-                                            preferred_age_max=profile.preferred_age_max,
-                                        )
-                                        logger.info('Matching profiles loaded for user %s', body.user_id)
-                                    else:
-                                        logger.warning('Profile not found for user %s', body.user_id)
+                            elif body.action == 'similar':
+                                await handle_similar(body)
+                            elif body.action == 'profile_update':
+                                await handle_profile_update(
+                                    ProfileUpdateMessage.model_validate(msgpack.unpackb(message.body))
+                                )
                             else:
                                 logger.warning('Unknown interaction action: %s', body.action)
 
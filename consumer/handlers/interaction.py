@@ -1,7 +1,8 @@
 from consumer.logger import logger
 from consumer.services.interaction_service import process_like, process_dislike
+from consumer.services.similarity import load_and_store_similar_profiles
 from consumer.storage import get_db_session
-from src.api.producer import send_profile_request
+from consumer.storage.redis import publish_deck_ready
 
 
 async def handle_like(body: dict) -> None:
@@ -28,10 +29,6 @@ async def handle_like(body: dict) -> None:
             success = await process_like(db, user_id, target_user_id)
             if success:
                 logger.info('Successfully processed like from user %s to user %s', user_id, target_user_id)
-
-                # Отправляем запрос на обновление профилей
-                await send_profile_request(user_id, action='search')
-                logger.info('Profile update request sent for user %s after like', user_id)
             else:
                 logger.warning('Failed to process like from user %s to user %s', user_id, target_user_id)
 
@@ -67,10 +64,6 @@ async def handle_dislike(body: dict) -> None:
             success = await process_dislike(db, user_id, target_user_id)
             if success:
                 logger.info('Successfully processed dislike from user %s to user %s', user_id, target_user_id)
-
-                # Отправляем запрос на обновление профилей
-                await send_profile_request(user_id, action='search')
-                logger.info('Profile update request sent for user %s after dislike', user_id)
             else:
                 logger.warning('Failed to process dislike from user %s to user %s', user_id, target_user_id)
 
@@ -80,3 +73,28 @@ async def handle_dislike(body: dict) -> None:
         import traceback
 
         logger.error('Traceback: %s', traceback.format_exc())
+
+
+async def handle_similar(body: dict) -> None:
+    """
+    Обрабатывает запрос на подборку профилей, похожих на понравившиеся.
+
+    Args:
+        body: Тело сообщения с ID пользователя
+    """
+    profiles = []
+    try:
+        logger.info('Received similar profiles request with data: %s', body)
+
+        async with get_db_session() as db:
+            profiles = await load_and_store_similar_profiles(db, body.user_id)
+
+    except Exception as e:
+        logger.error('Error handling similar profiles request with data %s: %s', body, str(e))
+
+    if not profiles:
+        # Новая колода не записана, но бот ждет события, чтобы заменить сообщение "подбираем анкеты"
+        try:
+            await publish_deck_ready(body.user_id)
+        except Exception as e:
+            logger.error('Failed to notify the bot about an empty similar deck for user %s: %s', body.user_id, e)
@@ -1,57 +1,73 @@
-from consumer.services.user import update_user
-from consumer.services.profile import update_profile
-from consumer.model.user import User
-from consumer.model.profile import Profile
+from sqlalchemy import select
+
+from config.settings import settings
+from consumer.handlers.registration import get_or_create_city
 from consumer.logger import logger
+from consumer.schema.profile import ProfileUpdateMessage
+from consumer.services.pools import refresh_pool_member
+from consumer.services.profile_service import refresh_profile_card
+from consumer.storage.db import async_session
+from src.model.profile import Profile
+from src.model.user import User
+from src.services.eligibility import refresh_accepts_masks
+
+# Поля пользователя, которые меняются как есть
+USER_FIELDS = {'first_name', 'age', 'gender', 'username'}
+# Поля анкеты, которые меняются как есть
+PROFILE_FIELDS = {'bio', 'photo_url', 'preferred_gender'}
+# Поля, от которых зависит маска предпочтений для взаимного ранжирования
+PREFERENCE_FIELDS = {'preferred_gender', 'preferred_age_range'}
+# Поля, по которым анкета лежит в сегментах пулов кандидатов
+SEGMENT_FIELDS = {'age', 'gender', 'city_name'}
+
 
+async def handle_profile_update(message: ProfileUpdateMessage) -> None:
+    """
+    Применяет правку анкеты из бота и обновляет все, что от нее зависит.
 
-async def handle_profile_update(message: dict):
-    """Handle profile update messages from the queue."""
+    Args:
+        message: Сообщение с ID пользователя, измененным полем и его новым значением
+    """
     try:
-        user_id = message['user_id']
-        field = message['field']
-        value = message['value']
-        username = message.get('username')  # Get username from message
-
-        if field in ['first_name', 'age', 'gender', 'city_id', 'username']:
-            # Update user fields
-            user = await User.get(user_id)
-            if not user:
-                logger.error('User %s not found', user_id)
-                return
+        user_id = message.user_id
+        field = message.field
+        value = message.value
 
-            setattr(user, field, value)
-            if username:  # If username is provided, update it
-                user.username = username
-            await update_user(user)
-            logger.info('Updated user %s field %s to %s', user_id, field, value)
+        async with async_session() as db:
+            user = (await db.execute(select(User).where(User.user_id == user_id))).scalar_one_or_none()
+            profile = (await db.execute(select(Profile).where(Profile.user_id == user_id))).scalar_one_or_none()
+            if not user or not profile:
+                logger.error('User or profile %s not found', user_id)
+                return
 
-        elif field in ['bio', 'photo_url', 'preferred_gender']:
-            # Update profile fields
-            profile = await Profile.get(user_id)
-            if not profile:
-                logger.error('Profile for user %s not found', user_id)
+            if field in USER_FIELDS:
+                setattr(user, field, value)
+            elif field == 'city_name':
+                city = await get_or_create_city(db, value)
+                user.city_id = city.city_id
+            elif field in PROFILE_FIELDS:
+                setattr(profile, field, value)
+            elif field == 'preferred_age_range':
+                profile.preferred_age_min = value['min']
+                profile.preferred_age_max = value['max']
+            else:
+                logger.error('Unknown field %s for user %s', field, user_id)
                 return
 
-            setattr(profile, field, value)
-            await update_profile(profile)
-            logger.info('Updated profile %s field %s to %s', user_id, field, value)
+            if field in PREFERENCE_FIELDS:
+                # Иначе кандидаты продолжат ранжироваться по старым предпочтениям этого пользователя
+                await db.flush()
+                await refresh_accepts_masks(db, [user_id])
 
-        elif field == 'preferred_age_range':
-            # Update preferred age range
-            profile = await Profile.get(user_id)
-            if not profile:
-                logger.error('Profile for user %s not found', user_id)
-                return
+            await db.commit()
 
-            profile.preferred_age_min = value['min']
-            profile.preferred_age_max = value['max']
-            await update_profile(profile)
-            logger.info('Updated profile %s preferred age range to %s', user_id, value)
+            # Обновляем общую карточку анкеты во всех колодах, где она уже есть
+            await refresh_profile_card(db, user_id)
 
-        else:
-            logger.error('Unknown field %s for user %s', field, user_id)
+            if field in SEGMENT_FIELDS and settings.RANKING_ENGINE == 'pool':
+                await refresh_pool_member(db, user_id)
+
+            logger.info('Updated user %s field %s to %s', user_id, field, value)
 
     except Exception as e:
         logger.error('Error processing profile update: %s', str(e))
-        raise
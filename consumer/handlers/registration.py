@@ -1,19 +1,17 @@
-<<<<<<< HEAD
-from sqlalchemy import select, func
-=======
 from sqlalchemy import select
->>>>>>> main
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config.settings import settings
 from consumer.logger import logger
 from consumer.schema.registration import RegistrationMessage
 from consumer.storage.db import async_session
-<<<<<<< HEAD
-from consumer.services.profile_service import load_and_store_matching_profiles
+from consumer.services.pools import refresh_pool_member
+from consumer.services.profile_service import load_and_store_matching_profiles, refresh_profile_card
 from src.model.city import City
 from src.model.profile import Profile
 from src.model.user import User
 from src.model.rating import Rating
+from src.services.eligibility import refresh_accepts_masks
 
 
 async def get_or_create_city(db: AsyncSession, city_name: str | None) -> City:
@@ -22,15 +20,6 @@ async def get_or_create_city(db: AsyncSession, city_name: str | None) -> City:
     if not city_name:
         city_name = 'Сочи'
 
-=======
-from src.model.city import City
-from src.model.profile import Profile
-from src.model.user import User
-
-
-async def get_or_create_city(db: AsyncSession, city_name: str) -> City:
-    """Получает существующий город или создает новый."""
->>>>>>> main
     # Ищем город по имени
     result = await db.execute(select(City).where(City.name == city_name))
     city = result.scalar_one_or_none()
@@ -51,7 +40,6 @@ async def handle_registration(message: RegistrationMessage) -> None:
             # Получаем или создаем город
             city = await get_or_create_city(db, message.user.city_name)
 
-<<<<<<< HEAD
             # Проверяем и форматируем username
             username = message.user.username
             if username and not username.startswith('@'):
@@ -112,49 +100,32 @@ async def handle_registration(message: RegistrationMessage) -> None:
                 )
                 db.add(profile)
 
+            # Пересобираем битовую маску предпочтений для взаимного ранжирования;
+            # autoflush выключен, поэтому анкету сначала записываем, иначе маска соберется по старым значениям
+            await db.flush()
+            await refresh_accepts_masks(db, [message.profile.user_id])
+
             # Сохраняем изменения
             await db.commit()
 
+            # Обновляем общую карточку анкеты во всех колодах, где она уже есть
+            await refresh_profile_card(db, message.user.user_id)
+
             # Загружаем и сохраняем подходящие профили в Redis
             await load_and_store_matching_profiles(
                 db=db,
                 user_id=message.user.user_id,
-=======
-            # Создаем запись пользователя
-            user = User(
-                user_id=message.user.user_id,
-                first_name=message.user.first_name,
-                last_name=message.user.last_name,
-                age=message.user.age,
-                gender=message.user.gender,
-                city_id=city.city_id,
-            )
-            db.add(user)
-
-            # Создаем запись профиля
-            profile = Profile(
-                user_id=message.profile.user_id,
-                bio=message.profile.bio,
-                photo_url=message.profile.photo_url,
->>>>>>> main
                 preferred_gender=message.profile.preferred_gender,
                 preferred_age_min=message.profile.preferred_age_min,
                 preferred_age_max=message.profile.preferred_age_max,
             )
-<<<<<<< HEAD
+
+            if settings.RANKING_ENGINE == 'pool':
+                # Добавляем анкету в пул кандидатов ее сегмента
+                await refresh_pool_member(db, message.user.user_id)
 
             logger.info('User %s registered successfully', message.user.user_id)
 
     except Exception as e:
         logger.error('Error handling registration: %s', e)
-=======
-            db.add(profile)
-
-            # Сохраняем изменения
-            await db.commit()
-
-        logger.info('Пользователь %s успешно зарегистрирован. Профиль создан.', message.user.user_id)
-    except Exception as e:
-        logger.error('Ошибка при регистрации пользователя %s: %s', message.user.user_id, e)
->>>>>>> main
         raise
@@ -1,7 +1,48 @@
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 # sum(increase(counter_handler_total{handler='method_funcio...'}[1m]))
 TOTAL_RECEIVED_MESSAGES = Counter(
     'received_messages',
     'Считает полученные сообщения',
 )
+
+SEARCH_BATCH_SIZE = Histogram(
+    'search_batch_size',
+    'Сколько пользователей ранжируется одной пачкой',
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+
+SEGMENT_INDEX_USERS = Gauge(
+    'segment_index_users',
+    'Сколько анкет в инвертированном индексе по городу, полу и возрасту',
+)
+
+SEGMENT_INDEX_POSTINGS = Gauge(
+    'segment_index_postings',
+    'Суммарная длина списков user_id в инвертированном индексе',
+    ['dimension'],
+)
+
+SEGMENT_INDEX_BYTES = Gauge(
+    'segment_index_bytes',
+    'Сколько байт занимают списки user_id в инвертированном индексе',
+    ['dimension'],
+)
+
+USER_KEYS = Gauge(
+    'redis_user_keys',
+    'Сколько пользовательских ключей в Redis по видам (колоды, курсоры, лайки)',
+    ['kind'],
+)
+
+USER_KEY_BYTES = Gauge(
+    'redis_user_key_bytes',
+    'Примерный объем пользовательских ключей в Redis по видам',
+    ['kind'],
+)
+
+EVICTED_USER_KEYS = Counter(
+    'redis_evicted_user_keys',
+    'Сколько ключей неактивных пользователей удалено из Redis',
+    ['kind'],
+)
@@ -2,8 +2,8 @@ from pydantic import BaseModel
 
 
 class InteractionMessage(BaseModel):
-    """Schema for interaction messages (like/dislike/search)."""
+    """Schema for interaction messages (like/dislike/search/similar)."""
 
     user_id: int
-    action: str  # 'like', 'dislike', 'search'
+    action: str  # 'like', 'dislike', 'search', 'similar'
     target_user_id: int | None = None
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Optional
 
 from pydantic import BaseModel, Field
 
@@ -25,3 +25,12 @@ class ProfileInDB(ProfileBase):
 
     class Config:
         from_attributes = True
+
+
+class ProfileUpdateMessage(BaseModel):
+    """Schema for profile edit messages: one changed field of a user or a profile."""
+
+    user_id: int
+    action: str  # 'profile_update'
+    field: str  # 'first_name', 'age', 'gender', 'city_name', 'bio', 'photo_url', 'preferred_gender', ...
+    value: Any
@@ -0,0 +1,330 @@
+import asyncio
+import heapq
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from consumer.logger import logger
+from consumer.model.interaction import Like
+from consumer.services.scoring import candidate_scorer
+from consumer.services.seen import load_seen_profiles_batch
+from consumer.storage.redis import get_colike_states
+
+# Заголовок файла: сигнатура, количество профилей и количество ненулевых элементов
+MATRIX_MAGIC = b'CLK1'
+MATRIX_HEADER = struct.Struct('<4s4xqq')
+
+# Сколько последних лайков пользователя учитывать при построении матрицы
+MAX_LIKES_PER_USER = 200
+
+# По скольким последним лайкам пользователя искать соседей
+COLIKE_SEEDS = 20
+
+# Сколько пар профилей копить перед сворачиванием в уникальные при построении матрицы
+PAIR_CHUNK_SIZE = 5_000_000
+
+
+def count_co_likes(likes: list[tuple[int, int]]) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Считает, сколько раз каждые два профиля лайкнул один и тот же пользователь.
+
+    Пары профилей кодируются одним int64 и сворачиваются np.unique порциями,
+    так что в памяти держатся только различные пары, а не все Σk² совпадений.
+
+    Args:
+        likes: Пары (кто лайкнул, кого лайкнули), последние лайки каждого пользователя первыми
+
+    Returns:
+        tuple: ID профилей, число лайков каждого профиля, коды пар (a * n + b) и их счетчики
+    """
+    pairs = np.array(likes, dtype=np.int64).reshape(-1, 2)
+    user_ids, target_user_ids = pairs[:, 0], pairs[:, 1]
+
+    # Оставляем MAX_LIKES_PER_USER последних лайков каждого пользователя
+    starts = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1]]) if len(user_ids) else np.empty(0, np.int64)
+    lengths = np.diff(np.r_[starts, len(user_ids)])
+    positions = np.arange(len(user_ids)) - np.repeat(starts, lengths)
+    kept = positions < MAX_LIKES_PER_USER
+    user_ids, target_user_ids = user_ids[kept], target_user_ids[kept]
+
+    item_ids, items = np.unique(target_user_ids, return_inverse=True)
+    like_counts = np.bincount(items, minlength=len(item_ids))
+    size = len(item_ids)
+
+    # Каждая порция сворачивается отдельно, в конце порции сливаются одним проходом
+    reduced_keys: list[np.ndarray] = []
+    reduced_counts: list[np.ndarray] = []
+    chunk: list[np.ndarray] = []
+    chunk_size = 0
+
+    def reduce_chunk() -> None:
+        nonlocal chunk, chunk_size
+        chunk_keys, chunk_counts = np.unique(np.concatenate(chunk), return_counts=True)
+        reduced_keys.append(chunk_keys)
+        reduced_counts.append(chunk_counts)
+        chunk, chunk_size = [], 0
+
+    boundaries = np.flatnonzero(np.r_[True, user_ids[1:] != user_ids[:-1], True]) if len(user_ids) else [0]
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        group = items[start:end]
+        if len(group) < 2:
+            continue
+        a, b = np.meshgrid(group, group, indexing='ij')
+        mask = a != b
+        chunk.append(a[mask] * size + b[mask])
+        chunk_size += len(chunk[-1])
+        if chunk_size >= PAIR_CHUNK_SIZE:
+            reduce_chunk()
+    if chunk:
+        reduce_chunk()
+
+    if len(reduced_keys) == 1:
+        keys, counts = reduced_keys[0], reduced_counts[0]
+    elif reduced_keys:
+        keys, inverse = np.unique(np.concatenate(reduced_keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(reduced_counts), minlength=len(keys)).astype(np.int64)
+    else:
+        keys, counts = np.empty(0, np.int64), np.empty(0, np.int64)
+
+    return item_ids, like_counts, keys, counts
+
+
+def build_matrix(likes: list[tuple[int, int]], top_n: int, path: str) -> int:
+    """
+    Считает матрицу сходства профилей по совместным лайкам и записывает ее в файл.
+
+    Сходство двух профилей - косинус их векторов лайкнувших:
+    co_likes / sqrt(likes_a * likes_b). Для каждого профиля хранятся top_n соседей
+    в формате CSR: item_ids, indptr, indices, scores.
+
+    Args:
+        likes: Пары (кто лайкнул, кого лайкнули), последние лайки каждого пользователя первыми
+        top_n: Сколько соседей хранить для профиля
+        path: Куда записать матрицу
+
+    Returns:
+        int: Количество профилей в матрице
+    """
+    item_ids, like_counts, keys, counts = count_co_likes(likes)
+    size = len(item_ids)
+    rows, columns = np.divmod(keys, max(size, 1))
+    similarity = counts / np.sqrt(like_counts[rows] * like_counts[columns])
+
+    # Внутри строки - по убыванию сходства, при равенстве - по убыванию ID соседа: ключи пар
+    # отсортированы по (строка, столбец), а устойчивая сортировка развернутого порядка сохраняет
+    # столбцы по убыванию среди равных
+    order = len(keys) - 1 - np.lexsort((-similarity[::-1], rows[::-1]))
+    rows, columns, similarity = rows[order], columns[order], similarity[order]
+    row_starts = np.searchsorted(rows, np.arange(size))
+    kept = np.arange(len(rows)) - row_starts[rows] < top_n
+    rows, columns, similarity = rows[kept], columns[kept], similarity[kept]
+
+    indptr = np.zeros(size + 1, np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    indices = item_ids[columns].astype(np.int64)
+    scores = similarity.astype(np.float32)
+
+    # Пишем во временный файл и подменяем атомарно, чтобы читатели не увидели его недописанным
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MATRIX_HEADER.pack(MATRIX_MAGIC, size, len(indices)))
+        item_ids.astype(np.int64).tofile(f)
+        indptr.tofile(f)
+        indices.tofile(f)
+        scores.tofile(f)
+    os.replace(tmp_path, path)
+
+    return size
+
+
+async def rebuild_colike_matrix(db: AsyncSession) -> None:
+    """
+    Перестраивает файл матрицы совместных лайков по таблице лайков.
+
+    Args:
+        db: Сессия базы данных
+    """
+    result = await db.execute(select(Like.user_id, Like.target_user_id).order_by(Like.user_id, Like.created_at.desc()))
+    likes = result.all()
+    items = await asyncio.to_thread(build_matrix, likes, settings.COLIKE_TOP_N, settings.COLIKE_MATRIX_PATH)
+    logger.info('Co-like matrix rebuilt: %d profiles from %d likes', items, len(likes))
+
+
+class ColikeMatrix:
+    """
+    Матрица совместных лайков, отображенная в память.
+
+    Файл пишет одна задача по расписанию (scripts/build_colike_matrix.py) в общий для
+    реплик консюмера каталог, читатели открывают его через mmap и переоткрывают,
+    когда файл подменили.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.mtime = 0
+        self.item_ids: memoryview | None = None
+        self.indptr: memoryview | None = None
+        self.indices: memoryview | None = None
+        self.scores: memoryview | None = None
+
+    def refresh(self) -> None:
+        """Переоткрывает файл, если он изменился с прошлого раза."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self.mtime:
+            return
+
+        with open(self.path, 'rb') as f:
+            buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        magic, items, nnz = MATRIX_HEADER.unpack_from(buffer)
+        if magic != MATRIX_MAGIC:
+            logger.error('Unexpected co-like matrix file format: %s', self.path)
+            return
+
+        # Старое отображение закроется само, когда на него не останется ссылок
+        offset = MATRIX_HEADER.size
+        self.item_ids = buffer[offset : offset + items * 8].cast('q')
+        offset += items * 8
+        self.indptr = buffer[offset : offset + (items + 1) * 8].cast('q')
+        offset += (items + 1) * 8
+        self.indices = buffer[offset : offset + nnz * 8].cast('q')
+        offset += nnz * 8
+        self.scores = buffer[offset : offset + nnz * 4].cast('f')
+        self.mtime = mtime
+
+        logger.info('Co-like matrix mapped: %d profiles', items)
+
+    def get_neighbours(self, user_id: int) -> list[tuple[float, int]]:
+        """
+        Соседи профиля по совместным лайкам.
+
+        Args:
+            user_id: ID профиля
+
+        Returns:
+            list: Пары (сходство, user_id соседа) по убыванию сходства
+        """
+        if self.item_ids is None:
+            return []
+
+        row = bisect_left(self.item_ids, user_id)
+        if row == len(self.item_ids) or self.item_ids[row] != user_id:
+            return []
+
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return list(zip(self.scores[start:end], self.indices[start:end]))
+
+    def recommend(self, liked_user_ids: list[int]) -> dict[int, float]:
+        """
+        Суммирует сходство соседей всех понравившихся профилей.
+
+        Args:
+            liked_user_ids: ID профилей, которые лайкнул пользователь
+
+        Returns:
+            dict: user_id кандидата -> суммарное сходство
+        """
+        scores: dict[int, float] = defaultdict(float)
+        for liked_user_id in liked_user_ids:
+            for score, neighbour in self.get_neighbours(liked_user_id):
+                scores[neighbour] += score
+        return scores
+
+
+async def get_colike_candidates_batch(
+    db: AsyncSession, requests: list[tuple[int, int, set[int], str | None, int | None, int | None]]
+) -> dict[int, list[tuple[float, int]]]:
+    """
+    Подбирает кандидатов из матрицы совместных лайков сразу для нескольких пользователей.
+
+    Пропускает уже просмотренные профили, профили из текущей колоды пользователя и тех,
+    кто не подходит под его предпочтения по полу и возрасту. Лайки и колоды читаются
+    одним pipeline, просмотренные - одним запросом, а пол и возраст кандидатов берутся
+    из снимка ранжирования, без SQL-запроса на каждый поиск.
+
+    Args:
+        db: Сессия базы данных
+        requests: Кортежи (user_id, количество профилей, ID профилей, уже попавших в выдачу,
+            предпочтительный пол, минимальный и максимальный предпочтительный возраст)
+
+    Returns:
+        dict: user_id -> пары (сходство, user_id) по убыванию сходства
+    """
+    requests = [request for request in requests if request[1] > 0]
+    if not requests:
+        return {}
+
+    states = await get_colike_states([user_id for user_id, *_ in requests], COLIKE_SEEDS)
+    colike_matrix.refresh()
+
+    scores = {}
+    for user_id, _, exclude, *_ in requests:
+        liked_user_ids, deck = states[user_id]
+        skip = exclude.union(deck, [user_id])
+        user_scores = {
+            candidate_id: score
+            for candidate_id, score in colike_matrix.recommend(liked_user_ids).items()
+            if candidate_id not in skip
+        }
+        if user_scores:
+            scores[user_id] = user_scores
+    if not scores:
+        return {}
+
+    await candidate_scorer.ensure_fresh(db)
+    seen = await load_seen_profiles_batch(db, list(scores))
+
+    candidates = {}
+    for user_id, limit, _, preferred_gender, preferred_age_min, preferred_age_max in requests:
+        if user_id not in scores:
+            continue
+        kept = candidate_scorer.filter_candidates(
+            scores[user_id], preferred_gender, preferred_age_min, preferred_age_max, seen[user_id]
+        )
+        candidates[user_id] = heapq.nlargest(
+            limit, [(scores[user_id][candidate_id], candidate_id) for candidate_id in kept]
+        )
+    return candidates
+
+
+async def get_colike_candidates(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    exclude: set[int],
+    preferred_gender: str | None = None,
+    preferred_age_min: int | None = None,
+    preferred_age_max: int | None = None,
+) -> list[tuple[float, int]]:
+    """
+    Подбирает кандидатов, которых лайкали вместе с недавно лайкнутыми пользователем профилями.
+
+    Args:
+        db: Сессия базы данных
+        user_id: ID пользователя, для которого ищем профили
+        limit: Количество профилей
+        exclude: ID профилей, уже попавших в выдачу
+        preferred_gender: Предпочтительный пол
+        preferred_age_min: Минимальный предпочтительный возраст
+        preferred_age_max: Максимальный предпочтительный возраст
+
+    Returns:
+        list: Пары (сходство, user_id) по убыванию сходства
+    """
+    candidates = await get_colike_candidates_batch(
+        db, [(user_id, limit, exclude, preferred_gender, preferred_age_min, preferred_age_max)]
+    )
+    return candidates.get(user_id, [])
+
+
+colike_matrix = ColikeMatrix(settings.COLIKE_MATRIX_PATH)
@@ -0,0 +1,32 @@
+import asyncio
+
+from config.settings import settings
+from consumer.logger import logger
+from consumer.metrics import EVICTED_USER_KEYS, USER_KEY_BYTES, USER_KEYS
+from consumer.storage.redis import USER_KEY_PATTERNS, sweep_idle_keys
+
+
+async def sweep_idle_users() -> None:
+    """
+    Удаляет из Redis колоды, курсоры, лайки и множества просмотренных профилей пользователей, неактивных дольше USER_IDLE_DAYS.
+
+    Заодно обновляет метрики количества и объема оставшихся ключей.
+    """
+    max_idle = settings.USER_IDLE_DAYS * 24 * 60 * 60
+    for kind, pattern in USER_KEY_PATTERNS.items():
+        kept, size, evicted = await sweep_idle_keys(pattern, max_idle)
+        USER_KEYS.labels(kind=kind).set(kept)
+        USER_KEY_BYTES.labels(kind=kind).set(size)
+        EVICTED_USER_KEYS.labels(kind=kind).inc(evicted)
+        logger.info('Idle sweep of %s keys: %d kept (%d bytes), %d evicted', kind, kept, size, evicted)
+
+
+async def run_idle_sweeps() -> None:
+    """Периодически чистит Redis от ключей неактивных пользователей в фоне."""
+    while True:
+        try:
+            await sweep_idle_users()
+        except Exception as e:
+            logger.error('Failed to sweep idle user keys: %s', e)
+
+        await asyncio.sleep(settings.IDLE_SWEEP_INTERVAL)
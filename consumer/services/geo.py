@@ -0,0 +1,110 @@
+import asyncio
+import math
+from array import array
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from consumer.logger import logger
+from consumer.services.scoring import CITY_MULTIPLIER
+from src.model.city import City
+
+EARTH_RADIUS_KM = 6371.0
+
+# Множители ближе к 1, чем этот порог, считаем единицей, чтобы строка множителей оставалась короткой
+MIN_CITY_FACTOR = 1.01
+
+
+def get_distance_km(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+    """Расстояние между двумя точками по формуле гаверсинусов."""
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    d_phi = other_phi - phi
+    d_lambda = math.radians(other_longitude - longitude)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi) * math.cos(other_phi) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class CityDistanceMatrix:
+    """
+    Плотная матрица множителей скора за близость городов.
+
+    Для своего города множитель равен CITY_MULTIPLIER, для остальных затухает
+    с расстоянием: 1 + (CITY_MULTIPLIER - 1) * exp(-distance / decay_km).
+    Считается один раз по таблице городов, при ранжировании тригонометрии нет.
+    """
+
+    def __init__(self, decay_km: int) -> None:
+        self.decay_km = decay_km
+        # city_id -> номер строки и столбца в матрице
+        self.indexes: dict[int, int] = {}
+        self.factors = array('d')
+        self.loaded = False
+        self._lock = asyncio.Lock()
+
+    async def load(self, db: AsyncSession) -> None:
+        """
+        Строит матрицу по городам из БД.
+
+        Args:
+            db: Сессия базы данных
+        """
+        result = await db.execute(select(City.city_id, City.latitude, City.longitude).order_by(City.city_id))
+        cities = result.all()
+
+        size = len(cities)
+        factors = array('d', [1.0]) * (size * size)
+        for row, (_, latitude, longitude) in enumerate(cities):
+            factors[row * size + row] = CITY_MULTIPLIER
+            if latitude is None or longitude is None:
+                continue
+            for column in range(row + 1, size):
+                _, other_latitude, other_longitude = cities[column]
+                if other_latitude is None or other_longitude is None:
+                    continue
+                distance = get_distance_km(latitude, longitude, other_latitude, other_longitude)
+                factor = 1 + (CITY_MULTIPLIER - 1) * math.exp(-distance / self.decay_km)
+                factors[row * size + column] = factors[column * size + row] = factor
+
+        self.indexes = {city_id: index for index, (city_id, _, _) in enumerate(cities)}
+        self.factors = factors
+        self.loaded = True
+
+        logger.info('City distance matrix built for %d cities', size)
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        """Строит матрицу, если она еще не построена."""
+        if self.loaded:
+            return
+
+        async with self._lock:
+            if not self.loaded:
+                await self.load(db)
+
+    def get_row(self, city_id: int | None) -> dict[int, float]:
+        """
+        Множители для всех городов, заметно отличающиеся от 1.
+
+        Args:
+            city_id: Город пользователя
+
+        Returns:
+            dict: city_id кандидата -> множитель
+        """
+        if city_id is None:
+            return {}
+
+        row = self.indexes.get(city_id)
+        if row is None:
+            return {city_id: CITY_MULTIPLIER}
+
+        size = len(self.indexes)
+        factors = {}
+        for other_city_id, column in self.indexes.items():
+            factor = self.factors[row * size + column]
+            if factor >= MIN_CITY_FACTOR:
+                factors[other_city_id] = factor
+        return factors
+
+
+city_distances = CityDistanceMatrix(settings.CITY_DISTANCE_DECAY_KM)
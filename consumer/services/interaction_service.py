@@ -1,13 +1,39 @@
 from sqlalchemy import select, and_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config.settings import settings
 from consumer.logger import logger
+from consumer.services.pools import refresh_pool_score
+from consumer.services.scoring import candidate_scorer
+from consumer.services.seen import mark_profile_seen
 from consumer.storage.redis import store_like
+from src.model.interaction_counter import InteractionCounter
 from src.model.user import User
 from consumer.model.interaction import Like, Dislike
 from consumer.model.rating import Rating
 
 
+async def increment_counters(db: AsyncSession, user_id: int, **deltas: int) -> None:
+    """
+    Увеличивает счетчики взаимодействий пользователя в текущей транзакции.
+
+    Args:
+        db: Сессия базы данных
+        user_id: ID пользователя
+        **deltas: Приращения счетчиков (likes_received, dislikes_received, likes_given, matches)
+    """
+    stmt = (
+        insert(InteractionCounter)
+        .values(user_id=user_id, **deltas)
+        .on_conflict_do_update(
+            index_elements=[InteractionCounter.user_id],
+            set_={name: getattr(InteractionCounter, name) + delta for name, delta in deltas.items()},
+        )
+    )
+    await db.execute(stmt)
+
+
 async def process_like(
     db: AsyncSession,
     user_id: int,
@@ -37,6 +63,18 @@ async def process_like(
         new_like = Like(user_id=user_id, target_user_id=target_user_id)
         db.add(new_like)
 
+        # Обновляем счетчики взаимодействий
+        await increment_counters(db, user_id, likes_given=1)
+        await increment_counters(db, target_user_id, likes_received=1)
+
+        # Если цель уже лайкала пользователя, это взаимный лайк
+        mutual_like = await db.execute(
+            select(Like.id).where(and_(Like.user_id == target_user_id, Like.target_user_id == user_id))
+        )
+        if mutual_like.first():
+            await increment_counters(db, user_id, matches=1)
+            await increment_counters(db, target_user_id, matches=1)
+
         # Обновляем activity_score в таблице рейтинга
         rating_result = await db.execute(select(Rating).where(Rating.user_id == target_user_id))
         rating = rating_result.scalar_one_or_none()
@@ -47,8 +85,15 @@ async def process_like(
         # Сохраняем изменения в БД
         await db.commit()
 
+        if rating:
+            # Обновляем рейтинг в снимке кандидатов и в пуле сегмента
+            candidate_scorer.update_rating(target_user_id, rating.profile_score, rating.activity_score)
+            if settings.RANKING_ENGINE == 'pool':
+                await refresh_pool_score(target_user_id, rating.profile_score, rating.activity_score)
+
         # Сохраняем информацию о лайке в Redis
         await store_like(user_id, target_user_id)
+        await mark_profile_seen(user_id, target_user_id)
 
         logger.info('User %s liked user %s', user_id, target_user_id)
         return True
@@ -88,6 +133,9 @@ async def process_dislike(
         new_dislike = Dislike(user_id=user_id, target_user_id=target_user_id)
         db.add(new_dislike)
 
+        # Обновляем счетчики взаимодействий
+        await increment_counters(db, target_user_id, dislikes_received=1)
+
         # Обновляем activity_score в таблице рейтинга
         rating_result = await db.execute(select(Rating).where(Rating.user_id == target_user_id))
         rating = rating_result.scalar_one_or_none()
@@ -98,6 +146,14 @@ async def process_dislike(
         # Сохраняем изменения в БД
         await db.commit()
 
+        if rating:
+            # Обновляем рейтинг в снимке кандидатов и в пуле сегмента
+            candidate_scorer.update_rating(target_user_id, rating.profile_score, rating.activity_score)
+            if settings.RANKING_ENGINE == 'pool':
+                await refresh_pool_score(target_user_id, rating.profile_score, rating.activity_score)
+
+        await mark_profile_seen(user_id, target_user_id)
+
         logger.info('User %s disliked user %s', user_id, target_user_id)
         return True
 
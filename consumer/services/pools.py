@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from consumer.logger import logger
+from consumer.model.rating import Rating
+from consumer.services.scoring import AGE_MULTIPLIER, GENDER_MULTIPLIER
+from consumer.services.seen import SeenProfiles
+from consumer.storage.redis import (
+    get_dense_indexes,
+    get_pool_pages,
+    get_pool_segments,
+    replace_pools,
+    store_pool_member,
+    update_pool_score,
+)
+from src.model.profile import Profile
+from src.model.user import User
+
+# Сколько участников сегмента читать за один запрос
+POOL_PAGE_SIZE = 20
+
+# Запас для границы чтения после курсора: скор участника, умноженный на множитель сегмента,
+# может на последний бит отличаться от скора курсора, точное сравнение делается уже при слиянии
+CURSOR_BOUND_SLACK = 1e-9
+
+_rebuild_lock = asyncio.Lock()
+
+
+def get_segment(city_id: int | None, gender: str | None, age: int | None) -> str:
+    """Формирует имя сегмента пула (город, пол, возраст); 0 и '-' означают незаполненное поле."""
+    return f'{city_id or 0}:{gender or "-"}:{age or 0}'
+
+
+def get_segment_multiplier(
+    segment: str,
+    city_factors: dict[int, float],
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+) -> float:
+    """Считает множитель скора, общий для всех участников сегмента."""
+    segment_city, segment_gender, segment_age = segment.split(':')
+    multiplier = city_factors.get(int(segment_city), 1)
+
+    if preferred_gender is not None and segment_gender == preferred_gender:
+        multiplier *= GENDER_MULTIPLIER
+    if (
+        preferred_age_min is not None
+        and preferred_age_max is not None
+        and int(segment_age)
+        and preferred_age_min <= int(segment_age) <= preferred_age_max
+    ):
+        multiplier *= AGE_MULTIPLIER
+
+    return multiplier
+
+
+async def rebuild_pools(db: AsyncSession) -> None:
+    """
+    Полностью перестраивает пулы кандидатов по данным из БД.
+
+    Args:
+        db: Сессия базы данных
+    """
+    result = await db.execute(
+        select(User.user_id, User.city_id, User.gender, User.age, Rating.profile_score, Rating.activity_score)
+        .join(Profile, Profile.user_id == User.user_id)
+        .join(Rating, Rating.user_id == User.user_id)
+    )
+    members = [
+        (user_id, get_segment(city_id, gender, age), (profile_score or 0.0) + (activity_score or 0.0))
+        for user_id, city_id, gender, age, profile_score, activity_score in result
+    ]
+    await replace_pools(members)
+
+
+async def refresh_pool_member(db: AsyncSession, user_id: int) -> None:
+    """
+    Переносит пользователя в актуальный сегмент после регистрации или изменения анкеты.
+
+    Args:
+        db: Сессия базы данных
+        user_id: ID пользователя
+    """
+    result = await db.execute(
+        select(User.city_id, User.gender, User.age, Rating.profile_score, Rating.activity_score)
+        .join(Profile, Profile.user_id == User.user_id)
+        .join(Rating, Rating.user_id == User.user_id)
+        .where(User.user_id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        logger.warning('User %s has no profile or rating, skipping candidate pool refresh', user_id)
+        return
+
+    city_id, gender, age, profile_score, activity_score = row
+    await store_pool_member(
+        user_id, get_segment(city_id, gender, age), (profile_score or 0.0) + (activity_score or 0.0)
+    )
+
+
+async def refresh_pool_score(user_id: int, profile_score: float, activity_score: float) -> None:
+    """Обновляет базовый скор пользователя в его сегменте после изменения рейтинга."""
+    try:
+        await update_pool_score(user_id, profile_score + activity_score)
+    except Exception as e:
+        logger.error('Failed to refresh pool score for user %s: %s', user_id, e)
+
+
+async def rank_from_pools(
+    db: AsyncSession,
+    user_id: int,
+    city_factors: dict[int, float],
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+    limit: int,
+    seen: SeenProfiles,
+    after: tuple[float, int] | None = None,
+) -> list[tuple[float, int]]:
+    """
+    Выбирает лучших кандидатов из готовых пулов, пропуская уже просмотренные профили.
+
+    Внутри сегмента множитель одинаковый, поэтому достаточно взять из каждого сегмента
+    первые limit непросмотренных профилей и слить их. Сегменты, чей лучший оставшийся скор
+    не может попасть в итоговый топ, дальше не читаются. С курсором чтение каждого сегмента
+    начинается сразу с базового скора курсора, деленного на множитель сегмента.
+
+    Args:
+        db: Сессия базы данных
+        user_id: ID пользователя, для которого ищем профили
+        city_factors: Множители за близость городов кандидатов к городу пользователя
+        preferred_gender: Предпочтительный пол
+        preferred_age_min: Минимальный предпочтительный возраст
+        preferred_age_max: Максимальный предпочтительный возраст
+        limit: Количество профилей
+        seen: Уже просмотренные профили
+        after: Курсор (total_score, user_id), с которого продолжить выдачу
+
+    Returns:
+        list: Пары (total_score, user_id) по убыванию скора
+    """
+    segments = await get_pool_segments()
+    if not segments:
+        async with _rebuild_lock:
+            segments = await get_pool_segments()
+            if not segments:
+                await rebuild_pools(db)
+                segments = await get_pool_segments()
+
+    multipliers = {
+        segment: get_segment_multiplier(segment, city_factors, preferred_gender, preferred_age_min, preferred_age_max)
+        for segment in segments
+    }
+    # Базовый скор, с которого читать сегмент: выше него анкеты уже были выданы
+    bounds = dict.fromkeys(segments)
+    if after is not None:
+        bounds = {segment: after[0] / multipliers[segment] * (1 + CURSOR_BOUND_SLACK) for segment in segments}
+    offsets = dict.fromkeys(segments, 0)
+    found = dict.fromkeys(segments, 0)
+    best: list[tuple[float, int]] = []
+
+    pending = list(segments)
+    while pending:
+        pages = await get_pool_pages(
+            [(segment, bounds[segment], offsets[segment], POOL_PAGE_SIZE) for segment in pending]
+        )
+        dense = await get_dense_indexes([member for page in pages for member, _ in page])
+
+        next_pending = []
+        for segment, page in zip(pending, pages):
+            multiplier = multipliers[segment]
+            for member, score in page:
+                if member == user_id or dense[member] in seen:
+                    continue
+                candidate = (score * multiplier, member)
+                if after is not None and candidate >= after:
+                    continue
+                found[segment] += 1
+                heapq.heappush(best, candidate)
+                if len(best) > limit:
+                    heapq.heappop(best)
+
+            offsets[segment] += POOL_PAGE_SIZE
+            exhausted = len(page) < POOL_PAGE_SIZE or found[segment] >= limit
+            # Ниже по сегменту скор только меньше, читать дальше имеет смысл, пока он может попасть в топ
+            if not exhausted and (len(best) < limit or page[-1][1] * multiplier > best[0][0]):
+                next_pending.append(segment)
+        pending = next_pending
+
+    return sorted(best, reverse=True)
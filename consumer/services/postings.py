@@ -0,0 +1,198 @@
+import heapq
+from array import array
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from consumer.logger import logger
+from consumer.metrics import SEGMENT_INDEX_BYTES, SEGMENT_INDEX_POSTINGS, SEGMENT_INDEX_USERS
+from consumer.services.scoring import GENDER_CODES, CandidateScorer, candidate_scorer
+from consumer.services.seen import SeenProfiles
+
+
+def unite_postings(postings: list[array]) -> array:
+    """Объединяет отсортированные списки user_id без повторов."""
+    if len(postings) == 1:
+        return postings[0]
+
+    result = array('q')
+    for user_id in heapq.merge(*postings):
+        if not result or result[-1] != user_id:
+            result.append(user_id)
+    return result
+
+
+class SegmentIndex:
+    """
+    Инвертированный индекс анкет по городу, полу и году возраста.
+
+    Для каждого значения хранит отсортированный массив user_id, так что кандидаты
+    под предпочтения пользователя получаются объединением списков
+    без прохода по всем анкетам. Строится только из снимка кандидатов и перестраивается
+    вместе с ним: скор все равно считается по колонкам снимка, поэтому новые и измененные
+    анкеты попадают в выдачу после перечитывания снимка (RANKING_SNAPSHOT_TTL).
+    """
+
+    def __init__(self) -> None:
+        self.cities: dict[int, array] = {}
+        self.genders: dict[str, array] = {}
+        self.ages: dict[int, array] = {}
+        # user_id -> (город, пол, возраст)
+        self.members: dict[int, tuple[int | None, str | None, int | None]] = {}
+        # Момент загрузки снимка кандидатов, по которому построен индекс
+        self.snapshot_at = 0.0
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def build(self, scorer: CandidateScorer) -> None:
+        """
+        Строит индекс по колонкам снимка кандидатов.
+
+        Индекс собирается из того же снимка, по которому считается скор, поэтому в каждой
+        реплике он видит тех же кандидатов, что и скоринг, и обновляется вместе со снимком.
+
+        Args:
+            scorer: Загруженный снимок кандидатов
+        """
+        genders_by_code = {code: gender for gender, code in GENDER_CODES.items()}
+        city_ids = [scorer.cities[code] if scorer.cities[code] != -1 else None for code in scorer.city_codes.tolist()]
+        genders = [genders_by_code.get(code) for code in scorer.genders.tolist()]
+        ages = [age if age != -1 else None for age in scorer.ages.tolist()]
+
+        def group(values: list) -> dict:
+            # Снимок отсортирован по user_id, поэтому списки получаются отсортированными без сортировки
+            postings: dict = {}
+            for user_id, value in zip(scorer.user_ids.tolist(), values):
+                if value is not None:
+                    postings.setdefault(value, array('q')).append(user_id)
+            return postings
+
+        # Подменяем списки целиком, чтобы параллельный поиск не увидел частично собранный индекс
+        self.cities = group(city_ids)
+        self.genders = group(genders)
+        self.ages = group(ages)
+        self.members = dict(zip(scorer.user_ids.tolist(), zip(city_ids, genders, ages)))
+        self.snapshot_at = scorer.loaded_at
+        self.loaded = True
+        self.observe()
+
+        logger.info('Segment index built: %d profiles', len(self.members))
+
+    async def load(self, db: AsyncSession) -> None:
+        """
+        Строит индекс по свежему снимку кандидатов.
+
+        Args:
+            db: Сессия базы данных
+        """
+        await candidate_scorer.ensure_fresh(db)
+        self.build(candidate_scorer)
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        """Перестраивает индекс, если снимок кандидатов перечитан после его построения."""
+        await candidate_scorer.ensure_fresh(db)
+        if self.snapshot_at != candidate_scorer.loaded_at:
+            self.build(candidate_scorer)
+
+    def _postings(self) -> list[tuple[str, dict]]:
+        return [('city', self.cities), ('gender', self.genders), ('age', self.ages)]
+
+    def observe(self) -> None:
+        """Обновляет метрики размера индекса."""
+        SEGMENT_INDEX_USERS.set(len(self.members))
+        for dimension, postings in self._postings():
+            SEGMENT_INDEX_POSTINGS.labels(dimension=dimension).set(sum(len(posting) for posting in postings.values()))
+            SEGMENT_INDEX_BYTES.labels(dimension=dimension).set(
+                sum(posting.buffer_info()[1] * posting.itemsize for posting in postings.values())
+            )
+
+    def get_candidates(
+        self,
+        city_factors: dict[int, float],
+        preferred_gender: str | None,
+        preferred_age_min: int | None,
+        preferred_age_max: int | None,
+    ) -> array:
+        """
+        Подбирает кандидатов, совпавших хотя бы по одному из заданных признаков.
+
+        Args:
+            city_factors: Множители за близость городов кандидатов к городу пользователя
+            preferred_gender: Предпочтительный пол
+            preferred_age_min: Минимальный предпочтительный возраст
+            preferred_age_max: Максимальный предпочтительный возраст
+
+        Returns:
+            array: Отсортированные user_id кандидатов
+        """
+        groups = []
+        if city_factors:
+            groups.append([self.cities[city_id] for city_id in city_factors if city_id in self.cities])
+        if preferred_gender is not None:
+            groups.append([self.genders[preferred_gender]] if preferred_gender in self.genders else [])
+        if preferred_age_min is not None and preferred_age_max is not None:
+            groups.append(
+                [self.ages[age] for age in range(preferred_age_min, preferred_age_max + 1) if age in self.ages]
+            )
+
+        postings = [posting for group in groups for posting in group]
+        if not postings:
+            return array('q')
+        return unite_postings(postings)
+
+
+def rank_from_index(
+    user_id: int,
+    city_factors: dict[int, float],
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+    limit: int,
+    seen: SeenProfiles,
+    after: tuple[float, int] | None = None,
+    eligibility_key: int | None = None,
+) -> list[tuple[float, int]]:
+    """
+    Ранжирует кандидатов, отобранных по инвертированному индексу.
+
+    Скор считается для анкет, совпавших хотя бы по одному признаку, - у них есть
+    множители за совпадение. Анкета без совпадений не может набрать больше
+    get_unmatched_bound, поэтому если последний из выбранных скоров выше этой границы,
+    выборка совпадает с top-k по всему снимку и курсор выдачи ничего не пропустит.
+    Иначе скор считается по всем анкетам снимка.
+
+    Args:
+        user_id: ID пользователя, для которого ищем профили
+        city_factors: Множители за близость городов кандидатов к городу пользователя
+        preferred_gender: Предпочтительный пол
+        preferred_age_min: Минимальный предпочтительный возраст
+        preferred_age_max: Максимальный предпочтительный возраст
+        limit: Количество профилей
+        seen: Уже просмотренные профили
+        after: Курсор (total_score, user_id), с которого продолжить выдачу
+        eligibility_key: Биты пола и возраста пользователя для взаимного ранжирования (None - выключено)
+
+    Returns:
+        list: Пары (total_score, user_id) по убыванию скора
+    """
+    preferences = {
+        'user_id': user_id,
+        'city_factors': city_factors,
+        'preferred_gender': preferred_gender,
+        'preferred_age_min': preferred_age_min,
+        'preferred_age_max': preferred_age_max,
+        'limit': limit,
+        'seen': seen,
+        'after': after,
+        'eligibility_key': eligibility_key,
+    }
+    matched = segment_index.get_candidates(city_factors, preferred_gender, preferred_age_min, preferred_age_max)
+    ranked = candidate_scorer.top_k(**preferences, candidates=matched)
+    if len(ranked) >= limit and ranked[-1][0] > candidate_scorer.get_unmatched_bound(eligibility_key):
+        return ranked
+
+    return candidate_scorer.top_k(**preferences)
+
+
+segment_index = SegmentIndex()
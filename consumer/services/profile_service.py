@@ -1,12 +1,50 @@
-from sqlalchemy import select, func, and_, case, desc
+import time
+
+from sqlalchemy import (
+    BigInteger,
+    Float,
+    Integer,
+    String,
+    and_,
+    case,
+    cast,
+    column,
+    desc,
+    func,
+    literal,
+    or_,
+    select,
+    true,
+    values,
+)
+from sqlalchemy.dialects.postgresql import BIT
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config.settings import settings
 from consumer.logger import logger
-from consumer.storage.redis import store_user_profiles
+from consumer.services.colike import get_colike_candidates, get_colike_candidates_batch
+from consumer.services.geo import city_distances
+from consumer.services.pools import rank_from_pools
+from consumer.services.postings import rank_from_index, segment_index
+from consumer.services.scoring import INTEREST_WEIGHT, RECIPROCAL_MULTIPLIER, candidate_scorer
+from consumer.services.seen import load_seen_profiles, load_seen_profiles_batch
+from consumer.storage.redis import (
+    append_user_profiles,
+    get_deck_length,
+    get_ranking_cursor,
+    get_refill_states,
+    store_decks,
+    store_profile_cards,
+    store_ranking_cursor,
+    store_user_profiles,
+)
 from consumer.model.interaction import Like, Dislike
 from consumer.model.rating import Rating
+from src.model.interaction_counter import InteractionCounter
 from src.model.profile import Profile
 from src.model.user import User
+from src.services.card import render_profile_card
+from src.services.eligibility import get_eligibility_key
 
 
 async def load_and_store_matching_profiles(
@@ -39,44 +77,289 @@ async def load_and_store_matching_profiles(
         logger.error('User %s not found', user_id)
         return []
 
+    await city_distances.ensure_loaded(db)
+
+    # Курсор действует, пока не изменились предпочтения и не сменилась эпоха рейтинга
+    signature = get_search_signature(user, preferred_gender, preferred_age_min, preferred_age_max)
+    epoch = get_rating_epoch()
+    after, need = get_refill_position(
+        await get_ranking_cursor(user_id), await get_deck_length(user_id), signature, epoch, limit
+    )
+    if need <= 0:
+        logger.info('Deck of user %s is full, skipping refill', user_id)
+        return []
+
+    ranked_profiles = await rank_profiles(db, user, preferred_gender, preferred_age_min, preferred_age_max, need, after)
+    if after is not None and not ranked_profiles:
+        # Выдача после курсора закончилась, начинаем заново с лучших анкет
+        logger.info('Ranking cursor of user %s is exhausted, starting over', user_id)
+        after = None
+        need = limit
+        ranked_profiles = await rank_profiles(
+            db, user, preferred_gender, preferred_age_min, preferred_age_max, limit, after
+        )
+
+    # Часть мест в колоде отдаем кандидатам из матрицы совместных лайков
+    colike = await get_colike_candidates(
+        db,
+        user_id,
+        min(settings.COLIKE_DECK_SLOTS, need // 2),
+        {profile['user_id'] for _, profile in ranked_profiles},
+        preferred_gender,
+        preferred_age_min,
+        preferred_age_max,
+    )
+    profiles_data, last_ranked = mix_in_colike(ranked_profiles, await fetch_ranked_profiles(db, colike), need)
+
+    if profiles_data:
+        # Сохраняем профили в Redis
+        if after is None:
+            await store_user_profiles(user_id, profiles_data)
+        else:
+            await append_user_profiles(user_id, profiles_data)
+
+        if last_ranked is not None:
+            last_score, last_profile = last_ranked
+            await store_ranking_cursor(user_id, last_score, last_profile['user_id'], signature, epoch)
+        logger.info(
+            'Loaded and stored %d matching profiles for user %s',
+            len(profiles_data),
+            user_id,
+        )
+    else:
+        logger.warning('No matching profiles found for user %s', user_id)
+
+    return profiles_data
+
+
+def mix_in_colike(
+    ranked_profiles: list[tuple[float, dict]],
+    colike_profiles: list[tuple[float, dict]],
+    need: int,
+) -> tuple[list[dict], tuple[float, dict] | None]:
+    """
+    Отдает последние места колоды кандидатам из матрицы совместных лайков.
+
+    Args:
+        ranked_profiles: Пары (total_score, карточка) из ранжирования
+        colike_profiles: Пары (сходство, карточка) из матрицы совместных лайков
+        need: Сколько анкет нужно в колоду
+
+    Returns:
+        tuple: Карточки для колоды и последняя оставшаяся пара из ранжирования для курсора
+    """
+    kept = ranked_profiles[: need - len(colike_profiles)]
+    profiles_data = [profile for _, profile in kept] + [profile for _, profile in colike_profiles]
+    return profiles_data, (kept[-1] if kept else None)
+
+
+def get_rating_epoch() -> int:
+    """Номер текущей эпохи рейтинга: курсоры прошлых эпох сбрасываются."""
+    return int(time.time() // settings.RANKING_CURSOR_EPOCH)
+
+
+def get_search_signature(
+    user: User,
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+) -> str:
+    """Формирует подпись предпочтений, для которых построен курсор выдачи."""
+    reciprocal_key = get_reciprocal_key(user)
+    return f'{preferred_gender}:{preferred_age_min}:{preferred_age_max}:{user.city_id}:{reciprocal_key}'
+
+
+def get_reciprocal_key(user: User) -> int | None:
+    """Биты пола и возраста пользователя для взаимного ранжирования или None, если оно выключено."""
+    if not settings.RANKING_RECIPROCAL:
+        return None
+    return get_eligibility_key(user.gender, user.age)
+
+
+def get_refill_position(
+    cursor: dict | None,
+    deck_length: int,
+    signature: str,
+    epoch: int,
+    limit: int,
+) -> tuple[tuple[float, int] | None, int]:
+    """
+    Определяет, с какого места продолжать выдачу и сколько анкет добрать.
+
+    Args:
+        cursor: Сохраненный курсор выдачи
+        deck_length: Сколько анкет осталось в колоде
+        signature: Подпись текущих предпочтений
+        epoch: Текущая эпоха рейтинга
+        limit: Размер колоды
+
+    Returns:
+        tuple: Курсор (total_score, user_id) или None для выдачи с начала и количество анкет
+    """
+    if cursor and cursor['signature'] == signature and int(cursor['epoch']) == epoch:
+        # Продолжаем выдачу с места курсора и только добираем колоду до limit
+        return (float(cursor['score']), int(cursor['user_id'])), limit - deck_length
+    return None, limit
+
+
+async def rank_profiles(
+    db: AsyncSession,
+    user: User,
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+    limit: int,
+    after: tuple[float, int] | None = None,
+) -> list[tuple[float, dict]]:
+    """
+    Ранжирует кандидатов выбранным в настройках движком.
+
+    Args:
+        db: Сессия базы данных
+        user: Пользователь, для которого ищем профили
+        preferred_gender: Предпочтительный пол
+        preferred_age_min: Минимальный предпочтительный возраст
+        preferred_age_max: Максимальный предпочтительный возраст
+        limit: Количество профилей
+        after: Курсор (total_score, user_id) последней выданной анкеты
+
+    Returns:
+        list: Пары (total_score, карточка профиля) по убыванию скора
+    """
+    if settings.RANKING_ENGINE == 'pool':
+        rank = rank_profiles_from_pools
+    elif settings.RANKING_ENGINE == 'memory':
+        rank = rank_profiles_in_memory
+    elif settings.RANKING_ENGINE == 'index':
+        rank = rank_profiles_from_index
+    else:
+        rank = rank_profiles_in_sql
+
+    return await rank(db, user, preferred_gender, preferred_age_min, preferred_age_max, limit, after)
+
+
+def format_profile(
+    profile: Profile,
+    matched_user: User,
+    rating: Rating,
+    likes_count: int,
+    dislikes_count: int,
+    total_score: float,
+) -> dict:
+    """Формирует карточку профиля для сохранения в Redis."""
+    # Округляем score до 2 знаков после запятой для удобства чтения
+    rounded_score = round(float(total_score), 2)
+
+    # Подпись и клавиатура рендерятся один раз здесь, бот при свайпе их только десериализует
+    return render_profile_card(
+        {
+            'user_id': matched_user.user_id,
+            'first_name': matched_user.first_name,
+            'age': matched_user.age,
+            'gender': matched_user.gender,
+            'bio': profile.bio,
+            'photo_url': profile.photo_url,
+            'score': rounded_score,  # Используем округленный скор
+            'profile_score': rating.profile_score,  # Добавляем profile_score
+            'activity_score': rating.activity_score,  # Добавляем activity_score
+            'likes_count': likes_count,  # Добавляем количество лайков
+            'dislikes_count': dislikes_count,  # Добавляем количество дизлайков
+        }
+    )
+
+
+def get_total_score(
+    city_factor, preferred_gender, preferred_age_min, preferred_age_max, interests_mask, eligibility_key=None
+):
+    """
+    Строит SQL-выражение итогового скора кандидата.
+
+    Предпочтения могут быть как значениями, так и колонками (при пакетном ранжировании).
+    Если передан eligibility_key, скор учитывает и то, подходит ли пользователь кандидату.
+    """
+    total_score = (
+        # Используем profile_score и activity_score из таблицы рейтинга
+        (Rating.profile_score + Rating.activity_score)
+        * case(
+            # Множитель за совпадение пола
+            (User.gender == preferred_gender, 4),
+            else_=1,
+        )
+        # Множитель за близость города кандидата
+        * city_factor
+        * case(
+            # Множитель за совпадение возрастного диапазона
+            (
+                and_(
+                    User.age >= preferred_age_min,
+                    User.age <= preferred_age_max,
+                ),
+                3,
+            ),
+            else_=1,
+        )
+        # Множитель за сходство интересов по Жаккару, считается по битовым маскам
+        * (1 + INTEREST_WEIGHT * get_interest_similarity(interests_mask))
+    )
+    if eligibility_key is None:
+        return total_score
+
+    # Взаимная проверка - одно побитовое И с заранее упакованными предпочтениями кандидата
+    return total_score * case(
+        (User.accepts_mask.op('&')(eligibility_key) == eligibility_key, RECIPROCAL_MULTIPLIER),
+        else_=1,
+    )
+
+
+def get_city_factor(city_factors: dict[int, float]):
+    """Строит SQL-выражение множителя за близость города кандидата по строке матрицы расстояний."""
+    if not city_factors:
+        return literal(1.0)
+    return case(city_factors, value=User.city_id, else_=1.0)
+
+
+def get_interest_similarity(interests_mask):
+    """Строит SQL-выражение сходства интересов кандидата с маской interests_mask."""
+    intersection = func.bit_count(cast(User.interests_mask.op('&')(interests_mask), BIT(64)))
+    union = func.bit_count(cast(User.interests_mask.op('|')(interests_mask), BIT(64)))
+    return func.coalesce(cast(intersection, Float) / func.nullif(union, 0), 0.0)
+
+
+async def rank_profiles_in_sql(
+    db: AsyncSession,
+    user: User,
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+    limit: int,
+    after: tuple[float, int] | None = None,
+) -> list[tuple[float, dict]]:
+    """Ранжирует кандидатов одним запросом в PostgreSQL."""
+    user_id = user.user_id
+
     # Вычисляем итоговый скор с учетом рейтингов и предпочтений
+    total_score = get_total_score(
+        get_city_factor(city_distances.get_row(user.city_id)),
+        preferred_gender,
+        preferred_age_min,
+        preferred_age_max,
+        user.interests_mask,
+        get_reciprocal_key(user),
+    )
+
     query = (
         select(
             Profile,
             User,
             Rating,
-            func.count(Like.id).label('likes_count'),
-            func.count(Dislike.id).label('dislikes_count'),
-            (
-                # Используем profile_score и activity_score из таблицы рейтинга
-                (Rating.profile_score + Rating.activity_score)
-                * case(
-                    # Множитель за совпадение пола
-                    (User.gender == preferred_gender, 4),
-                    else_=1,
-                )
-                * case(
-                    # Множитель за совпадение города
-                    (User.city_id == user.city_id, 2),
-                    else_=1,
-                )
-                * case(
-                    # Множитель за совпадение возрастного диапазона
-                    (
-                        and_(
-                            User.age >= preferred_age_min,
-                            User.age <= preferred_age_max,
-                        ),
-                        3,
-                    ),
-                    else_=1,
-                )
-            ).label('total_score'),
+            # Счетчики берем из денормализованной таблицы вместо агрегации лайков и дизлайков
+            func.coalesce(InteractionCounter.likes_received, 0).label('likes_count'),
+            func.coalesce(InteractionCounter.dislikes_received, 0).label('dislikes_count'),
+            total_score.label('total_score'),
         )
         .join(User, Profile.user_id == User.user_id)
         .join(Rating, User.user_id == Rating.user_id)
-        .outerjoin(Like, User.user_id == Like.target_user_id)
-        .outerjoin(Dislike, User.user_id == Dislike.target_user_id)
+        .outerjoin(InteractionCounter, User.user_id == InteractionCounter.user_id)
         .where(
             and_(
                 Profile.user_id != user_id,  # Исключаем профиль самого пользователя
@@ -85,44 +368,444 @@ async def load_and_store_matching_profiles(
                 ~Profile.user_id.in_(select(Dislike.target_user_id).where(Dislike.user_id == user_id)),
             )
         )
-        .group_by(Profile.profile_id, Profile.user_id, User.user_id, Rating.rating_id)
-        .order_by(desc('total_score'))
+        .order_by(desc('total_score'), desc(User.user_id))
         .limit(limit)
     )
 
+    if after is not None:
+        # Keyset-продолжение: только анкеты строго ниже курсора в порядке (total_score, user_id)
+        after_score, after_user_id = after
+        query = query.where(
+            or_(total_score < after_score, and_(total_score == after_score, User.user_id < after_user_id))
+        )
+
     # Выполняем запрос
     result = await db.execute(query)
 
     # Форматируем результаты
     profiles_data = []
-    for profile, matched_user, rating, likes_count, dislikes_count, total_score in result:
-        # Округляем score до 2 знаков после запятой для удобства чтения
-        rounded_score = round(float(total_score), 2)
+    for profile, matched_user, rating, likes_count, dislikes_count, score in result:
+        profiles_data.append(
+            (float(score), format_profile(profile, matched_user, rating, likes_count, dislikes_count, score))
+        )
 
-        profile_dict = {
-            'user_id': matched_user.user_id,
-            'first_name': matched_user.first_name,
-            'age': matched_user.age,
-            'gender': matched_user.gender,
-            'bio': profile.bio,
-            'photo_url': profile.photo_url,
-            'score': rounded_score,  # Используем округленный скор
-            'profile_score': rating.profile_score,  # Добавляем profile_score
-            'activity_score': rating.activity_score,  # Добавляем activity_score
-            'likes_count': likes_count,  # Добавляем количество лайков
-            'dislikes_count': dislikes_count,  # Добавляем количество дизлайков
-        }
-        profiles_data.append(profile_dict)
+    return profiles_data
 
-    if profiles_data:
-        # Сохраняем профили в Redis
-        await store_user_profiles(user_id, profiles_data)
-        logger.info(
-            'Loaded and stored %d matching profiles for user %s',
-            len(profiles_data),
-            user_id,
+
+async def rank_profiles_in_memory(
+    db: AsyncSession,
+    user: User,
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+    limit: int,
+    after: tuple[float, int] | None = None,
+) -> list[tuple[float, dict]]:
+    """Ранжирует кандидатов по снимку в памяти и догружает из БД только выбранные анкеты."""
+    user_id = user.user_id
+    await candidate_scorer.ensure_fresh(db)
+
+    # Исключаем профили, которые пользователь уже лайкал или дизлайкал
+    seen = await load_seen_profiles(db, user_id)
+
+    ranked = candidate_scorer.top_k(
+        user_id=user_id,
+        city_factors=city_distances.get_row(user.city_id),
+        preferred_gender=preferred_gender,
+        preferred_age_min=preferred_age_min,
+        preferred_age_max=preferred_age_max,
+        limit=limit,
+        seen=seen,
+        after=after,
+        eligibility_key=get_reciprocal_key(user),
+    )
+    return await fetch_ranked_profiles(db, ranked)
+
+
+async def rank_profiles_from_index(
+    db: AsyncSession,
+    user: User,
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+    limit: int,
+    after: tuple[float, int] | None = None,
+) -> list[tuple[float, dict]]:
+    """Ранжирует в памяти кандидатов, отобранных по инвертированному индексу."""
+    await candidate_scorer.ensure_fresh(db)
+    await segment_index.ensure_loaded(db)
+
+    seen = await load_seen_profiles(db, user.user_id)
+    ranked = rank_from_index(
+        user_id=user.user_id,
+        city_factors=city_distances.get_row(user.city_id),
+        preferred_gender=preferred_gender,
+        preferred_age_min=preferred_age_min,
+        preferred_age_max=preferred_age_max,
+        limit=limit,
+        seen=seen,
+        after=after,
+        eligibility_key=get_reciprocal_key(user),
+    )
+    return await fetch_ranked_profiles(db, ranked)
+
+
+async def rank_profiles_from_pools(
+    db: AsyncSession,
+    user: User,
+    preferred_gender: str | None,
+    preferred_age_min: int | None,
+    preferred_age_max: int | None,
+    limit: int,
+    after: tuple[float, int] | None = None,
+) -> list[tuple[float, dict]]:
+    """
+    Ранжирует кандидатов по готовым пулам сегментов в Redis.
+
+    Скор в пулах общий для сегмента, поэтому взаимное ранжирование здесь не учитывается.
+    """
+    seen = await load_seen_profiles(db, user.user_id)
+    ranked = await rank_from_pools(
+        db=db,
+        user_id=user.user_id,
+        city_factors=city_distances.get_row(user.city_id),
+        preferred_gender=preferred_gender,
+        preferred_age_min=preferred_age_min,
+        preferred_age_max=preferred_age_max,
+        limit=limit,
+        seen=seen,
+        after=after,
+    )
+    return await fetch_ranked_profiles(db, ranked)
+
+
+async def fetch_ranked_profiles(db: AsyncSession, ranked: list[tuple[float, int]]) -> list[tuple[float, dict]]:
+    """
+    Догружает из БД анкеты выбранных кандидатов в порядке ранжирования.
+
+    Args:
+        db: Сессия базы данных
+        ranked: Пары (total_score, user_id) по убыванию скора
+
+    Returns:
+        list: Пары (total_score, карточка профиля) по убыванию скора
+    """
+    if not ranked:
+        return []
+
+    rows = await fetch_profile_rows(db, [candidate_id for _, candidate_id in ranked])
+    return build_ranked_profiles(ranked, rows)
+
+
+async def refresh_profile_card(db: AsyncSession, user_id: int) -> None:
+    """
+    Перезаписывает общую карточку анкеты после ее изменения, чтобы она обновилась во всех колодах.
+
+    Args:
+        db: Сессия базы данных
+        user_id: ID пользователя, чья анкета изменилась
+    """
+    profiles = await fetch_ranked_profiles(db, [(0.0, user_id)])
+    if profiles:
+        await store_profile_cards([profile for _, profile in profiles])
+
+
+async def fetch_profile_rows(db: AsyncSession, candidate_ids: list[int]) -> dict[int, tuple]:
+    """
+    Загружает одним запросом все, что нужно для карточек кандидатов.
+
+    Args:
+        db: Сессия базы данных
+        candidate_ids: ID кандидатов
+
+    Returns:
+        dict: user_id -> (Profile, User, Rating, likes_count, dislikes_count)
+    """
+    if not candidate_ids:
+        return {}
+
+    result = await db.execute(
+        select(
+            Profile,
+            User,
+            Rating,
+            func.coalesce(InteractionCounter.likes_received, 0),
+            func.coalesce(InteractionCounter.dislikes_received, 0),
+        )
+        .join(User, Profile.user_id == User.user_id)
+        .join(Rating, User.user_id == Rating.user_id)
+        .outerjoin(InteractionCounter, User.user_id == InteractionCounter.user_id)
+        .where(Profile.user_id.in_(candidate_ids))
+    )
+    return {row[1].user_id: tuple(row) for row in result}
+
+
+def build_ranked_profiles(ranked: list[tuple[float, int]], rows: dict[int, tuple]) -> list[tuple[float, dict]]:
+    """Собирает карточки кандидатов в порядке ранжирования."""
+    profiles_data = []
+    for total_score, candidate_id in ranked:
+        if candidate_id not in rows:
+            # Пользователь удалился после построения снимка
+            continue
+        profile, matched_user, rating, candidate_likes, candidate_dislikes = rows[candidate_id]
+        profiles_data.append(
+            (
+                total_score,
+                format_profile(profile, matched_user, rating, candidate_likes, candidate_dislikes, total_score),
+            )
         )
-    else:
-        logger.warning('No matching profiles found for user %s', user_id)
 
     return profiles_data
+
+
+async def load_and_store_matching_profiles_batch(db: AsyncSession, user_ids: list[int], limit: int = 5) -> dict:
+    """
+    Загружает подходящие профили сразу для нескольких пользователей и сохраняет их в Redis.
+
+    Пользователи, анкеты кандидатов и колоды читаются и пишутся пачкой: один запрос
+    на ранжирование всех пользователей, один на карточки и один pipeline в Redis.
+
+    Args:
+        db: Сессия базы данных
+        user_ids: ID пользователей, для которых ищем профили
+        limit: Количество профилей для загрузки каждому пользователю
+
+    Returns:
+        dict: user_id -> список загруженных профилей
+    """
+    result = await db.execute(
+        select(User, Profile).join(Profile, Profile.user_id == User.user_id).where(User.user_id.in_(user_ids))
+    )
+    searchers = {user.user_id: (user, profile) for user, profile in result}
+    for user_id in user_ids:
+        if user_id not in searchers:
+            logger.warning('Profile not found for user %s', user_id)
+    if not searchers:
+        return {}
+
+    await city_distances.ensure_loaded(db)
+    epoch = get_rating_epoch()
+    states = await get_refill_states(list(searchers))
+
+    # Запросы ранжирования: (пользователь, анкета с предпочтениями, сколько добрать, курсор)
+    requests = []
+    signatures = {}
+    for (user, profile), (cursor, deck_length) in zip(searchers.values(), states):
+        signature = get_search_signature(
+            user, profile.preferred_gender, profile.preferred_age_min, profile.preferred_age_max
+        )
+        after, need = get_refill_position(cursor, deck_length, signature, epoch, limit)
+        if need <= 0:
+            logger.info('Deck of user %s is full, skipping refill', user.user_id)
+            continue
+        signatures[user.user_id] = signature
+        requests.append((user, profile, need, after))
+
+    afters = {user.user_id: after for user, _, _, after in requests}
+    needs = {user.user_id: need for user, _, need, _ in requests}
+    ranked = await rank_candidates_batch(db, requests)
+
+    # Выдача после курсора закончилась, начинаем этих пользователей заново с лучших анкет
+    restarts = [
+        (user, profile, limit, None)
+        for user, profile, _, after in requests
+        if after is not None and not ranked[user.user_id]
+    ]
+    if restarts:
+        ranked.update(await rank_candidates_batch(db, restarts))
+        for user, _, _, _ in restarts:
+            afters[user.user_id] = None
+            needs[user.user_id] = limit
+
+    # Часть мест в колодах отдаем кандидатам из матрицы совместных лайков
+    colike = await get_colike_candidates_batch(
+        db,
+        [
+            (
+                user_id,
+                min(settings.COLIKE_DECK_SLOTS, needs[user_id] // 2),
+                {candidate_id for _, candidate_id in pairs},
+                searchers[user_id][1].preferred_gender,
+                searchers[user_id][1].preferred_age_min,
+                searchers[user_id][1].preferred_age_max,
+            )
+            for user_id, pairs in ranked.items()
+        ],
+    )
+
+    rows = await fetch_profile_rows(
+        db,
+        list({candidate_id for pairs in [*ranked.values(), *colike.values()] for _, candidate_id in pairs}),
+    )
+
+    decks = []
+    cursors = []
+    loaded = {}
+    for user_id, pairs in ranked.items():
+        profiles_data, last_ranked = mix_in_colike(
+            build_ranked_profiles(pairs, rows), build_ranked_profiles(colike.get(user_id, []), rows), needs[user_id]
+        )
+        if not profiles_data:
+            logger.warning('No matching profiles found for user %s', user_id)
+            continue
+
+        loaded[user_id] = profiles_data
+        decks.append((user_id, profiles_data, afters[user_id] is None))
+        if last_ranked is not None:
+            last_score, last_profile = last_ranked
+            cursors.append((user_id, last_score, last_profile['user_id'], signatures[user_id], epoch))
+
+    if decks:
+        await store_decks(decks, cursors)
+        logger.info('Loaded and stored matching profiles for %d users', len(decks))
+
+    return loaded
+
+
+async def rank_candidates_batch(db: AsyncSession, requests: list[tuple]) -> dict[int, list[tuple[float, int]]]:
+    """
+    Ранжирует кандидатов для нескольких пользователей выбранным в настройках движком.
+
+    Args:
+        db: Сессия базы данных
+        requests: Кортежи (пользователь, анкета с предпочтениями, количество, курсор)
+
+    Returns:
+        dict: user_id -> пары (total_score, user_id кандидата) по убыванию скора
+    """
+    if not requests:
+        return {}
+
+    if settings.RANKING_ENGINE == 'sql':
+        return await rank_candidates_in_sql_batch(db, requests)
+
+    seen = await load_seen_profiles_batch(db, [user.user_id for user, _, _, _ in requests])
+    if settings.RANKING_ENGINE in ('memory', 'index'):
+        await candidate_scorer.ensure_fresh(db)
+    if settings.RANKING_ENGINE == 'index':
+        await segment_index.ensure_loaded(db)
+
+    ranked = {}
+    for user, profile, limit, after in requests:
+        preferences = {
+            'user_id': user.user_id,
+            'city_factors': city_distances.get_row(user.city_id),
+            'preferred_gender': profile.preferred_gender,
+            'preferred_age_min': profile.preferred_age_min,
+            'preferred_age_max': profile.preferred_age_max,
+            'limit': limit,
+            'seen': seen[user.user_id],
+            'after': after,
+        }
+        if settings.RANKING_ENGINE == 'pool':
+            ranked[user.user_id] = await rank_from_pools(db=db, **preferences)
+        elif settings.RANKING_ENGINE == 'index':
+            ranked[user.user_id] = rank_from_index(**preferences, eligibility_key=get_reciprocal_key(user))
+        else:
+            ranked[user.user_id] = candidate_scorer.top_k(**preferences, eligibility_key=get_reciprocal_key(user))
+
+    return ranked
+
+
+async def rank_candidates_in_sql_batch(db: AsyncSession, requests: list[tuple]) -> dict[int, list[tuple[float, int]]]:
+    """
+    Ранжирует кандидатов для нескольких пользователей одним запросом в PostgreSQL.
+
+    Предпочтения пользователей передаются списком VALUES, а кандидаты для каждого
+    выбираются коррелированным LATERAL-подзапросом.
+
+    Args:
+        db: Сессия базы данных
+        requests: Кортежи (пользователь, анкета с предпочтениями, количество, курсор)
+
+    Returns:
+        dict: user_id -> пары (total_score, user_id кандидата) по убыванию скора
+    """
+    searchers = values(
+        column('searcher_id', BigInteger),
+        column('city_id', Integer),
+        column('preferred_gender', String),
+        column('preferred_age_min', Integer),
+        column('preferred_age_max', Integer),
+        column('interests_mask', BigInteger),
+        column('eligibility_key', BigInteger),
+        column('after_score', Float),
+        column('after_user_id', BigInteger),
+        name='searchers',
+    ).data(
+        [
+            (
+                user.user_id,
+                user.city_id,
+                profile.preferred_gender,
+                profile.preferred_age_min,
+                profile.preferred_age_max,
+                user.interests_mask,
+                get_reciprocal_key(user) or 0,
+                *(after if after is not None else (None, None)),
+            )
+            for user, profile, _, after in requests
+        ]
+    )
+    # NULL в VALUES не несет типа, поэтому приводим колонки явно
+    searcher_id = searchers.c.searcher_id
+    after_score = cast(searchers.c.after_score, Float)
+    after_user_id = cast(searchers.c.after_user_id, BigInteger)
+    # Строки матрицы расстояний нужны только для городов пользователей из пачки
+    searcher_city_ids = {user.city_id for user, _, _, _ in requests if user.city_id is not None}
+    city_factor = (
+        case(
+            {city_id: get_city_factor(city_distances.get_row(city_id)) for city_id in searcher_city_ids},
+            value=cast(searchers.c.city_id, Integer),
+            else_=1.0,
+        )
+        if searcher_city_ids
+        else literal(1.0)
+    )
+    total_score = get_total_score(
+        city_factor,
+        cast(searchers.c.preferred_gender, String),
+        cast(searchers.c.preferred_age_min, Integer),
+        cast(searchers.c.preferred_age_max, Integer),
+        searchers.c.interests_mask,
+        searchers.c.eligibility_key if settings.RANKING_RECIPROCAL else None,
+    )
+
+    candidates = (
+        select(User.user_id, total_score.label('total_score'))
+        .join(Profile, Profile.user_id == User.user_id)
+        .join(Rating, User.user_id == Rating.user_id)
+        .where(
+            and_(
+                User.user_id != searcher_id,
+                ~User.user_id.in_(select(Like.target_user_id).where(Like.user_id == searcher_id).correlate(searchers)),
+                ~User.user_id.in_(
+                    select(Dislike.target_user_id).where(Dislike.user_id == searcher_id).correlate(searchers)
+                ),
+                or_(
+                    after_score.is_(None),
+                    total_score < after_score,
+                    and_(total_score == after_score, User.user_id < after_user_id),
+                ),
+            )
+        )
+        .order_by(desc('total_score'), desc(User.user_id))
+        .limit(max(limit for _, _, limit, _ in requests))
+        .lateral('candidates')
+    )
+
+    result = await db.execute(
+        select(searcher_id, candidates.c.user_id, candidates.c.total_score)
+        .select_from(searchers)
+        .join(candidates, true())
+        .order_by(searcher_id, desc(candidates.c.total_score), desc(candidates.c.user_id))
+    )
+
+    limits = {user.user_id: limit for user, _, limit, _ in requests}
+    ranked = {user_id: [] for user_id in limits}
+    for user_id, candidate_id, score in result:
+        # LIMIT общий на всю пачку, лишнее отрезаем здесь
+        if len(ranked[user_id]) < limits[user_id]:
+            ranked[user_id].append((float(score), candidate_id))
+
+    return ranked
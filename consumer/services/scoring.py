@@ -0,0 +1,337 @@
+import asyncio
+import time
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from consumer.logger import logger
+from consumer.model.rating import Rating
+from consumer.services.seen import SeenProfiles
+from consumer.storage.redis import get_dense_indexes
+from src.model.profile import Profile
+from src.model.user import User
+
+# Коды пола для колонки genders (0 - пол не указан)
+GENDER_CODES = {'male': 1, 'female': 2, 'other': 3}
+
+# Множители итогового скора, те же, что и в SQL-ранжировании
+GENDER_MULTIPLIER = 4
+CITY_MULTIPLIER = 2
+AGE_MULTIPLIER = 3
+# Итоговый скор умножается на (1 + INTEREST_WEIGHT * сходство интересов по Жаккару)
+INTEREST_WEIGHT = 1.0
+# Множитель за то, что пользователь подходит под предпочтения кандидата (RANKING_RECIPROCAL)
+RECIPROCAL_MULTIPLIER = 3
+
+
+class CandidateScorer:
+    """
+    Снимок кандидатов в виде колонок для ранжирования анкет в памяти.
+
+    Вместо GROUP BY-запроса на каждый поиск держит возраст, пол, город и рейтинги
+    всех пользователей с профилем в массивах NumPy, отсортированных по user_id,
+    и считает скор векторно, без цикла по анкетам в Python.
+    """
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        self.user_ids = np.empty(0, dtype=np.int64)
+        # Плотные индексы пользователей и обратная таблица: плотный индекс -> строка (-1 - нет в снимке),
+        # чтобы просмотренные исключались за число просмотренных, а не за число строк
+        self.dense_indexes = np.empty(0, dtype=np.int64)
+        self.dense_rows = np.empty(0, dtype=np.int32)
+        self.ages = np.empty(0, dtype=np.int16)
+        self.genders = np.empty(0, dtype=np.int8)
+        # Номер города кандидата в self.cities, чтобы множители городов брались одной выборкой
+        self.city_codes = np.empty(0, dtype=np.int32)
+        self.cities: list[int] = []
+        self.profile_scores = np.empty(0, dtype=np.float64)
+        self.activity_scores = np.empty(0, dtype=np.float64)
+        self.interest_masks = np.empty(0, dtype=np.uint64)
+        self.accepts_masks = np.empty(0, dtype=np.int64)
+        # Верхняя граница profile_score + activity_score по снимку
+        self.max_base_score = 0.0
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.loaded_at > self.ttl
+
+    async def load(self, db: AsyncSession) -> None:
+        """
+        Перечитывает снимок кандидатов из БД.
+
+        Args:
+            db: Сессия базы данных
+        """
+        query = (
+            select(
+                User.user_id,
+                User.age,
+                User.gender,
+                User.city_id,
+                Rating.profile_score,
+                Rating.activity_score,
+                User.interests_mask,
+                User.accepts_mask,
+            )
+            .join(Profile, Profile.user_id == User.user_id)
+            .join(Rating, Rating.user_id == User.user_id)
+            .order_by(User.user_id)
+        )
+        result = await db.execute(query)
+        rows = result.all()
+
+        user_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        ages = np.fromiter((row[1] if row[1] is not None else -1 for row in rows), dtype=np.int16, count=len(rows))
+        genders = np.fromiter((GENDER_CODES.get(row[2], 0) for row in rows), dtype=np.int8, count=len(rows))
+        city_ids = np.fromiter((row[3] if row[3] is not None else -1 for row in rows), dtype=np.int64, count=len(rows))
+        profile_scores = np.fromiter((row[4] or 0.0 for row in rows), dtype=np.float64, count=len(rows))
+        activity_scores = np.fromiter((row[5] or 0.0 for row in rows), dtype=np.float64, count=len(rows))
+        # Маска интересов хранится в BIGINT со знаком, в колонке держим те же биты без знака
+        interest_masks = np.fromiter((row[6] or 0 for row in rows), dtype=np.int64, count=len(rows)).view(np.uint64)
+        accepts_masks = np.fromiter((row[7] or 0 for row in rows), dtype=np.int64, count=len(rows))
+        cities, city_codes = np.unique(city_ids, return_inverse=True)
+
+        dense_indexes = await self.get_dense_indexes(user_ids)
+        dense_rows = np.full(int(dense_indexes.max(initial=0)) + 1, -1, dtype=np.int32)
+        dense_rows[dense_indexes] = np.arange(len(dense_indexes), dtype=np.int32)
+
+        # Подменяем колонки целиком, чтобы параллельный поиск не увидел частично собранный снимок
+        self.user_ids = user_ids
+        self.dense_indexes = dense_indexes
+        self.dense_rows = dense_rows
+        self.ages = ages
+        self.genders = genders
+        self.city_codes = city_codes.astype(np.int32)
+        self.cities = cities.tolist()
+        self.profile_scores = profile_scores
+        self.activity_scores = activity_scores
+        self.interest_masks = interest_masks
+        self.accepts_masks = accepts_masks
+        self.max_base_score = float((profile_scores + activity_scores).max(initial=0.0))
+        self.loaded_at = time.monotonic()
+
+        logger.info('Candidate snapshot loaded: %d profiles', len(user_ids))
+
+    async def get_dense_indexes(self, user_ids: np.ndarray) -> np.ndarray:
+        """
+        Плотные индексы для нового снимка.
+
+        Индекс пользователя не меняется, поэтому из Redis запрашиваются только
+        пользователи, которых не было в прошлом снимке.
+        """
+        dense_indexes = np.zeros(len(user_ids), dtype=np.int64)
+        known = np.zeros(len(user_ids), dtype=bool)
+        if len(self.user_ids):
+            rows = np.minimum(np.searchsorted(self.user_ids, user_ids), len(self.user_ids) - 1)
+            known = self.user_ids[rows] == user_ids
+            dense_indexes[known] = self.dense_indexes[rows[known]]
+
+        missing = user_ids[~known].tolist()
+        if missing:
+            dense = await get_dense_indexes(missing)
+            dense_indexes[~known] = [dense[user_id] for user_id in missing]
+        return dense_indexes
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        """Перечитывает снимок, если он устарел."""
+        if not self.is_stale:
+            return
+
+        async with self._lock:
+            if self.is_stale:
+                await self.load(db)
+
+    def update_rating(self, user_id: int, profile_score: float, activity_score: float) -> None:
+        """
+        Обновляет рейтинг кандидата в снимке без перечитывания из БД.
+
+        Args:
+            user_id: ID пользователя
+            profile_score: Новый profile_score
+            activity_score: Новый activity_score
+        """
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row == len(self.user_ids) or self.user_ids[row] != user_id:
+            return
+
+        self.profile_scores[row] = profile_score
+        self.activity_scores[row] = activity_score
+        self.max_base_score = max(self.max_base_score, profile_score + activity_score)
+
+    def get_unmatched_bound(self, eligibility_key: int | None = None) -> float:
+        """
+        Наибольший скор, который может получить кандидат без совпадений по полу, возрасту и городу.
+
+        Args:
+            eligibility_key: Биты пола и возраста пользователя для взаимного ранжирования (None - выключено)
+        """
+        bound = self.max_base_score * (1 + INTEREST_WEIGHT)
+        if eligibility_key is not None:
+            bound *= RECIPROCAL_MULTIPLIER
+        return bound
+
+    def filter_candidates(
+        self,
+        candidate_ids: Iterable[int],
+        preferred_gender: str | None,
+        preferred_age_min: int | None,
+        preferred_age_max: int | None,
+        seen: SeenProfiles,
+    ) -> list[int]:
+        """
+        Оставляет непросмотренных кандидатов из снимка, подходящих под предпочтения по полу и возрасту.
+
+        В отличие от скора, NULL в предпочтениях здесь ничего не ограничивает.
+        Кандидаты, которых еще нет в снимке, отбрасываются.
+
+        Args:
+            candidate_ids: ID кандидатов
+            preferred_gender: Предпочтительный пол
+            preferred_age_min: Минимальный предпочтительный возраст
+            preferred_age_max: Максимальный предпочтительный возраст
+            seen: Уже просмотренные профили
+
+        Returns:
+            list: ID подходящих кандидатов в исходном порядке
+        """
+        candidate_ids = np.fromiter(candidate_ids, dtype=np.int64)
+        if not len(candidate_ids) or not len(self.user_ids):
+            return []
+
+        rows = np.minimum(np.searchsorted(self.user_ids, candidate_ids), len(self.user_ids) - 1)
+        keep = self.user_ids[rows] == candidate_ids
+        if preferred_gender is not None:
+            keep &= self.genders[rows] == GENDER_CODES.get(preferred_gender, -1)
+        ages = self.ages[rows]
+        if preferred_age_min is not None or preferred_age_max is not None:
+            # Возраст не указан (-1) - не подходит, как и в SQL-сравнении с NULL
+            keep &= ages >= 0
+        if preferred_age_min is not None:
+            keep &= ages >= preferred_age_min
+        if preferred_age_max is not None:
+            keep &= ages <= preferred_age_max
+        keep &= ~np.isin(self.dense_indexes[rows], seen.indexes)
+        return candidate_ids[keep].tolist()
+
+    def top_k(
+        self,
+        user_id: int,
+        city_factors: dict[int, float],
+        preferred_gender: str | None,
+        preferred_age_min: int | None,
+        preferred_age_max: int | None,
+        limit: int,
+        seen: SeenProfiles,
+        after: tuple[float, int] | None = None,
+        eligibility_key: int | None = None,
+        candidates: Iterable[int] | None = None,
+    ) -> list[tuple[float, int]]:
+        """
+        Считает скор всех кандидатов векторно и выбирает лучшие.
+
+        Args:
+            user_id: ID пользователя, для которого ищем профили
+            city_factors: Множители за близость городов кандидатов к городу пользователя
+            preferred_gender: Предпочтительный пол
+            preferred_age_min: Минимальный предпочтительный возраст
+            preferred_age_max: Максимальный предпочтительный возраст
+            limit: Количество профилей
+            seen: Уже просмотренные профили
+            after: Курсор (total_score, user_id), с которого продолжить выдачу
+            eligibility_key: Биты пола и возраста пользователя для взаимного ранжирования (None - выключено)
+            candidates: Считать скор только для этих user_id (None - для всех)
+
+        Returns:
+            list: Пары (total_score, user_id) по убыванию скора
+        """
+        if limit <= 0 or not len(self.user_ids):
+            return []
+
+        # Как и в SQL, NULL в предпочтениях означает отсутствие совпадения
+        gender_code = GENDER_CODES.get(preferred_gender, -1)
+        if preferred_age_min is None or preferred_age_max is None:
+            age_min, age_max = 1, 0
+        else:
+            age_min, age_max = preferred_age_min, preferred_age_max
+
+        own_row = int(np.searchsorted(self.user_ids, user_id))
+        is_member = own_row < len(self.user_ids) and self.user_ids[own_row] == user_id
+        interests_mask = self.interest_masks[own_row] if is_member else np.uint64(0)
+
+        if candidates is None:
+            rows = slice(None)
+        else:
+            # Кандидатов, которых еще нет в снимке, пропускаем
+            candidate_ids = np.fromiter(candidates, dtype=np.int64)
+            rows = np.searchsorted(self.user_ids, candidate_ids)
+            present = rows < len(self.user_ids)
+            present[present] = self.user_ids[rows[present]] == candidate_ids[present]
+            rows = rows[present]
+
+        user_ids = self.user_ids[rows]
+        ages = self.ages[rows]
+        candidate_interests = self.interest_masks[rows]
+
+        # Сходство интересов по Жаккару; при пустом объединении пересечение тоже пустое
+        intersection = np.bitwise_count(candidate_interests & interests_mask)
+        union = np.bitwise_count(candidate_interests | interests_mask)
+        city_lookup = np.array([city_factors.get(city_id, 1) for city_id in self.cities], dtype=np.float64)
+
+        scores = (
+            (self.profile_scores[rows] + self.activity_scores[rows])
+            * np.where(self.genders[rows] == gender_code, GENDER_MULTIPLIER, 1)
+            * city_lookup[self.city_codes[rows]]
+            * np.where((ages >= age_min) & (ages <= age_max), AGE_MULTIPLIER, 1)
+            * (1 + INTEREST_WEIGHT * intersection / np.maximum(union, 1))
+        )
+        if eligibility_key is not None:
+            # Множитель за то, что пользователь подходит под предпочтения кандидата
+            accepts = (self.accepts_masks[rows] & eligibility_key) == eligibility_key
+            scores = scores * np.where(accepts, RECIPROCAL_MULTIPLIER, 1)
+
+        # Просмотренные профили отмечаем по обратной таблице, не проходя по всем строкам
+        seen_indexes = seen.indexes[seen.indexes < len(self.dense_rows)]
+        seen_rows = self.dense_rows[seen_indexes]
+        excluded = np.zeros(len(self.user_ids), dtype=bool)
+        excluded[seen_rows[seen_rows >= 0]] = True
+        valid = ~excluded[rows] & (user_ids != user_id)
+        if after is not None:
+            after_score, after_user_id = after
+            valid &= (scores < after_score) | ((scores == after_score) & (user_ids < after_user_id))
+
+        selected = np.flatnonzero(valid)
+        if len(selected) > limit:
+            selected = select_top(scores, user_ids, selected, limit)
+        # Порядок как у SQL: по убыванию скора, при равном скоре по убыванию user_id
+        order = np.lexsort((user_ids[selected], scores[selected]))[::-1]
+        selected = selected[order]
+        return list(zip(scores[selected].tolist(), user_ids[selected].tolist()))
+
+
+def select_top(scores: np.ndarray, user_ids: np.ndarray, selected: np.ndarray, limit: int) -> np.ndarray:
+    """
+    Выбирает limit строк с наибольшим (total_score, user_id) через argpartition.
+
+    argpartition не различает равные скоры на границе, поэтому среди них берутся
+    наибольшие user_id: иначе курсор выдачи пропустил бы часть анкет с тем же скором.
+    """
+    candidate_scores = scores[selected]
+    top = np.argpartition(candidate_scores, len(selected) - limit)[len(selected) - limit :]
+    threshold = candidate_scores[top].min()
+
+    above = selected[candidate_scores > threshold]
+    ties = selected[candidate_scores == threshold]
+    ties = ties[np.argsort(user_ids[ties])[::-1][: limit - len(above)]]
+    return np.concatenate([above, ties])
+
+
+candidate_scorer = CandidateScorer(settings.RANKING_SNAPSHOT_TTL)
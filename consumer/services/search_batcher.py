@@ -0,0 +1,108 @@
+import asyncio
+
+from config.settings import settings
+from consumer.logger import logger
+from consumer.metrics import SEARCH_BATCH_SIZE
+from consumer.services.profile_service import load_and_store_matching_profiles_batch
+from consumer.storage.db import async_session
+from consumer.storage.redis import publish_deck_ready
+
+
+class SearchBatcher:
+    """
+    Копит запросы поиска за короткое окно и ранжирует их одной пачкой.
+
+    Повторные запросы одного пользователя внутри окна объединяются в один, а запрос
+    пользователя, чья колода уже ранжируется, ждет эту же запись. Пачки ранжируются
+    по одной, поэтому колода пользователя не пополняется двумя пачками одновременно.
+    """
+
+    def __init__(self, window: float, max_size: int) -> None:
+        self.window = window
+        self.max_size = max_size
+        # user_id -> future, который завершится после записи колоды
+        self._pending: dict[int, asyncio.Future] = {}
+        # Пользователи пачки, которая ранжируется сейчас
+        self._in_flight: dict[int, asyncio.Future] = {}
+        self._flush_lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    def _get_future(self, user_id: int) -> asyncio.Future | None:
+        return self._pending.get(user_id) or self._in_flight.get(user_id)
+
+    async def submit(self, user_id: int) -> None:
+        """
+        Ставит пользователя в ближайшую пачку и ждет, пока его колода будет записана.
+
+        Args:
+            user_id: ID пользователя
+        """
+        future = self._get_future(user_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[user_id] = future
+
+        if len(self._pending) >= self.max_size:
+            await self.flush()
+        elif self._pending and self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+        # Future общий для всех запросов пользователя, отмена одного ожидающего не должна его отменять
+        await asyncio.shield(future)
+
+    async def wait_for(self, user_id: int) -> None:
+        """
+        Дожидается уже принятого запроса поиска пользователя, не дожидаясь конца окна.
+
+        Лайки и дизлайки обрабатываются после поиска, пришедшего раньше них, так что
+        пачка не перемешивает события одного пользователя.
+
+        Args:
+            user_id: ID пользователя
+        """
+        future = self._get_future(user_id)
+        if future is None:
+            return
+        if user_id in self._pending:
+            await self.flush()
+        # Ошибку поиска логирует его собственный обработчик
+        await asyncio.wait([future])
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self.flush()
+
+    async def _announce_empty(self, user_ids: list[int]) -> None:
+        """Сообщает боту о запросах без новой колоды, чтобы он не ждал ее бесконечно."""
+        for user_id in user_ids:
+            try:
+                await publish_deck_ready(user_id)
+            except Exception as e:
+                logger.error('Failed to notify the bot about an empty deck for user %s: %s', user_id, e)
+
+    async def flush(self) -> None:
+        """Ранжирует все накопленные запросы и будит ожидающих."""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return
+
+            self._in_flight = batch
+            SEARCH_BATCH_SIZE.observe(len(batch))
+            try:
+                async with async_session() as db:
+                    stored = await load_and_store_matching_profiles_batch(db, list(batch))
+            except Exception as e:
+                logger.error('Error processing search batch of %d users: %s', len(batch), e)
+                for future in batch.values():
+                    future.set_exception(e)
+            else:
+                for future in batch.values():
+                    future.set_result(None)
+                await self._announce_empty([user_id for user_id in batch if not stored.get(user_id)])
+            finally:
+                self._in_flight = {}
+
+
+search_batcher = SearchBatcher(settings.SEARCH_BATCH_WINDOW_MS / 1000, settings.SEARCH_BATCH_MAX_SIZE)
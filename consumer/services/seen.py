@@ -0,0 +1,98 @@
+from functools import cached_property
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from consumer.logger import logger
+from consumer.model.interaction import Dislike, Like
+from consumer.storage.redis import get_dense_indexes, get_seen_set, get_seen_sets, mark_seen, store_seen_set
+
+
+class SeenProfiles:
+    """
+    Множество уже просмотренных пользователем профилей.
+
+    Хранит плотные индексы профилей отсортированным массивом, поэтому его размер
+    зависит от истории свайпов пользователя, а не от числа всех анкет.
+    """
+
+    def __init__(self, indexes: np.ndarray) -> None:
+        self.indexes = np.unique(indexes)
+
+    @classmethod
+    def from_packed(cls, data: bytes) -> 'SeenProfiles':
+        """Разбирает упакованное множество из Redis; первый элемент - метка полной сборки."""
+        return cls(np.frombuffer(data, dtype=np.dtype(np.uint32).newbyteorder('<'))[1:])
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self.members
+
+    @cached_property
+    def members(self) -> frozenset[int]:
+        """Индексы для проверок по одному профилю."""
+        return frozenset(self.indexes.tolist())
+
+
+async def load_seen_profiles(db: AsyncSession, user_id: int) -> SeenProfiles:
+    """
+    Возвращает множество уже просмотренных пользователем профилей.
+
+    Если множества еще нет в Redis, строит его один раз по таблицам лайков и дизлайков.
+
+    Args:
+        db: Сессия базы данных
+        user_id: ID пользователя
+
+    Returns:
+        SeenProfiles: Плотные индексы просмотренных профилей
+    """
+    data = await get_seen_set(user_id)
+    if data is not None:
+        return SeenProfiles.from_packed(data)
+
+    result = await db.execute(
+        select(Like.target_user_id)
+        .where(Like.user_id == user_id)
+        .union(select(Dislike.target_user_id).where(Dislike.user_id == user_id))
+    )
+    target_user_ids = list(result.scalars())
+    indexes = list((await get_dense_indexes(target_user_ids)).values())
+    await store_seen_set(user_id, indexes)
+    logger.info('Seen set rebuilt for user %s from %d interactions', user_id, len(target_user_ids))
+
+    return SeenProfiles(np.array(indexes, dtype=np.uint32))
+
+
+async def load_seen_profiles_batch(db: AsyncSession, user_ids: list[int]) -> dict[int, SeenProfiles]:
+    """
+    Возвращает множества просмотренных профилей для нескольких пользователей.
+
+    Готовые множества читаются из Redis одним запросом, недостающие строятся по одному.
+
+    Args:
+        db: Сессия базы данных
+        user_ids: ID пользователей
+
+    Returns:
+        dict: user_id -> множество просмотренных профилей
+    """
+    seen = {}
+    for user_id, data in (await get_seen_sets(user_ids)).items():
+        seen[user_id] = SeenProfiles.from_packed(data) if data is not None else await load_seen_profiles(db, user_id)
+    return seen
+
+
+async def mark_profile_seen(user_id: int, target_user_id: int) -> None:
+    """
+    Отмечает профиль просмотренным после лайка или дизлайка.
+
+    Ошибка Redis только логируется и не откатывает уже сохраненное в БД взаимодействие.
+    """
+    try:
+        await mark_seen(user_id, target_user_id)
+    except Exception as e:
+        logger.error('Failed to mark profile %s as seen for user %s: %s', target_user_id, user_id, e)
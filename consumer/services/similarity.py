@@ -0,0 +1,287 @@
+import asyncio
+import heapq
+import math
+import random
+import re
+import time
+import zlib
+from array import array
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from consumer.logger import logger
+from consumer.model.interaction import Like
+from consumer.services.profile_service import fetch_ranked_profiles, load_and_store_matching_profiles
+from consumer.services.seen import SeenProfiles, load_seen_profiles
+from consumer.storage.db import async_session
+from consumer.storage.redis import get_dense_indexes, store_user_profiles
+from src.model.profile import Profile
+from src.model.user import User
+
+# Раскладка признакового вектора: возраст, пол, город, интересы, слова из bio
+AGE_OFFSET = 0
+GENDER_OFFSET = 1
+GENDER_DIMS = {'male': 0, 'female': 1, 'other': 2}
+CITY_OFFSET = 4
+CITY_BUCKETS = 16
+INTEREST_OFFSET = CITY_OFFSET + CITY_BUCKETS
+INTEREST_BITS = 64
+BIO_OFFSET = INTEREST_OFFSET + INTEREST_BITS
+BIO_BUCKETS = 64
+VECTOR_SIZE = BIO_OFFSET + BIO_BUCKETS
+
+# Вес каждой группы признаков в итоговом векторе
+AGE_WEIGHT = 1.0
+GENDER_WEIGHT = 1.0
+CITY_WEIGHT = 0.5
+INTEREST_WEIGHT = 1.5
+BIO_WEIGHT = 1.0
+
+# Параметры LSH на случайных проекциях: больше таблиц - выше полнота, больше бит - меньше корзины
+LSH_TABLES = 8
+LSH_BITS = 12
+LSH_SEED = 42
+
+WORD_RE = re.compile(r'\w+')
+
+
+def build_vector(
+    age: int | None,
+    gender: str | None,
+    city_id: int | None,
+    interests_mask: int | None,
+    bio: str | None,
+) -> dict[int, float]:
+    """
+    Строит разреженный нормированный вектор признаков профиля.
+
+    Returns:
+        dict: Номер признака -> значение
+    """
+    vector: dict[int, float] = {}
+
+    if age is not None:
+        vector[AGE_OFFSET] = AGE_WEIGHT * min(max(age - 18, 0), 50) / 50
+    if gender in GENDER_DIMS:
+        vector[GENDER_OFFSET + GENDER_DIMS[gender]] = GENDER_WEIGHT
+    if city_id is not None:
+        vector[CITY_OFFSET + city_id % CITY_BUCKETS] = CITY_WEIGHT
+
+    interests = [bit for bit in range(INTEREST_BITS) if (interests_mask or 0) >> bit & 1]
+    for bit in interests:
+        vector[INTEREST_OFFSET + bit] = INTEREST_WEIGHT / math.sqrt(len(interests))
+
+    # Мешок слов bio, захешированный в фиксированное число корзин
+    words: dict[int, int] = {}
+    for word in WORD_RE.findall((bio or '').lower()):
+        bucket = BIO_OFFSET + zlib.crc32(word.encode()) % BIO_BUCKETS
+        words[bucket] = words.get(bucket, 0) + 1
+    norm = math.sqrt(sum(count * count for count in words.values()))
+    for bucket, count in words.items():
+        vector[bucket] = BIO_WEIGHT * count / norm
+
+    length = math.sqrt(sum(value * value for value in vector.values()))
+    return {feature: value / length for feature, value in vector.items()} if length else {}
+
+
+def get_similarity(vector: dict[int, float], other_vector: dict[int, float]) -> float:
+    """Косинусное сходство нормированных разреженных векторов."""
+    if len(other_vector) < len(vector):
+        vector, other_vector = other_vector, vector
+    return sum(value * other_vector.get(feature, 0.0) for feature, value in vector.items())
+
+
+class SimilarityIndex:
+    """
+    Приближенный поиск похожих профилей на LSH со случайными проекциями.
+
+    Каждая из LSH_TABLES таблиц раскладывает профили по корзинам по знакам
+    LSH_BITS проекций вектора. Кандидаты - профили из тех же корзин, что и
+    понравившиеся пользователю, точное сходство считается только для них.
+    """
+
+    def __init__(self, tables: int, bits: int, seed: int) -> None:
+        rng = random.Random(seed)
+        # Проекции фиксированы, чтобы корзины не менялись между перестроениями
+        self.projections = [
+            [array('d', (rng.gauss(0.0, 1.0) for _ in range(VECTOR_SIZE))) for _ in range(bits)] for _ in range(tables)
+        ]
+        # Проекция среднего вектора: гиперплоскости проходят через центр данных, а не через ноль
+        self.offsets = [array('d', [0.0]) * bits for _ in range(tables)]
+        self.vectors: dict[int, dict[int, float]] = {}
+        self.dense_indexes: dict[int, int] = {}
+        self.buckets: list[dict[int, list[int]]] = [{} for _ in range(tables)]
+        self.built_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def get_signatures(self, vector: dict[int, float], offsets: list[array] | None = None) -> list[int]:
+        """Номера корзин вектора во всех таблицах."""
+        signatures = []
+        for projections, table_offsets in zip(self.projections, offsets or self.offsets):
+            signature = 0
+            for projection, offset in zip(projections, table_offsets):
+                signature <<= 1
+                if sum(value * projection[feature] for feature, value in vector.items()) >= offset:
+                    signature |= 1
+            signatures.append(signature)
+        return signatures
+
+    def build(self, rows: list[tuple], dense_indexes: dict[int, int]) -> None:
+        """
+        Перестраивает индекс; вызывается в отдельном потоке.
+
+        Args:
+            rows: Кортежи (user_id, age, gender, city_id, interests_mask, bio)
+            dense_indexes: user_id -> плотный индекс для проверки по множеству просмотренных
+        """
+        vectors = {}
+        mean = array('d', [0.0]) * VECTOR_SIZE
+        for user_id, age, gender, city_id, interests_mask, bio in rows:
+            vector = build_vector(age, gender, city_id, interests_mask, bio)
+            if not vector:
+                continue
+            vectors[user_id] = vector
+            for feature, value in vector.items():
+                mean[feature] += value / len(rows)
+
+        offsets = [
+            array('d', (sum(m * p for m, p in zip(mean, projection)) for projection in projections))
+            for projections in self.projections
+        ]
+        buckets: list[dict[int, list[int]]] = [{} for _ in self.projections]
+        for user_id, vector in vectors.items():
+            for table, signature in zip(buckets, self.get_signatures(vector, offsets)):
+                table.setdefault(signature, []).append(user_id)
+
+        # Подменяем индекс целиком, чтобы параллельный запрос не увидел его частично собранным
+        self.offsets = offsets
+        self.vectors = vectors
+        self.dense_indexes = dense_indexes
+        self.buckets = buckets
+        self.built_at = time.monotonic()
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """
+        Перечитывает профили из БД и перестраивает индекс, не блокируя event loop.
+
+        Args:
+            db: Сессия базы данных
+        """
+        async with self._lock:
+            result = await db.execute(
+                select(User.user_id, User.age, User.gender, User.city_id, User.interests_mask, Profile.bio).join(
+                    Profile, Profile.user_id == User.user_id
+                )
+            )
+            rows = result.all()
+            dense_indexes = await get_dense_indexes([row[0] for row in rows])
+            await asyncio.to_thread(self.build, rows, dense_indexes)
+
+        logger.info('Similarity index rebuilt: %d profiles', len(self))
+
+    async def ensure_built(self, db: AsyncSession) -> None:
+        """Строит индекс при первом обращении, если фоновое перестроение еще не успело."""
+        if not self.built_at:
+            await self.rebuild(db)
+
+    def query(self, user_id: int, liked_user_ids: list[int], limit: int, seen: SeenProfiles) -> list[tuple[float, int]]:
+        """
+        Ищет профили, похожие на понравившиеся пользователю.
+
+        Args:
+            user_id: ID пользователя, для которого ищем профили
+            liked_user_ids: ID недавно лайкнутых профилей
+            limit: Количество профилей
+            seen: Уже просмотренные профили
+
+        Returns:
+            list: Пары (сходство, user_id) по убыванию сходства
+        """
+        liked_vectors = [self.vectors[liked_id] for liked_id in liked_user_ids if liked_id in self.vectors]
+        excluded = {user_id, *liked_user_ids}
+
+        candidates: set[int] = set()
+        for vector in liked_vectors:
+            for table, signature in zip(self.buckets, self.get_signatures(vector)):
+                candidates.update(table.get(signature, ()))
+
+        scored = []
+        for candidate_id in candidates:
+            if candidate_id in excluded or self.dense_indexes.get(candidate_id) in seen:
+                continue
+            vector = self.vectors[candidate_id]
+            scored.append((max(get_similarity(vector, liked) for liked in liked_vectors), candidate_id))
+
+        return heapq.nlargest(limit, scored)
+
+
+async def load_and_store_similar_profiles(db: AsyncSession, user_id: int, limit: int = 5) -> list:
+    """
+    Загружает профили, похожие на недавно лайкнутые пользователем, и сохраняет их в Redis.
+
+    Если пользователь еще никого не лайкал, выдача строится обычным ранжированием.
+
+    Args:
+        db: Сессия базы данных
+        user_id: ID пользователя, для которого ищем профили
+        limit: Количество профилей для загрузки
+
+    Returns:
+        list: Список загруженных профилей
+    """
+    result = await db.execute(
+        select(Like.target_user_id)
+        .where(Like.user_id == user_id)
+        .order_by(Like.created_at.desc())
+        .limit(settings.SIMILAR_RECENT_LIKES)
+    )
+    liked_user_ids = list(result.scalars())
+
+    if not liked_user_ids:
+        logger.info('User %s has no likes yet, falling back to regular ranking', user_id)
+        result = await db.execute(select(Profile).where(Profile.user_id == user_id))
+        profile = result.scalar_one_or_none()
+        if not profile:
+            logger.warning('Profile not found for user %s', user_id)
+            return []
+        return await load_and_store_matching_profiles(
+            db=db,
+            user_id=user_id,
+            preferred_gender=profile.preferred_gender,
+            preferred_age_min=profile.preferred_age_min,
+            preferred_age_max=profile.preferred_age_max,
+            limit=limit,
+        )
+
+    await similarity_index.ensure_built(db)
+    seen = await load_seen_profiles(db, user_id)
+    ranked = similarity_index.query(user_id, liked_user_ids, limit, seen)
+    profiles_data = [profile for _, profile in await fetch_ranked_profiles(db, ranked)]
+
+    if profiles_data:
+        await store_user_profiles(user_id, profiles_data)
+        logger.info('Loaded and stored %d similar profiles for user %s', len(profiles_data), user_id)
+    else:
+        logger.warning('No similar profiles found for user %s', user_id)
+
+    return profiles_data
+
+
+async def run_similarity_rebuilds() -> None:
+    """Периодически перестраивает индекс похожих профилей в фоне."""
+    while True:
+        try:
+            async with async_session() as db:
+                await similarity_index.rebuild(db)
+        except Exception as e:
+            logger.error('Failed to rebuild similarity index: %s', e)
+
+        await asyncio.sleep(settings.SIMILARITY_REBUILD_INTERVAL)
+
+
+similarity_index = SimilarityIndex(LSH_TABLES, LSH_BITS, LSH_SEED)
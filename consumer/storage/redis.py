@@ -1,38 +1,68 @@
-import json
-from typing import List, Optional, Set
+import struct
+from typing import Dict, List, Optional, Set, Tuple
 
 from redis import asyncio as aioredis
-from consumer.logger import logger
 
-# Redis connection pool
-redis_pool = aioredis.ConnectionPool(
-    host='redis', port=6379, db=0, decode_responses=True  # Using service name from docker-compose
+from config.redis import get_redis_client
+from config.settings import settings
+from consumer.logger import logger
+from src.storage.card import decode_card, is_legacy_card
+from src.storage.deck_redis import (
+    CARD_KEY_PREFIX,
+    DECK_READY_CHANNEL,
+    pop_deck_entry,
+    queue_card_writes,
+    queue_deck_write,
 )
 
+# Hash user_id -> dense index used to address profiles in seen sets
+DENSE_INDEX_KEY = 'users:dense_index'
+DENSE_INDEX_SEQ_KEY = 'users:dense_index:seq'
+
+# Seen sets are packed little-endian uint32 dense indexes, one per swiped profile, so their size
+# follows the user's history rather than the number of profiles. Index 0 is never assigned
+# to a user; a set that starts with it was fully built from the database.
+SEEN_BUILT_MARK = 0
+SEEN_ENTRY = struct.Struct('<I')
+
+# How many of the latest likes given by a user are kept in Redis
+RECENT_LIKES_SIZE = 50
+
+# Per-user keys checked by the idle sweeper, by kind. An evicted seen set is rebuilt from
+# the database on the next search, since a set left without its built mark is not trusted.
+USER_KEY_PATTERNS = {
+    'deck': 'user:*:profiles',
+    'cursor': 'user:*:cursor',
+    'likes': 'user:*:likes',
+    'recent_likes': 'user:*:recent_likes',
+    'seen': 'user:*:seen',
+}
+
 
 async def get_redis() -> aioredis.Redis:
-    """Get Redis connection from the pool."""
-    return aioredis.Redis(connection_pool=redis_pool)
+    """Get the shared Redis client."""
+    return get_redis_client()
+
+
+async def get_raw_redis() -> aioredis.Redis:
+    """Get Redis connection that returns raw bytes."""
+    return get_redis_client(decode_responses=False)
 
 
 async def store_user_profiles(user_id: int, profiles: List[dict]) -> None:
     """
-    Store user profiles in Redis as a list.
+    Store user profiles in Redis as a list, replacing the previous one.
 
     Args:
         user_id: The ID of the user
         profiles: List of profile dictionaries to store
     """
     redis = await get_redis()
-    key = f"user:{user_id}:profiles"
 
     try:
-        # Clear existing profiles for this user
-        await redis.delete(key)
-
-        # Store each profile as a separate JSON string in the list
-        for profile in profiles:
-            await redis.rpush(key, json.dumps(profile))
+        async with redis.pipeline(transaction=True) as pipe:
+            queue_deck_write(pipe, user_id, profiles, replace=True)
+            await pipe.execute()
 
         logger.info('Stored %d profiles for user %s in Redis', len(profiles), user_id)
     except Exception as e:
@@ -40,6 +70,25 @@ async def store_user_profiles(user_id: int, profiles: List[dict]) -> None:
         raise
 
 
+async def publish_deck_ready(user_id: int) -> None:
+    """
+    Announce that a request for the user's deck is done without a new deck being written.
+
+    The bot resolves its "please wait" message on every announcement: with the first
+    card if the deck has any, with a "nothing new" note otherwise.
+
+    Args:
+        user_id: The ID of the user
+    """
+    redis = await get_redis()
+
+    try:
+        await redis.publish(DECK_READY_CHANNEL, user_id)
+    except Exception as e:
+        logger.error('Error publishing deck-ready for user %s: %s', user_id, e)
+        raise
+
+
 async def get_user_profiles(user_id: int) -> Optional[List[dict]]:
     """
     Get user profiles from Redis.
@@ -50,15 +99,21 @@ async def get_user_profiles(user_id: int) -> Optional[List[dict]]:
     Returns:
         List of profile dictionaries or None if not found
     """
-    redis = await get_redis()
+    redis = await get_raw_redis()
     key = f"user:{user_id}:profiles"
 
     try:
-        # Get all profiles from the list
-        data = await redis.lrange(key, 0, -1)
-        if data:
-            # Parse each JSON string in the list
-            profiles = [json.loads(profile) for profile in data]
+        # Get all profile ids from the list and their shared cards
+        entries = await redis.lrange(key, 0, -1)
+        if entries:
+            card_ids = [entry for entry in entries if not is_legacy_card(entry)]
+            async with redis.pipeline(transaction=False) as pipe:
+                for card_id in card_ids:
+                    pipe.hget(f"{CARD_KEY_PREFIX}{int(card_id)}", 'data')
+                cards = dict(zip(card_ids, await pipe.execute()))
+            # Legacy decks hold JSON cards themselves, cards that have already expired are skipped
+            data = [entry if is_legacy_card(entry) else cards[entry] for entry in entries]
+            profiles = [decode_card(card) for card in data if card]
             logger.info('Retrieved %d profiles for user %s from Redis', len(profiles), user_id)
             return profiles
         return None
@@ -77,38 +132,181 @@ async def get_next_profile(user_id: int) -> Optional[dict]:
     Returns:
         The next profile dictionary or None if not found
     """
-    redis = await get_redis()
-    key = f"user:{user_id}:profiles"
+    redis = await get_raw_redis()
 
     try:
-        # Check if there are any profiles in the list
-        profile_count = await redis.llen(key)
-        if profile_count == 0:
+        # Watermark 0 never sets the refill flag: refills are requested by the bot
+        _, data, remaining_count, _, _ = await pop_deck_entry(redis, user_id, 0)
+        if not data:
             logger.info('No profiles for user %s in Redis', user_id)
             # Return a special indicator that there are no profiles
             return {"last_profile": True, "user_id": user_id, "no_profiles": True}
 
-        # Get the first profile from the list
-        data = await redis.lpop(key)
-        if data:
-            profile = json.loads(data)
-            logger.info('Retrieved next profile for user %s from Redis', user_id)
-
-            # Check if this was the last profile
-            remaining_count = await redis.llen(key)
-            if remaining_count == 0:
-                logger.info('This was the last profile for user %s in Redis', user_id)
-                # Add a flag to indicate this was the last profile
-                profile["last_profile"] = True
+        profile = decode_card(data)
+        logger.info('Retrieved next profile for user %s from Redis', user_id)
 
-            return profile
+        # Check if this was the last profile
+        if remaining_count == 0:
+            logger.info('This was the last profile for user %s in Redis', user_id)
+            # Add a flag to indicate this was the last profile
+            profile["last_profile"] = True
 
-        return None
+        return profile
     except Exception as e:
         logger.error('Error retrieving next profile from Redis for user %s: %s', user_id, e)
         raise
 
 
+async def append_user_profiles(user_id: int, profiles: List[dict]) -> None:
+    """
+    Append profiles to the tail of the user's profile list.
+
+    Args:
+        user_id: The ID of the user
+        profiles: List of profile dictionaries to append
+    """
+    redis = await get_redis()
+
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            queue_deck_write(pipe, user_id, profiles, replace=False)
+            await pipe.execute()
+        logger.info('Appended %d profiles for user %s in Redis', len(profiles), user_id)
+    except Exception as e:
+        logger.error('Error appending profiles in Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def store_profile_cards(profiles: List[dict]) -> None:
+    """
+    Rewrite shared cards of edited profiles so every deck serves the new version.
+
+    Args:
+        profiles: List of profile dictionaries to store
+    """
+    redis = await get_redis()
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            queue_card_writes(pipe, profiles)
+            await pipe.execute()
+        logger.info('Stored %d profile cards in Redis', len(profiles))
+    except Exception as e:
+        logger.error('Error storing profile cards in Redis: %s', e)
+        raise
+
+
+async def get_deck_length(user_id: int) -> int:
+    """Get the number of profiles left in the user's profile list."""
+    redis = await get_redis()
+
+    try:
+        return await redis.llen(f"user:{user_id}:profiles")
+    except Exception as e:
+        logger.error('Error retrieving profile count from Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def get_ranking_cursor(user_id: int) -> Optional[Dict[str, str]]:
+    """
+    Get the position where the previous ranking of the user's candidates stopped.
+
+    Args:
+        user_id: The ID of the user
+
+    Returns:
+        Dictionary with score, user_id, signature and epoch or None if not found
+    """
+    redis = await get_redis()
+
+    try:
+        cursor = await redis.hgetall(f"user:{user_id}:cursor")
+        return cursor or None
+    except Exception as e:
+        logger.error('Error retrieving ranking cursor from Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def store_ranking_cursor(user_id: int, score: float, last_user_id: int, signature: str, epoch: int) -> None:
+    """
+    Store the last ranked candidate so the next refill continues after it.
+
+    Args:
+        user_id: The ID of the user
+        score: Total score of the last ranked candidate
+        last_user_id: The ID of the last ranked candidate
+        signature: Search preferences the ranking was made for
+        epoch: Ranking epoch the cursor belongs to
+    """
+    redis = await get_redis()
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(
+                f"user:{user_id}:cursor",
+                mapping={'score': repr(score), 'user_id': last_user_id, 'signature': signature, 'epoch': epoch},
+            )
+            pipe.expire(f"user:{user_id}:cursor", settings.DECK_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.error('Error storing ranking cursor in Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def get_refill_states(user_ids: List[int]) -> List[Tuple[Optional[Dict[str, str]], int]]:
+    """
+    Get ranking cursors and profile counts of several users in one round trip.
+
+    Args:
+        user_ids: IDs of the users
+
+    Returns:
+        For every user, the ranking cursor (or None) and the number of profiles left
+    """
+    redis = await get_redis()
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hgetall(f"user:{user_id}:cursor")
+                pipe.llen(f"user:{user_id}:profiles")
+            results = await pipe.execute()
+        return [(cursor or None, length) for cursor, length in zip(results[::2], results[1::2])]
+    except Exception as e:
+        logger.error('Error retrieving refill states from Redis: %s', e)
+        raise
+
+
+async def store_decks(
+    decks: List[Tuple[int, List[dict], bool]],
+    cursors: List[Tuple[int, float, int, str, int]],
+) -> None:
+    """
+    Write profile lists and ranking cursors of several users in one pipeline.
+
+    Args:
+        decks: Tuples of (user_id, profiles, replace); replace drops the old list first
+        cursors: Tuples of (user_id, score, last_user_id, signature, epoch)
+    """
+    redis = await get_redis()
+
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            for user_id, profiles, replace in decks:
+                queue_deck_write(pipe, user_id, profiles, replace)
+            for user_id, score, last_user_id, signature, epoch in cursors:
+                pipe.hset(
+                    f"user:{user_id}:cursor",
+                    mapping={'score': repr(score), 'user_id': last_user_id, 'signature': signature, 'epoch': epoch},
+                )
+                pipe.expire(f"user:{user_id}:cursor", settings.DECK_TTL)
+            await pipe.execute()
+        logger.info('Stored profiles for %d users in Redis', len(decks))
+    except Exception as e:
+        logger.error('Error storing profiles in Redis for %d users: %s', len(decks), e)
+        raise
+
+
 async def store_like(user_id: int, target_user_id: int) -> None:
     """
     Store a like in Redis.
@@ -121,14 +319,103 @@ async def store_like(user_id: int, target_user_id: int) -> None:
     key = f"user:{target_user_id}:likes"
 
     try:
-        # Add user_id to the set of users who liked target_user_id
-        await redis.sadd(key, user_id)
+        async with redis.pipeline(transaction=False) as pipe:
+            # Add user_id to the set of users who liked target_user_id
+            pipe.sadd(key, user_id)
+            pipe.expire(key, settings.USER_IDLE_DAYS * 24 * 60 * 60)
+            # Keep the latest likes given by user_id as seeds for co-like recommendations
+            pipe.lpush(f"user:{user_id}:recent_likes", target_user_id)
+            pipe.ltrim(f"user:{user_id}:recent_likes", 0, RECENT_LIKES_SIZE - 1)
+            pipe.expire(f"user:{user_id}:recent_likes", settings.USER_IDLE_DAYS * 24 * 60 * 60)
+            await pipe.execute()
         logger.info('Stored like from user %s to user %s in Redis', user_id, target_user_id)
     except Exception as e:
         logger.error('Error storing like in Redis: %s', e)
         raise
 
 
+async def sweep_idle_keys(pattern: str, max_idle: int, batch_size: int = 500) -> Tuple[int, int, int]:
+    """
+    Delete keys matching a pattern that nobody touched for longer than max_idle seconds.
+
+    Keys are walked with SCAN, so the sweep never blocks Redis for long. Idle time
+    and size of every batch are read with one pipeline.
+
+    Args:
+        pattern: Key pattern to sweep
+        max_idle: Idle time in seconds after which a key is deleted
+        batch_size: Number of keys checked per round trip
+
+    Returns:
+        Number of keys kept, their approximate size in bytes and number of keys deleted
+    """
+    redis = await get_redis()
+    kept = size = evicted = 0
+
+    async def sweep_batch(keys: List[str]) -> None:
+        nonlocal kept, size, evicted
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.object('idletime', key)
+                pipe.memory_usage(key)
+            results = await pipe.execute()
+
+        idle_keys = []
+        for key, idle, usage in zip(keys, results[::2], results[1::2]):
+            # A key that expired between SCAN and the pipeline has neither idle time nor size
+            if idle is None:
+                continue
+            if idle > max_idle:
+                idle_keys.append(key)
+            else:
+                kept += 1
+                size += usage or 0
+        if idle_keys:
+            evicted += await redis.delete(*idle_keys)
+
+    try:
+        batch = []
+        async for key in redis.scan_iter(match=pattern, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                await sweep_batch(batch)
+                batch = []
+        if batch:
+            await sweep_batch(batch)
+        return kept, size, evicted
+    except Exception as e:
+        logger.error('Error sweeping idle keys %s in Redis: %s', pattern, e)
+        raise
+
+
+async def get_colike_states(user_ids: List[int], count: int) -> Dict[int, Tuple[List[int], List[int]]]:
+    """
+    Get the latest likes and the current deck of several users in one round trip.
+
+    Args:
+        user_ids: IDs of the users
+        count: How many latest likes to return per user
+
+    Returns:
+        Mapping user_id -> (liked user IDs newest first, user IDs left in the deck)
+    """
+    redis = await get_redis()
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.lrange(f"user:{user_id}:recent_likes", 0, count - 1)
+                pipe.lrange(f"user:{user_id}:profiles", 0, -1)
+            results = await pipe.execute()
+        return {
+            user_id: ([int(entry) for entry in likes], [int(entry) for entry in deck])
+            for user_id, likes, deck in zip(user_ids, results[::2], results[1::2])
+        }
+    except Exception as e:
+        logger.error('Error retrieving recent likes and decks from Redis: %s', e)
+        raise
+
+
 async def get_likes(user_id: int) -> Set[str]:
     """
     Get all users that have liked a user from Redis.
@@ -150,3 +437,255 @@ async def get_likes(user_id: int) -> Set[str]:
     except Exception as e:
         logger.error('Error retrieving likes from Redis for user %s: %s', user_id, e)
         raise
+
+
+async def get_dense_indexes(user_ids: List[int]) -> Dict[int, int]:
+    """
+    Get dense indexes for users, assigning new ones to users that have none.
+
+    Telegram user IDs are sparse, so seen sets are addressed by a dense
+    index allocated from a counter instead of the user ID itself.
+
+    Args:
+        user_ids: IDs of the users
+
+    Returns:
+        Mapping of user ID to dense index
+    """
+    if not user_ids:
+        return {}
+
+    redis = await get_redis()
+
+    try:
+        values = await redis.hmget(DENSE_INDEX_KEY, user_ids)
+        indexes = {user_id: int(value) for user_id, value in zip(user_ids, values) if value is not None}
+
+        missing = [user_id for user_id in user_ids if user_id not in indexes]
+        if missing:
+            # INCRBY reserves a contiguous range; the counter starts at 1 so bit 0 stays free
+            last = await redis.incrby(DENSE_INDEX_SEQ_KEY, len(missing))
+            first = last - len(missing) + 1
+            async with redis.pipeline(transaction=False) as pipe:
+                for offset, user_id in enumerate(missing):
+                    pipe.hsetnx(DENSE_INDEX_KEY, user_id, first + offset)
+                await pipe.execute()
+
+            # Another consumer may have assigned some of them first, HSETNX keeps its value
+            values = await redis.hmget(DENSE_INDEX_KEY, missing)
+            indexes.update({user_id: int(value) for user_id, value in zip(missing, values)})
+            logger.info('Assigned dense indexes to %d users', len(missing))
+
+        return indexes
+    except Exception as e:
+        logger.error('Error getting dense indexes from Redis: %s', e)
+        raise
+
+
+def is_seen_set_built(data: Optional[bytes]) -> bool:
+    """Check that a packed seen set was built from the database and not only appended to by mark_seen."""
+    return bool(data) and len(data) % SEEN_ENTRY.size == 0 and SEEN_ENTRY.unpack_from(data)[0] == SEEN_BUILT_MARK
+
+
+async def get_seen_set(user_id: int) -> Optional[bytes]:
+    """
+    Get the packed set of profiles the user has already liked or disliked.
+
+    Args:
+        user_id: The ID of the user
+
+    Returns:
+        Packed dense indexes or None if the set has not been built yet
+    """
+    redis = await get_raw_redis()
+    key = f"user:{user_id}:seen"
+
+    try:
+        data = await redis.get(key)
+        return data if is_seen_set_built(data) else None
+    except Exception as e:
+        logger.error('Error retrieving seen set from Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def get_seen_sets(user_ids: List[int]) -> Dict[int, Optional[bytes]]:
+    """
+    Get seen sets of several users in one round trip.
+
+    Args:
+        user_ids: IDs of the users
+
+    Returns:
+        Mapping user_id -> packed dense indexes or None if the set has not been built yet
+    """
+    redis = await get_raw_redis()
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.get(f"user:{user_id}:seen")
+            results = await pipe.execute()
+        return {user_id: data if is_seen_set_built(data) else None for user_id, data in zip(user_ids, results)}
+    except Exception as e:
+        logger.error('Error retrieving seen sets from Redis: %s', e)
+        raise
+
+
+async def store_seen_set(user_id: int, indexes: List[int]) -> None:
+    """
+    Build the seen set for a user from scratch.
+
+    Args:
+        user_id: The ID of the user
+        indexes: Dense indexes of profiles the user has already seen
+    """
+    redis = await get_redis()
+    key = f"user:{user_id}:seen"
+
+    try:
+        await redis.set(key, struct.pack(f'<{len(indexes) + 1}I', SEEN_BUILT_MARK, *indexes))
+        logger.info('Stored seen set with %d profiles for user %s in Redis', len(indexes), user_id)
+    except Exception as e:
+        logger.error('Error storing seen set in Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def mark_seen(user_id: int, target_user_id: int) -> None:
+    """
+    Add a profile to the user's seen set.
+
+    APPEND is atomic, so concurrent swipes of one user never overwrite each other.
+
+    Args:
+        user_id: The ID of the user who swiped
+        target_user_id: The ID of the swiped profile
+    """
+    indexes = await get_dense_indexes([target_user_id])
+    redis = await get_redis()
+    key = f"user:{user_id}:seen"
+
+    try:
+        await redis.append(key, SEEN_ENTRY.pack(indexes[target_user_id]))
+    except Exception as e:
+        logger.error('Error marking profile %s as seen for user %s: %s', target_user_id, user_id, e)
+        raise
+
+
+# Candidate pools: one sorted set of user_id -> base score per (city, gender, age) segment
+POOL_SEGMENTS_KEY = 'pool:segments'
+POOL_MEMBERSHIP_KEY = 'pool:membership'
+
+
+async def replace_pools(members: List[Tuple[int, str, float]]) -> None:
+    """
+    Rebuild all candidate pools from scratch in one transaction.
+
+    Args:
+        members: Tuples of (user_id, segment, base score)
+    """
+    redis = await get_redis()
+
+    try:
+        old_segments = await redis.smembers(POOL_SEGMENTS_KEY)
+        async with redis.pipeline(transaction=True) as pipe:
+            for segment in old_segments:
+                pipe.delete(f"pool:{segment}")
+            pipe.delete(POOL_SEGMENTS_KEY, POOL_MEMBERSHIP_KEY)
+            for user_id, segment, score in members:
+                pipe.zadd(f"pool:{segment}", {user_id: score})
+                pipe.hset(POOL_MEMBERSHIP_KEY, user_id, segment)
+                pipe.sadd(POOL_SEGMENTS_KEY, segment)
+            await pipe.execute()
+        logger.info('Rebuilt candidate pools with %d profiles', len(members))
+    except Exception as e:
+        logger.error('Error rebuilding candidate pools in Redis: %s', e)
+        raise
+
+
+async def store_pool_member(user_id: int, segment: str, score: float) -> None:
+    """
+    Add a user to a candidate pool, moving them out of their previous segment.
+
+    Args:
+        user_id: The ID of the user
+        segment: Segment the user belongs to now
+        score: Base score of the user
+    """
+    redis = await get_redis()
+
+    try:
+        old_segment = await redis.hget(POOL_MEMBERSHIP_KEY, user_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            if old_segment and old_segment != segment:
+                pipe.zrem(f"pool:{old_segment}", user_id)
+            pipe.zadd(f"pool:{segment}", {user_id: score})
+            pipe.hset(POOL_MEMBERSHIP_KEY, user_id, segment)
+            pipe.sadd(POOL_SEGMENTS_KEY, segment)
+            await pipe.execute()
+        logger.info('Stored user %s in candidate pool %s', user_id, segment)
+    except Exception as e:
+        logger.error('Error storing user %s in candidate pool: %s', user_id, e)
+        raise
+
+
+async def update_pool_score(user_id: int, score: float) -> None:
+    """
+    Update the base score of a user in their candidate pool.
+
+    Args:
+        user_id: The ID of the user
+        score: New base score
+    """
+    redis = await get_redis()
+
+    try:
+        segment = await redis.hget(POOL_MEMBERSHIP_KEY, user_id)
+        if segment:
+            await redis.zadd(f"pool:{segment}", {user_id: score}, xx=True)
+    except Exception as e:
+        logger.error('Error updating pool score for user %s: %s', user_id, e)
+        raise
+
+
+async def get_pool_segments() -> Set[str]:
+    """Get all non-empty candidate pool segments."""
+    redis = await get_redis()
+
+    try:
+        return await redis.smembers(POOL_SEGMENTS_KEY)
+    except Exception as e:
+        logger.error('Error retrieving candidate pool segments from Redis: %s', e)
+        raise
+
+
+async def get_pool_pages(pages: List[Tuple[str, Optional[float], int, int]]) -> List[List[Tuple[int, float]]]:
+    """
+    Read pages of several candidate pools in one round trip.
+
+    A page starts at the given base score bound, so a refill that continues from a
+    cursor never reads the part of a pool that was served before.
+
+    Args:
+        pages: Tuples of (segment, highest base score to read or None for the top, offset, count)
+
+    Returns:
+        For every page, (user_id, base score) pairs by descending score
+    """
+    redis = await get_redis()
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for segment, max_score, offset, count in pages:
+                pipe.zrevrangebyscore(
+                    f"pool:{segment}",
+                    max_score if max_score is not None else '+inf',
+                    '-inf',
+                    start=offset,
+                    num=count,
+                    withscores=True,
+                )
+            results = await pipe.execute()
+        return [[(int(user_id), score) for user_id, score in page] for page in results]
+    except Exception as e:
+        logger.error('Error reading candidate pools from Redis: %s', e)
+        raise
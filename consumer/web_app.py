@@ -5,9 +5,17 @@ from typing import AsyncGenerator
 
 from fastapi import FastAPI
 
+from config.redis import close_redis_clients
+from config.settings import settings
 from consumer.api.tech.router import router as tech_router
 from consumer.app import start_consumer
 from consumer.logger import LOGGING_CONFIG, logger
+from consumer.services.eviction import run_idle_sweeps
+from consumer.services.geo import city_distances
+from consumer.services.pools import rebuild_pools
+from consumer.services.postings import segment_index
+from consumer.services.similarity import run_similarity_rebuilds
+from consumer.storage.db import async_session
 
 
 @asynccontextmanager
@@ -15,11 +23,38 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     logging.config.dictConfig(LOGGING_CONFIG)
 
     logger.info('Starting lifespan')
+
+    try:
+        async with async_session() as db:
+            await city_distances.load(db)
+    except Exception as e:
+        logger.error('Failed to build city distance matrix on startup: %s', e)
+
+    if settings.RANKING_ENGINE == 'pool':
+        # Пулы могли устареть, пока консюмер был остановлен
+        try:
+            async with async_session() as db:
+                await rebuild_pools(db)
+        except Exception as e:
+            logger.error('Failed to rebuild candidate pools on startup: %s', e)
+
+    if settings.RANKING_ENGINE == 'index':
+        try:
+            async with async_session() as db:
+                await segment_index.load(db)
+        except Exception as e:
+            logger.error('Failed to build segment index on startup: %s', e)
+
     task = asyncio.create_task(start_consumer())
+    similarity_task = asyncio.create_task(run_similarity_rebuilds())
+    sweep_task = asyncio.create_task(run_idle_sweeps())
 
     logger.info('Started succesfully')
     yield
 
+    similarity_task.cancel()
+    sweep_task.cancel()
+
     if task is not None:
         logger.info('Stopping polling...')
         task.cancel()
@@ -28,6 +63,8 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         except asyncio.CancelledError:
             logger.info('Polling stopped')
 
+    await close_redis_clients()
+
     logger.info('Ending lifespan')
 
 
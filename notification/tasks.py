@@ -15,6 +15,7 @@ from notification.bot import bot
 from notification.storage.db import async_session
 from notification.storage.models import User, Profile, City
 from notification.celery_app import celery_app
+from config.redis import get_redis_client
 from config.settings import settings
 
 # Initialize Minio client
@@ -28,13 +29,10 @@ minio_client = Minio(
 # Log startup message
 logger.info('Notification service started. Checking for likes every 2 minutes.')
 
-# Redis connection pool
-redis_pool = aioredis.ConnectionPool(host='redis', port=6379, db=0, decode_responses=True, max_connections=10)
-
 
 async def get_redis() -> aioredis.Redis:
-    """Get Redis connection from the pool."""
-    return aioredis.Redis(connection_pool=redis_pool)
+    """Get the shared Redis client; it is reused between tasks and must not be closed."""
+    return get_redis_client()
 
 
 async def get_likes_for_user(user_id: int) -> List[int]:
@@ -49,8 +47,6 @@ async def get_likes_for_user(user_id: int) -> List[int]:
     except Exception as e:
         logger.error('Error getting likes for user %s: %s', user_id, str(e))
         return []
-    finally:
-        await redis.close()
 
 
 async def download_from_presigned_url(url: str) -> str | None:
@@ -165,8 +161,6 @@ async def send_notification(user_id: int, likes: List[int]) -> None:
 
     except Exception as e:
         logger.error('Error sending notification to user %s: %s', user_id, str(e))
-    finally:
-        await redis.close()
 
 
 @celery_app.task(name='notification.tasks.check_likes', bind=True)
@@ -191,8 +185,6 @@ def check_likes(self) -> None:
         except Exception as e:
             logger.error('Error in check_likes task: %s', str(e))
             raise
-        finally:
-            await redis.close()
 
     # Run the async function in an event loop
     loop = asyncio.get_event_loop()
@@ -0,0 +1,74 @@
+"""
+Микробенчмарк подготовки карточки к отправке при свайпе.
+
+Сравнивает сборку подписи и клавиатуры в боте при каждом свайпе с десериализацией
+того, что консюмер отрендерил заранее. Оба варианта начинаются с декодирования карточки.
+
+    python -m scripts.benchmark_card_render --swipes 100000
+"""
+
+import argparse
+import time
+
+import msgpack
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.services.card import format_profile_text, get_profile_caption, get_profile_markup, render_profile_card
+from src.storage.card import CARD_SCHEMAS, decode_card, encode_card
+
+PROFILE = {
+    'user_id': 123456789,
+    'first_name': 'Анна',
+    'age': 27,
+    'gender': 'female',
+    'bio': 'Люблю путешествия, кино и долгие прогулки по набережной',
+    'photo_url': 'http://minio:9000/documents/123456789_profile_photo_123456789.jpg',
+    'profile_score': 0.71,
+    'activity_score': 0.42,
+    'likes_count': 18,
+    'dislikes_count': 3,
+}
+
+
+def render_on_swipe(data: bytes) -> tuple:
+    """Как было: бот собирает подпись и клавиатуру при каждом свайпе."""
+    profile = decode_card(data)
+    keyboard = InlineKeyboardBuilder()
+    keyboard.button(text='❤️ Like', callback_data=f'like_{profile["user_id"]}')
+    keyboard.button(text='👎 Dislike', callback_data=f'dislike_{profile["user_id"]}')
+    keyboard.adjust(2)
+    return format_profile_text(profile), keyboard.as_markup()
+
+
+def deserialize_on_swipe(data: bytes) -> tuple:
+    """Как стало: бот только достает готовые подпись и клавиатуру из карточки."""
+    profile = decode_card(data)
+    return get_profile_caption(profile), get_profile_markup(profile)
+
+
+def measure(swipe, data: bytes, swipes: int) -> float:
+    """Микросекунды на один свайп."""
+    start = time.perf_counter()
+    for _ in range(swipes):
+        swipe(data)
+    return (time.perf_counter() - start) / swipes * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Стоимость подготовки карточки к отправке')
+    parser.add_argument('--swipes', type=int, default=100000)
+    args = parser.parse_args()
+
+    plain_card = msgpack.packb([1, *(PROFILE.get(field) for field in CARD_SCHEMAS[1])])
+    rendered_card = encode_card(render_profile_card(dict(PROFILE)))
+    assert render_on_swipe(plain_card) == deserialize_on_swipe(rendered_card)
+
+    before = measure(render_on_swipe, plain_card, args.swipes)
+    after = measure(deserialize_on_swipe, rendered_card, args.swipes)
+    print(f'Сборка при свайпе:      {before:.2f} мкс/свайп (карточка {len(plain_card)} байт)')
+    print(f'Готовый рендер:         {after:.2f} мкс/свайп (карточка {len(rendered_card)} байт)')
+    print(f'Экономия:               {before - after:.2f} мкс/свайп ({(1 - after / before) * 100:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Нагрузочный тест хранилища колод: запись колод и свайпы до их исчерпания.
+
+Бэкенд 'memory' не требует запущенного Redis.
+
+    python -m scripts.benchmark_decks --backend memory --users 1000 --deck-size 20
+"""
+
+import argparse
+import asyncio
+import time
+
+from config.settings import settings
+from src.storage.deck import MemoryDeckStore, RedisDeckStore
+
+
+def build_profiles(user_id: int, deck_size: int, pool_size: int) -> list[dict]:
+    """Синтетическая колода; карточки общие для всех колод, как у популярных анкет."""
+    return [
+        {
+            'user_id': (user_id * deck_size + offset) % pool_size + 1,
+            'first_name': 'Имя',
+            'age': 18 + offset % 40,
+            'gender': 'female' if offset % 2 else 'male',
+            'bio': 'Люблю путешествия и кино',
+            'photo_url': None,
+            'profile_score': 0.5,
+            'activity_score': 0.5,
+            'likes_count': offset,
+            'dislikes_count': 0,
+        }
+        for offset in range(deck_size)
+    ]
+
+
+async def swipe_until_empty(store: RedisDeckStore | MemoryDeckStore, user_id: int) -> int:
+    """Листает колоду пользователя до конца и возвращает количество свайпов."""
+    swipes = 0
+    while True:
+        profile, _, _ = await store.get_next_profile(user_id)
+        if profile is None:
+            return swipes
+        swipes += 1
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Пропускная способность хранилища колод')
+    parser.add_argument('--backend', choices=['memory', 'redis'], default='memory')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--deck-size', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=5000, help='Сколько разных карточек в колодах')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.backend == 'memory':
+        store = MemoryDeckStore(settings.DECK_MEMORY_MAX_USERS, settings.DECK_MEMORY_MAX_CARDS)
+    else:
+        store = RedisDeckStore()
+
+    decks = {user_id: build_profiles(user_id, args.deck_size, args.pool_size) for user_id in range(1, args.users + 1)}
+
+    for number in range(1, args.rounds + 1):
+        start = time.perf_counter()
+        await asyncio.gather(*(store.store_user_profiles(user_id, profiles) for user_id, profiles in decks.items()))
+        stored = time.perf_counter() - start
+
+        start = time.perf_counter()
+        swipes = sum(await asyncio.gather(*(swipe_until_empty(store, user_id) for user_id in decks)))
+        swiped = time.perf_counter() - start
+
+        print(
+            f'Раунд {number} ({args.backend}): '
+            f'запись {len(decks) / stored:.0f} колод/с, '
+            f'свайпы {swipes / swiped:.0f}/с ({swipes} за {swiped:.3f} с)'
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
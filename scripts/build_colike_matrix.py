@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import logging
+
+from config.settings import settings
+from consumer.services.colike import rebuild_colike_matrix
+from consumer.storage.db import async_session
+
+
+async def build() -> None:
+    """Строит матрицу совместных лайков один раз."""
+    async with async_session() as db:
+        await rebuild_colike_matrix(db)
+    print(f'Матрица совместных лайков записана в {settings.COLIKE_MATRIX_PATH}')
+
+
+async def build_forever() -> None:
+    """Перестраивает матрицу совместных лайков каждые COLIKE_REBUILD_INTERVAL секунд."""
+    while True:
+        try:
+            await build()
+        except Exception as e:
+            logging.exception('Ошибка при построении матрицы совместных лайков: %s', e)
+
+        await asyncio.sleep(settings.COLIKE_REBUILD_INTERVAL)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Построение матрицы совместных лайков, которую читают все реплики консюмера'
+    )
+    parser.add_argument(
+        '--loop',
+        action='store_true',
+        help='Не завершаться, а перестраивать матрицу каждые COLIKE_REBUILD_INTERVAL секунд',
+    )
+    args = parser.parse_args()
+
+    asyncio.run(build_forever() if args.loop else build())
@@ -7,6 +7,8 @@ from sqlalchemy import insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.model import City, Interest, Profile, Rating, User, UserInterest
+from src.services.eligibility import refresh_accepts_masks
+from src.services.interest import refresh_interests_masks
 from src.storage.db import async_session
 
 # async def clear_tables(session: AsyncSession) -> None:
@@ -31,17 +33,21 @@ from src.storage.db import async_session
 #     print("Последовательности сброшены")
 
 
-async def get_or_create_city(session: AsyncSession, city_name: str) -> City:
+async def get_or_create_city(session: AsyncSession, city_data: dict) -> City:
     """Получает существующий город или создает новый."""
     # Ищем город по имени
-    result = await session.execute(select(City).where(City.name == city_name))
+    result = await session.execute(select(City).where(City.name == city_data['name']))
     city = result.scalar_one_or_none()
 
     if city is None:
         # Если город не найден, создаем новый
-        city = City(name=city_name)
+        city = City(**city_data)
         session.add(city)
         await session.flush()  # Получаем ID нового города
+    else:
+        # Координаты могли появиться в фикстурах позже самого города
+        city.latitude = city_data.get('latitude')
+        city.longitude = city_data.get('longitude')
 
     return city
 
@@ -131,7 +137,7 @@ async def load_cities(session: AsyncSession, file_path: str) -> None:
             cities_data = json.load(f)
 
         for city_data in cities_data:
-            await get_or_create_city(session, city_data['name'])
+            await get_or_create_city(session, city_data)
 
         await session.commit()
         print(f"Successfully loaded cities from {file_path}")
@@ -184,6 +190,9 @@ async def load_profiles(session: AsyncSession, file_path: str) -> None:
         for profile_data in profiles_data:
             await get_or_create_profile(session, profile_data)
 
+        # Пересобираем битовые маски предпочтений затронутых пользователей
+        await refresh_accepts_masks(session, {profile_data['user_id'] for profile_data in profiles_data})
+
         await session.commit()
         print(f"Successfully loaded profiles from {file_path}")
     except Exception as e:
@@ -218,6 +227,11 @@ async def load_user_interests(session: AsyncSession, file_path: str) -> None:
         for user_interest_data in user_interests_data:
             await get_or_create_user_interest(session, user_interest_data['user_id'], user_interest_data['interest_id'])
 
+        # Пересобираем битовые маски интересов затронутых пользователей
+        await refresh_interests_masks(
+            session, {user_interest_data['user_id'] for user_interest_data in user_interests_data}
+        )
+
         await session.commit()
         print(f"Successfully loaded user interests from {file_path}")
     except Exception as e:
@@ -268,6 +282,11 @@ async def main() -> None:
         await load_ratings(session, fixtures_dir / "ratings.json")
         print("Рейтинги загружены")
 
+        # Загрузка интересов
+        await load_interests(session, fixtures_dir / "interests.json")
+        await load_user_interests(session, fixtures_dir / "user_interests.json")
+        print("Интересы загружены")
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,11 +1,52 @@
+import argparse
 import asyncio
+import json
 import logging
+from pathlib import Path
 
-from sqlalchemy import text
+from sqlalchemy import bindparam, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
 
-from src.model import Profile, meta
+from src.model import City, Profile, meta
+from src.services.eligibility import refresh_accepts_masks
+from src.services.interest import refresh_interests_masks
 from src.storage.db import engine
 
+CITIES_FIXTURE = Path(__file__).parent.parent / 'fixtures' / 'cities.json'
+
+# Колонки, добавленные в модели после создания таблиц: create_all не меняет уже существующие таблицы
+ADD_COLUMNS = [
+    'ALTER TABLE users ADD COLUMN IF NOT EXISTS interests_mask BIGINT NOT NULL DEFAULT 0',
+    'ALTER TABLE users ADD COLUMN IF NOT EXISTS accepts_mask BIGINT NOT NULL DEFAULT 0',
+    'ALTER TABLE cities ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION',
+    'ALTER TABLE cities ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION',
+]
+
+# Счетчики взаимодействий по уже сохраненным лайкам и дизлайкам, в тех же правилах, что и в консюмере:
+# лайк в ответ на лайк засчитывается мэтчем обоим пользователям
+BACKFILL_INTERACTION_COUNTERS = '''
+INSERT INTO interaction_counters (user_id, likes_received, dislikes_received, likes_given, matches)
+SELECT user_id, sum(likes_received), sum(dislikes_received), sum(likes_given), sum(matches)
+FROM (
+    SELECT target_user_id AS user_id, 1 AS likes_received, 0 AS dislikes_received, 0 AS likes_given, 0 AS matches
+    FROM likes
+    UNION ALL
+    SELECT target_user_id, 0, 1, 0, 0 FROM dislikes
+    UNION ALL
+    SELECT user_id, 0, 0, 1, 0 FROM likes
+    UNION ALL
+    SELECT given.user_id, 0, 0, 0, 1
+    FROM likes AS given
+    JOIN likes AS answered ON answered.user_id = given.target_user_id AND answered.target_user_id = given.user_id
+) AS interactions
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET
+    likes_received = EXCLUDED.likes_received,
+    dislikes_received = EXCLUDED.dislikes_received,
+    likes_given = EXCLUDED.likes_given,
+    matches = EXCLUDED.matches
+'''
+
 
 async def migrate() -> None:
     try:
@@ -32,5 +73,63 @@ async def migrate() -> None:
         logging.exception('Ошибка при выполнении миграции: %s', e)
 
 
+async def add_columns(conn: AsyncConnection) -> None:
+    """Добавляет в существующие таблицы новые колонки моделей."""
+    for statement in ADD_COLUMNS:
+        await conn.execute(text(statement))
+    print('Недостающие колонки добавлены')
+
+
+async def backfill_masks(conn: AsyncConnection) -> None:
+    """Пересчитывает битовые маски пользователей по их интересам и предпочтениям анкет."""
+    # Сессия работает в транзакции соединения, поэтому миграция применяется целиком или никак
+    session = AsyncSession(bind=conn)
+    await refresh_interests_masks(session)
+    await refresh_accepts_masks(session)
+    print('Маски интересов и предпочтений пересчитаны')
+
+
+async def backfill_city_coordinates(conn: AsyncConnection) -> None:
+    """Заполняет координаты существующих городов из фикстуры городов."""
+    with open(CITIES_FIXTURE, 'r', encoding='utf-8') as f:
+        cities = [
+            {'city_name': city['name'], 'latitude': city.get('latitude'), 'longitude': city.get('longitude')}
+            for city in json.load(f)
+        ]
+
+    await conn.execute(update(City).where(City.name == bindparam('city_name')), cities)
+    print(f'Координаты заполнены для {len(cities)} городов из фикстуры')
+
+
+async def backfill_interaction_counters(conn: AsyncConnection) -> None:
+    """Пересчитывает таблицу interaction_counters по существующим лайкам и дизлайкам."""
+    result = await conn.execute(text(BACKFILL_INTERACTION_COUNTERS))
+    print(f'Счетчики взаимодействий пересчитаны для {result.rowcount} пользователей')
+
+
+async def upgrade() -> None:
+    """Создает недостающие таблицы и колонки и заполняет производные данные, не очищая схему."""
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(meta.metadata.create_all)
+            print('Недостающие таблицы созданы')
+
+            await add_columns(conn)
+            await backfill_masks(conn)
+            await backfill_city_coordinates(conn)
+            await backfill_interaction_counters(conn)
+
+    except Exception as e:
+        logging.exception('Ошибка при выполнении миграции: %s', e)
+
+
 if __name__ == '__main__':
-    asyncio.run(migrate())
+    parser = argparse.ArgumentParser(description='Миграция схемы базы данных')
+    parser.add_argument(
+        '--upgrade',
+        action='store_true',
+        help='Не очищать схему: создать недостающие таблицы и колонки и пересчитать производные данные (см. README)',
+    )
+    args = parser.parse_args()
+
+    asyncio.run(upgrade() if args.upgrade else migrate())
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+import aio_pika
+import msgpack
+from aio_pika import ExchangeType
+
+from config.settings import settings
+from src.logger import logger
+from src.metrics import OUTBOX_DEPTH, OUTBOX_FLUSH_LATENCY
+from src.storage.rabbit import channel_pool
+
+# Seconds to wait before retrying a batch RabbitMQ did not accept
+RETRY_DELAY = 1
+
+
+class MessageOutbox:
+    """
+    Bounded local queue of messages for the common queue, published in the background.
+
+    Swipe handlers put their events here and answer the user right away instead of
+    waiting for RabbitMQ. Messages are published in order, a batch per channel; a batch
+    that fails is retried from the first unpublished message. When the outbox is full,
+    put waits for room, so a RabbitMQ outage slows swipes down instead of losing events.
+    """
+
+    def __init__(self, max_size: int, batch_size: int) -> None:
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue[Tuple[dict, float]] = asyncio.Queue(max_size)
+        OUTBOX_DEPTH.set_function(self.queue.qsize)
+
+    async def put(self, message_data: dict) -> None:
+        """
+        Queue a message for the common queue.
+
+        Args:
+            message_data: Message to publish
+        """
+        await self.queue.put((message_data, time.perf_counter()))
+
+    async def flush(self, batch: List[Tuple[dict, float]]) -> None:
+        """
+        Publish a batch, retrying until every message is accepted.
+
+        Args:
+            batch: Messages with the time they were queued
+        """
+        published = 0
+        while published < len(batch):
+            try:
+                async with channel_pool.acquire() as channel:
+                    exchange = await channel.declare_exchange('user_messages', ExchangeType.TOPIC, durable=True)
+                    for message_data, queued_at in batch[published:]:
+                        await exchange.publish(
+                            aio_pika.Message(body=msgpack.packb(message_data), content_type='application/x-msgpack'),
+                            routing_key='user_messages',
+                        )
+                        published += 1
+                        OUTBOX_FLUSH_LATENCY.observe(time.perf_counter() - queued_at)
+            except Exception as e:
+                logger.error('Error publishing outbox messages, %d left: %s', len(batch) - published, e)
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def run(self) -> None:
+        """Publish queued messages for the lifetime of the bot."""
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            await self.flush(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait until queued messages are published.
+
+        Args:
+            timeout: How long to wait in seconds, forever if None
+        """
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error('Outbox closed with %d unpublished messages', self.queue.qsize())
+
+
+async def queue_interaction_event(user_id: int, target_user_id: int, action: str) -> None:
+    """
+    Queue a like/dislike event for the common queue.
+
+    Args:
+        user_id: The ID of the user who performed the action
+        target_user_id: The ID of the target user
+        action: The action performed ('like' or 'dislike')
+    """
+    await outbox.put({'user_id': user_id, 'target_user_id': target_user_id, 'action': action})
+    logger.info('Queued %s event from user %s to user %s', action, user_id, target_user_id)
+
+
+async def queue_profile_request(user_id: int, action: str = 'search', target_user_id: Optional[int] = None) -> None:
+    """
+    Queue a profile request for the common queue.
+
+    Args:
+        user_id: The ID of the user making the request
+        action: The type of request (search, view, etc.)
+        target_user_id: Optional ID of the target user
+    """
+    await outbox.put({'user_id': user_id, 'action': action, 'target_user_id': target_user_id})
+    logger.info('Queued profile request from user %s: action=%s, target=%s', user_id, action, target_user_id)
+
+
+outbox = MessageOutbox(settings.OUTBOX_MAX_SIZE, settings.OUTBOX_BATCH_SIZE)
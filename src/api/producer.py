@@ -1,6 +1,6 @@
 import json
 import msgpack
-from typing import Optional
+from typing import Any, Optional
 
 import aio_pika
 from aio_pika import ExchangeType
@@ -76,6 +76,36 @@ async def send_profile_update(profile_data: dict) -> None:
         raise
 
 
+async def send_profile_field_update(user_id: int, field: str, value: Any) -> None:
+    """
+    Send an edit of a single profile field to the common queue.
+
+    Args:
+        user_id: The ID of the user editing the profile
+        field: The edited field ('age', 'preferred_gender', 'preferred_age_range', ...)
+        value: The new value of the field
+    """
+    try:
+        async with channel_pool.acquire() as channel:
+            # Declare exchange
+            exchange = await channel.declare_exchange('user_messages', ExchangeType.TOPIC, durable=True)
+
+            # Prepare message data
+            message_data = {'user_id': user_id, 'action': 'profile_update', 'field': field, 'value': value}
+
+            # Publish message using msgpack
+            await exchange.publish(
+                aio_pika.Message(body=msgpack.packb(message_data), content_type='application/x-msgpack'),
+                routing_key='user_messages',
+            )
+
+            logger.info('Sent profile field update for user %s: field=%s', user_id, field)
+
+    except Exception as e:
+        logger.error('Error sending profile field update for user %s: %s', user_id, e)
+        raise
+
+
 async def send_interaction_event(user_id: int, target_user_id: int, action: str) -> None:
     """
     Send a like/dislike event to the common queue.
@@ -9,16 +9,20 @@ from fastapi import FastAPI
 from starlette_context import plugins
 from starlette_context.middleware import RawContextMiddleware
 
+from config.redis import close_redis_clients
 from config.settings import settings
 from src.api.minio.minio import router as minio_router
+from src.api.outbox import outbox
 from src.api.tech.router import router
 from src.api.tg.router import router as tg_router
 from src.bg_tasks import background_tasks
 from src.bot import bot, dp, setup_bot
 from src.logger import LOGGING_CONFIG, logger
 from src.routes.photo import router as photo_router
+from src.services.deck_ready import run_deck_ready_listener
 from src.storage.minio_client import create_bucket
 from src.storage.rabbit import channel_pool
+from src.storage.redis import card_cache
 
 
 @asynccontextmanager
@@ -39,6 +43,13 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         # Binding queue
         await users_queue.bind(exchange, 'user_messages')
     # #
+    # Кэш карточек анкет работает, пока жив канал инвалидаций из Redis
+    card_cache_task = asyncio.create_task(card_cache.run())
+    # События свайпов публикуются в фоне, чтобы не задерживать ответ пользователю
+    outbox_task = asyncio.create_task(outbox.run())
+    # Первая анкета новой колоды показывается сама, без нажатия "Обновить"
+    deck_ready_task = asyncio.create_task(run_deck_ready_listener(bot))
+
     polling_task: asyncio.Task[None] | None = None
     wh_info = await bot.get_webhook_info()
     if settings.BOT_WEBHOOK_URL and wh_info.url != settings.BOT_WEBHOOK_URL:
@@ -62,7 +73,13 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     while background_tasks:
         await asyncio.sleep(0)
     #
+    card_cache_task.cancel()
+    deck_ready_task.cancel()
+    # Дожидаемся публикации накопленных событий свайпов
+    await outbox.close(timeout=10)
+    outbox_task.cancel()
     await bot.delete_webhook()
+    await close_redis_clients()
 
     logger.info('Ending lifespan')
 
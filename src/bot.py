@@ -18,6 +18,7 @@ async def set_commands(bot: Bot):
         BotCommand(command="edit_profile", description="Редактировать анкету"),
         BotCommand(command='delete_profile', description='Удалить свой профиль :('),
         BotCommand(command="search", description="Начать поиск новых знакомств!"),
+        BotCommand(command="similar", description="Анкеты, похожие на понравившиеся"),
     ]
     await bot.set_my_commands(commands)
 
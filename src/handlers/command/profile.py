@@ -1,12 +1,10 @@
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 import logging
 import aiohttp
-import os
-import tempfile
 
 from src.handlers.states.profile import ProfileGroup
 from src.schema.user import UserInDB
@@ -14,26 +12,20 @@ from src.schema.profile import ProfileInDB
 from src.services.user import get_user_by_id, update_user
 from src.services.profile import get_profile_by_user_id, update_profile
 from src.services.city import get_city_by_id
+from src.services.photo import send_profile_photo
 from config.settings import settings
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 
-async def download_from_presigned_url(url: str) -> str | None:
-    """Download file from presigned URL and return local path."""
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    content = await resp.read()
-                    # Create a temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as f:
-                        f.write(content)
-                        return f.name
-    except Exception as e:
-        logger.error('Error downloading file from URL: %s', e)
-        return None
+async def download_photo(url: str) -> BufferedInputFile:
+    """Download a photo from a presigned URL into memory for the first upload to Telegram."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                raise ValueError(f'Failed to download photo from URL: status {resp.status}')
+            return BufferedInputFile(await resp.read(), filename='photo.jpg')
 
 
 @router.message(Command('profile'))
@@ -73,30 +65,12 @@ async def display_profile(message: Message, user: UserInDB, profile: ProfileInDB
 
     if profile.photo_url:
         try:
-            # Download the photo from the presigned URL
-            async with aiohttp.ClientSession() as session:
-                async with session.get(profile.photo_url) as resp:
-                    if resp.status == 200:
-                        content = await resp.read()
-                        # Create a temporary file
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as f:
-                            f.write(content)
-                            local_path = f.name
-
-                        # Send photo with caption
-                        await message.answer_photo(
-                            photo=FSInputFile(local_path), caption=text, reply_markup=keyboard.as_markup()
-                        )
-
-                        # Clean up the temporary file
-                        try:
-                            os.unlink(local_path)
-                        except Exception as e:
-                            logger.error('Error deleting temporary file: %s', e)
-                    else:
-                        logger.error('Failed to download photo from URL: status %s', resp.status)
-                        await message.answer('Error loading profile photo.')
-                        await message.answer(text=text, reply_markup=keyboard.as_markup())
+            # The photo is downloaded and uploaded only the first time, later sends reuse its file_id
+            await send_profile_photo(
+                profile.photo_url,
+                lambda photo: message.answer_photo(photo=photo, caption=text, reply_markup=keyboard.as_markup()),
+                load=lambda: download_photo(profile.photo_url),
+            )
         except Exception as e:
             logger.error('Error loading profile photo: %s', e)
             await message.answer('Error loading profile photo. Displaying profile without photo.')
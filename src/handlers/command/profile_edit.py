@@ -1,20 +1,14 @@
-import aio_pika
-import msgpack
-from aio_pika import ExchangeType
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from starlette_context import context
-from starlette_context.header_keys import HeaderKeys
 
+from src.api.producer import send_profile_field_update
 from src.handlers.states.profile import ProfileGroup
-from src.schema.user import UserUpdate
 from src.services.user import get_user_by_id
 from src.services.profile import get_profile_by_user_id
 from src.storage.minio_client import check_minio_connection, get_file_path
-from src.storage.rabbit import channel_pool
 from src.metrics import TOTAL_SEND_MESSAGES
 from src.logger import logger
 
@@ -135,22 +129,8 @@ async def process_name_edit(message: Message, state: FSMContext):
         return
 
     try:
-        async with channel_pool.acquire() as channel:
-            exchange = await channel.declare_exchange('user_updates', ExchangeType.TOPIC, durable=True)
-            queue = await channel.declare_queue('user_updates', durable=True)
-            await queue.bind(exchange, 'user_updates')
-
-            update = UserUpdate(first_name=name)
-            await exchange.publish(
-                aio_pika.Message(
-                    msgpack.packb(
-                        {'user_id': message.from_user.id, 'update': update.model_dump(), 'field': 'first_name'}
-                    ),
-                    correlation_id=context.get(HeaderKeys.correlation_id),
-                ),
-                routing_key='user_updates',
-            )
-            TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
+        await send_profile_field_update(message.from_user.id, 'first_name', name)
+        TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
 
         await message.reply("Your name has been updated!")
         await handle_edit_profile_command(message, state)
@@ -172,20 +152,8 @@ async def process_age_edit(message: Message, state: FSMContext):
         return
 
     try:
-        async with channel_pool.acquire() as channel:
-            exchange = await channel.declare_exchange('user_updates', ExchangeType.TOPIC, durable=True)
-            queue = await channel.declare_queue('user_updates', durable=True)
-            await queue.bind(exchange, 'user_updates')
-
-            update = UserUpdate(age=age)
-            await exchange.publish(
-                aio_pika.Message(
-                    msgpack.packb({'user_id': message.from_user.id, 'update': update.model_dump(), 'field': 'age'}),
-                    correlation_id=context.get(HeaderKeys.correlation_id),
-                ),
-                routing_key='user_updates',
-            )
-            TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
+        await send_profile_field_update(message.from_user.id, 'age', age)
+        TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
 
         await message.reply("Your age has been updated!")
         await handle_edit_profile_command(message, state)
@@ -200,20 +168,8 @@ async def process_gender_edit(callback: CallbackQuery, state: FSMContext):
     gender = callback.data.replace("set_gender_", "")
 
     try:
-        async with channel_pool.acquire() as channel:
-            exchange = await channel.declare_exchange('user_updates', ExchangeType.TOPIC, durable=True)
-            queue = await channel.declare_queue('user_updates', durable=True)
-            await queue.bind(exchange, 'user_updates')
-
-            update = UserUpdate(gender=gender)
-            await exchange.publish(
-                aio_pika.Message(
-                    msgpack.packb({'user_id': callback.from_user.id, 'update': update.model_dump(), 'field': 'gender'}),
-                    correlation_id=context.get(HeaderKeys.correlation_id),
-                ),
-                routing_key='user_updates',
-            )
-            TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
+        await send_profile_field_update(callback.from_user.id, 'gender', gender)
+        TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
 
         await callback.message.edit_text("Your gender has been updated!")
         await handle_edit_profile_command(callback.message, state)
@@ -231,22 +187,8 @@ async def process_city_edit(message: Message, state: FSMContext):
         return
 
     try:
-        async with channel_pool.acquire() as channel:
-            exchange = await channel.declare_exchange('user_updates', ExchangeType.TOPIC, durable=True)
-            queue = await channel.declare_queue('user_updates', durable=True)
-            await queue.bind(exchange, 'user_updates')
-
-            update = UserUpdate(city_name=city_name)
-            await exchange.publish(
-                aio_pika.Message(
-                    msgpack.packb(
-                        {'user_id': message.from_user.id, 'update': update.model_dump(), 'field': 'city_name'}
-                    ),
-                    correlation_id=context.get(HeaderKeys.correlation_id),
-                ),
-                routing_key='user_updates',
-            )
-            TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
+        await send_profile_field_update(message.from_user.id, 'city_name', city_name)
+        TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
 
         await message.reply("Your city has been updated!")
         await handle_edit_profile_command(message, state)
@@ -264,20 +206,8 @@ async def process_bio_edit(message: Message, state: FSMContext):
         return
 
     try:
-        async with channel_pool.acquire() as channel:
-            exchange = await channel.declare_exchange('user_updates', ExchangeType.TOPIC, durable=True)
-            queue = await channel.declare_queue('user_updates', durable=True)
-            await queue.bind(exchange, 'user_updates')
-
-            update = UserUpdate(bio=bio)
-            await exchange.publish(
-                aio_pika.Message(
-                    msgpack.packb({'user_id': message.from_user.id, 'update': update.model_dump(), 'field': 'bio'}),
-                    correlation_id=context.get(HeaderKeys.correlation_id),
-                ),
-                routing_key='user_updates',
-            )
-            TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
+        await send_profile_field_update(message.from_user.id, 'bio', bio)
+        TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
 
         await message.reply("Your bio has been updated!")
         await handle_edit_profile_command(message, state)
@@ -308,22 +238,8 @@ async def process_photo_edit(message: Message, state: FSMContext):
             await message.reply("Error: Could not process the image. Please try again.")
             return
 
-        async with channel_pool.acquire() as channel:
-            exchange = await channel.declare_exchange('user_updates', ExchangeType.TOPIC, durable=True)
-            queue = await channel.declare_queue('user_updates', durable=True)
-            await queue.bind(exchange, 'user_updates')
-
-            update = UserUpdate(photo_url=file_path)
-            await exchange.publish(
-                aio_pika.Message(
-                    msgpack.packb(
-                        {'user_id': message.from_user.id, 'update': update.model_dump(), 'field': 'photo_url'}
-                    ),
-                    correlation_id=context.get(HeaderKeys.correlation_id),
-                ),
-                routing_key='user_updates',
-            )
-            TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
+        await send_profile_field_update(message.from_user.id, 'photo_url', file_path)
+        TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
 
         await message.reply("Your photo has been updated!")
         await handle_edit_profile_command(message, state)
@@ -338,22 +254,8 @@ async def process_preferred_gender_edit(callback: CallbackQuery, state: FSMConte
     gender = callback.data.replace("set_preferred_gender_", "")
 
     try:
-        async with channel_pool.acquire() as channel:
-            exchange = await channel.declare_exchange('user_updates', ExchangeType.TOPIC, durable=True)
-            queue = await channel.declare_queue('user_updates', durable=True)
-            await queue.bind(exchange, 'user_updates')
-
-            update = UserUpdate(preferred_gender=gender)
-            await exchange.publish(
-                aio_pika.Message(
-                    msgpack.packb(
-                        {'user_id': callback.from_user.id, 'update': update.model_dump(), 'field': 'preferred_gender'}
-                    ),
-                    correlation_id=context.get(HeaderKeys.correlation_id),
-                ),
-                routing_key='user_updates',
-            )
-            TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
+        await send_profile_field_update(callback.from_user.id, 'preferred_gender', gender)
+        TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
 
         await callback.message.edit_text("Your preferred gender has been updated!")
         await handle_edit_profile_command(callback.message, state)
@@ -399,22 +301,8 @@ async def process_preferred_age_max_edit(message: Message, state: FSMContext):
         return
 
     try:
-        async with channel_pool.acquire() as channel:
-            exchange = await channel.declare_exchange('user_updates', ExchangeType.TOPIC, durable=True)
-            queue = await channel.declare_queue('user_updates', durable=True)
-            await queue.bind(exchange, 'user_updates')
-
-            update = UserUpdate(preferred_age_min=min_age, preferred_age_max=age)
-            await exchange.publish(
-                aio_pika.Message(
-                    msgpack.packb(
-                        {'user_id': message.from_user.id, 'update': update.model_dump(), 'field': 'preferred_age_range'}
-                    ),
-                    correlation_id=context.get(HeaderKeys.correlation_id),
-                ),
-                routing_key='user_updates',
-            )
-            TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
+        await send_profile_field_update(message.from_user.id, 'preferred_age_range', {'min': min_age, 'max': age})
+        TOTAL_SEND_MESSAGES.labels(operation='update_user').inc()
 
         await message.reply("Your preferred age range has been updated!")
         await handle_edit_profile_command(message, state)
@@ -3,50 +3,30 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, InputMediaPhoto
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import Dict, Any
 
-from src.storage.redis import get_next_profile, get_user_profiles
-from src.api.producer import send_profile_request, send_interaction_event
+from src.storage.deck import deck_store
+from src.api.outbox import queue_interaction_event, queue_profile_request
 from src.logger import logger
+from src.services.card import get_profile_caption, get_profile_markup
+from src.services.deck_ready import wait_for_deck
+from src.services.photo import send_profile_photo
+from src.services.swipe_guard import guard_swipe
 from src.services.user import get_user_by_id
+from src.storage.redis import store_waiting_message
 
 router = Router()
 
 
-async def check_profiles_in_redis(user_id: int) -> bool:
+async def request_refill(user_id: int, remaining: int) -> None:
     """
-    Check if there are profiles available in Redis for the user.
+    Ask the consumer to top up the user's deck before it runs out.
 
     Args:
         user_id: The ID of the user
-
-    Returns:
-        bool: True if profiles exist, False otherwise
-    """
-    try:
-        profiles = await get_user_profiles(user_id)
-        return profiles is not None and len(profiles) > 0
-    except Exception as e:
-        logger.error('Error checking profiles in Redis for user %s: %s', user_id, str(e))
-        return False
-
-
-async def get_remaining_profiles_count(user_id: int) -> int:
+        remaining: Number of profiles left in the deck
     """
-    Get the number of remaining profiles in Redis for the user.
-
-    Args:
-        user_id: The ID of the user
-
-    Returns:
-        int: Number of remaining profiles
-    """
-    try:
-        profiles = await get_user_profiles(user_id)
-        return len(profiles) if profiles else 0
-    except Exception as e:
-        logger.error('Error getting remaining profiles count for user %s: %s', user_id, str(e))
-        return 0
+    await queue_profile_request(user_id, action='search')
+    logger.info('Requesting new profiles for user %s as only %s profile(s) remain', user_id, remaining)
 
 
 @router.message(Command('search'))
@@ -69,65 +49,90 @@ async def handle_search_command(message: Message, state: FSMContext) -> None:
             )
             return
 
-        # Check if there are profiles in Redis
-        has_profiles = await check_profiles_in_redis(user_id)
-        logger.info('User %s has profiles in Redis: %s', user_id, has_profiles)
+        # Get next profile from Redis; the pop also tells whether this call should request a refill
+        profile, remaining, refill = await deck_store.get_next_profile(user_id)
+        logger.info('Retrieved next profile from Redis for user %s: %s', user_id, profile)
 
-        if not has_profiles:
-            # No profiles in Redis, request more from the queue
-            logger.info('No profiles in Redis for user %s, requesting more', user_id)
-            await send_profile_request(user_id, action='search')
+        if refill:
+            await request_refill(user_id, remaining)
+
+        if not profile:
+            # No profiles in Redis, a refill is already on its way
+            logger.info('No profiles in Redis for user %s', user_id)
 
             # Create keyboard with refresh button
             keyboard = InlineKeyboardBuilder()
             keyboard.button(text='🔄 Обновить', callback_data='refresh_profiles')
             keyboard.adjust(1)
 
-            # Show "please wait" message with refresh button
-            await message.answer(
+            # Show "please wait" message with refresh button; it is replaced with the first card once the deck arrives
+            waiting = await message.answer(
                 'Профили загружаются, пожалуйста, подождите...\n\n'
-                'Нажмите кнопку "Обновить", чтобы проверить наличие новых профилей.',
+                'Первая анкета появится здесь сама, как только подборка будет готова.',
                 reply_markup=keyboard.as_markup(),
             )
+            await wait_for_deck(message.bot, user_id, waiting.chat.id, waiting.message_id)
             return
 
-        # Get next profile from Redis
-        profile = await get_next_profile(user_id)
-        logger.info('Retrieved next profile from Redis for user %s: %s', user_id, profile)
-
-        if not profile:
-            # This should not happen if check_profiles_in_redis returned True
-            logger.error('No profile returned from Redis for user %s despite check passing', user_id)
-            await message.answer('Произошла ошибка при загрузке профиля. Пожалуйста, попробуйте позже.')
-            return
-
-        # # Check remaining profiles count
-        # remaining_count = await get_remaining_profiles_count(user_id)
-        # if remaining_count <= 1:
-        #     # Request new profiles when only one profile is left
-        #     await send_profile_request(user_id, action='search')
-        #     logger.info('Requesting new profiles for user %s as only %s profile(s) remain', user_id, remaining_count)
-
-        # Create keyboard with like/dislike buttons
-        keyboard = InlineKeyboardBuilder()
-        keyboard.button(text='❤️ Like', callback_data=f'like_{profile["user_id"]}')
-        keyboard.button(text='👎 Dislike', callback_data=f'dislike_{profile["user_id"]}')
-        keyboard.adjust(2)
+        # Caption and keyboard are rendered by the consumer together with the card
+        caption = get_profile_caption(profile)
+        reply_markup = get_profile_markup(profile)
 
         # Display profile with photo if available
         if profile.get('photo_url'):
-            await message.answer_photo(
-                photo=profile['photo_url'], caption=format_profile_text(profile), reply_markup=keyboard.as_markup()
+            await send_profile_photo(
+                profile['photo_url'],
+                lambda photo: message.answer_photo(photo=photo, caption=caption, reply_markup=reply_markup),
             )
         else:
-            await message.answer(text=format_profile_text(profile), reply_markup=keyboard.as_markup())
+            await message.answer(text=caption, reply_markup=reply_markup)
 
     except Exception as e:
         logger.error('Error in search command for user %s: %s', user_id, str(e))
         await message.answer('An error occurred while searching for profiles. Please try again later.')
 
 
+@router.message(Command('similar'))
+async def handle_similar_command(message: Message, state: FSMContext) -> None:
+    """Handle the /similar command to find profiles similar to the ones the user liked."""
+    if not message.from_user:
+        logger.error('Message has no from_user')
+        return
+
+    user_id = message.from_user.id
+    logger.info('Similar command received from user %s', user_id)
+
+    try:
+        user = await get_user_by_id(user_id)
+        if not user:
+            logger.info('User %s is not registered', user_id)
+            await message.answer(
+                'Для поиска анкет необходимо сначала зарегистрироваться. ' 'Используйте команду /start для регистрации.'
+            )
+            return
+
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text='🔄 Обновить', callback_data='refresh_profiles')
+        keyboard.adjust(1)
+
+        waiting = await message.answer(
+            'Подбираем анкеты, похожие на понравившиеся...\n\n'
+            'Подборка появится здесь сама, как только будет готова.',
+            reply_markup=keyboard.as_markup(),
+        )
+        # The current deck is about to be replaced, so the message waits for the new one without checking it
+        await store_waiting_message(user_id, waiting.chat.id, waiting.message_id)
+
+        # The consumer replaces the deck with profiles similar to the recently liked ones
+        await queue_profile_request(user_id, action='similar')
+
+    except Exception as e:
+        logger.error('Error in similar command for user %s: %s', user_id, str(e))
+        await message.answer('An error occurred while searching for profiles. Please try again later.')
+
+
 @router.callback_query(F.data.startswith('like_'))
+@guard_swipe
 async def handle_like(callback: CallbackQuery, state: FSMContext) -> None:
     """Handle the like button click."""
     if not callback.data or not callback.from_user:
@@ -139,58 +144,49 @@ async def handle_like(callback: CallbackQuery, state: FSMContext) -> None:
     logger.info('Like action received from user %s for target user %s', user_id, target_user_id)
 
     try:
-        # Send like event to common queue
-        await send_interaction_event(user_id, target_user_id, 'like')
-        logger.info('Like event sent to queue for user %s -> target %s', user_id, target_user_id)
+        # The event goes to the local outbox, so RabbitMQ latency does not delay the answer to the tap
+        await queue_interaction_event(user_id, target_user_id, 'like')
+        await callback.answer('❤️ Profile liked!')
 
         # Get next profile from Redis
-        profile = await get_next_profile(user_id)
+        profile, remaining, refill = await deck_store.get_next_profile(user_id)
         logger.info('Retrieved next profile after like for user %s: %s', user_id, profile)
 
+        if refill:
+            # Request new profiles once, when the deck drops below the low watermark
+            await request_refill(user_id, remaining)
+
         if not profile:
             # Create keyboard with refresh button
             keyboard = InlineKeyboardBuilder()
             keyboard.button(text='🔄 Обновить', callback_data='refresh_profiles')
             keyboard.adjust(1)
 
-            # Show "please wait" message with refresh button
+            # Show "please wait" message with refresh button; it is replaced with the first card once the deck arrives
             if callback.message:
                 await callback.message.edit_text(
                     '❤️ Вы поставили лайк! Профили загружаются, пожалуйста, подождите...\n\n'
-                    'Нажмите кнопку "Обновить", чтобы проверить наличие новых профилей.',
+                    'Первая анкета появится здесь сама, как только подборка будет готова.',
                     reply_markup=keyboard.as_markup(),
                 )
-
-            # Request new profiles from the queue only when Redis is empty
-            await send_profile_request(user_id, action='search')
-            logger.info('Profile update request sent for user %s after empty profiles', user_id)
+                await wait_for_deck(callback.bot, user_id, callback.message.chat.id, callback.message.message_id)
         else:
-            # # Check remaining profiles count
-            # remaining_count = await get_remaining_profiles_count(user_id)
-            # if remaining_count <= 1:
-            #     # Request new profiles when only one profile is left
-            #     await send_profile_request(user_id, action='search')
-            #     logger.info('Requesting new profiles for user %s as only %s profile(s) remain', user_id, remaining_count)
-
-            # Create keyboard for next profile
-            keyboard = InlineKeyboardBuilder()
-            keyboard.button(text='❤️ Like', callback_data=f'like_{profile["user_id"]}')
-            keyboard.button(text='👎 Dislike', callback_data=f'dislike_{profile["user_id"]}')
-            keyboard.adjust(2)
+            # Caption and keyboard are rendered by the consumer together with the card
+            caption = get_profile_caption(profile)
+            reply_markup = get_profile_markup(profile)
 
             # Update message with next profile
             if callback.message:
                 if profile.get('photo_url'):
-                    await callback.message.edit_media(
-                        media=InputMediaPhoto(media=profile['photo_url'], caption=format_profile_text(profile)),
-                        reply_markup=keyboard.as_markup(),
+                    await send_profile_photo(
+                        profile['photo_url'],
+                        lambda photo: callback.message.edit_media(
+                            media=InputMediaPhoto(media=photo, caption=caption),
+                            reply_markup=reply_markup,
+                        ),
                     )
                 else:
-                    await callback.message.edit_text(
-                        text=format_profile_text(profile), reply_markup=keyboard.as_markup()
-                    )
-
-        await callback.answer('❤️ Profile liked!')
+                    await callback.message.edit_text(text=caption, reply_markup=reply_markup)
     except Exception as e:
         logger.error('Error in handle_like: %s', str(e))
         # В случае ошибки показываем сообщение о завершении подборки
@@ -207,10 +203,10 @@ async def handle_like(callback: CallbackQuery, state: FSMContext) -> None:
                 )
         except Exception as edit_error:
             logger.error('Error editing message after exception: %s', str(edit_error))
-            await callback.answer('Произошла ошибка при обработке лайка')
 
 
 @router.callback_query(F.data.startswith('dislike_'))
+@guard_swipe
 async def handle_dislike(callback: CallbackQuery, state: FSMContext) -> None:
     """Handle the dislike button click."""
     if not callback.data or not callback.from_user:
@@ -222,58 +218,49 @@ async def handle_dislike(callback: CallbackQuery, state: FSMContext) -> None:
     logger.info('Dislike action received from user %s for target user %s', user_id, target_user_id)
 
     try:
-        # Send dislike event to common queue
-        await send_interaction_event(user_id, target_user_id, 'dislike')
-        logger.info('Dislike event sent to queue for user %s -> target %s', user_id, target_user_id)
+        # The event goes to the local outbox, so RabbitMQ latency does not delay the answer to the tap
+        await queue_interaction_event(user_id, target_user_id, 'dislike')
+        await callback.answer('👎 Profile disliked!')
 
         # Get next profile from Redis
-        profile = await get_next_profile(user_id)
+        profile, remaining, refill = await deck_store.get_next_profile(user_id)
         logger.info('Retrieved next profile after dislike for user %s: %s', user_id, profile)
 
+        if refill:
+            # Request new profiles once, when the deck drops below the low watermark
+            await request_refill(user_id, remaining)
+
         if not profile:
             # Create keyboard with refresh button
             keyboard = InlineKeyboardBuilder()
             keyboard.button(text='🔄 Обновить', callback_data='refresh_profiles')
             keyboard.adjust(1)
 
-            # Show "please wait" message with refresh button
+            # Show "please wait" message with refresh button; it is replaced with the first card once the deck arrives
             if callback.message:
                 await callback.message.edit_text(
                     '👎 Вы поставили дизлайк! Профили загружаются, пожалуйста, подождите...\n\n'
-                    'Нажмите кнопку "Обновить", чтобы проверить наличие новых профилей.',
+                    'Первая анкета появится здесь сама, как только подборка будет готова.',
                     reply_markup=keyboard.as_markup(),
                 )
-
-            # Request new profiles from the queue only when Redis is empty
-            await send_profile_request(user_id, action='search')
-            logger.info('Profile update request sent for user %s after empty profiles', user_id)
+                await wait_for_deck(callback.bot, user_id, callback.message.chat.id, callback.message.message_id)
         else:
-            # # Check remaining profiles count
-            # remaining_count = await get_remaining_profiles_count(user_id)
-            # if remaining_count <= 1:
-            #     # Request new profiles when only one profile is left
-            #     await send_profile_request(user_id, action='search')
-            #     logger.info('Requesting new profiles for user %s as only %s profile(s) remain', user_id, remaining_count)
-
-            # Create keyboard for next profile
-            keyboard = InlineKeyboardBuilder()
-            keyboard.button(text='❤️ Like', callback_data=f'like_{profile["user_id"]}')
-            keyboard.button(text='👎 Dislike', callback_data=f'dislike_{profile["user_id"]}')
-            keyboard.adjust(2)
+            # Caption and keyboard are rendered by the consumer together with the card
+            caption = get_profile_caption(profile)
+            reply_markup = get_profile_markup(profile)
 
             # Update message with next profile
             if callback.message:
                 if profile.get('photo_url'):
-                    await callback.message.edit_media(
-                        media=InputMediaPhoto(media=profile['photo_url'], caption=format_profile_text(profile)),
-                        reply_markup=keyboard.as_markup(),
+                    await send_profile_photo(
+                        profile['photo_url'],
+                        lambda photo: callback.message.edit_media(
+                            media=InputMediaPhoto(media=photo, caption=caption),
+                            reply_markup=reply_markup,
+                        ),
                     )
                 else:
-                    await callback.message.edit_text(
-                        text=format_profile_text(profile), reply_markup=keyboard.as_markup()
-                    )
-
-        await callback.answer('👎 Profile disliked!')
+                    await callback.message.edit_text(text=caption, reply_markup=reply_markup)
     except Exception as e:
         logger.error('Error in handle_dislike: %s', str(e))
         # В случае ошибки показываем сообщение о завершении подборки
@@ -290,10 +277,10 @@ async def handle_dislike(callback: CallbackQuery, state: FSMContext) -> None:
                 )
         except Exception as edit_error:
             logger.error('Error editing message after exception: %s', str(edit_error))
-            await callback.answer('Произошла ошибка при обработке дизлайка')
 
 
 @router.callback_query(F.data == 'refresh_profiles')
+@guard_swipe
 async def handle_refresh_profiles(callback: CallbackQuery, state: FSMContext) -> None:
     """Handle the refresh profiles button click."""
     if not callback.from_user:
@@ -304,27 +291,28 @@ async def handle_refresh_profiles(callback: CallbackQuery, state: FSMContext) ->
     logger.info('Refresh profiles request received from user %s', user_id)
 
     try:
-        # Request new profiles from the queue
-        await send_profile_request(user_id, action='search')
-        logger.info('Profile update request sent for user %s', user_id)
-
         # Get next profile from Redis
-        profile = await get_next_profile(user_id)
+        profile, remaining, refill = await deck_store.get_next_profile(user_id)
         logger.info('Retrieved next profile after refresh for user %s: %s', user_id, profile)
 
+        if refill:
+            # A refill already in flight is not requested again
+            await request_refill(user_id, remaining)
+
         if not profile:
             # Create keyboard with refresh button
             keyboard = InlineKeyboardBuilder()
             keyboard.button(text='🔄 Обновить', callback_data='refresh_profiles')
             keyboard.adjust(1)
 
-            # Show "please wait" message with refresh button
+            # Show "please wait" message with refresh button; it is replaced with the first card once the deck arrives
             if callback.message:
                 await callback.message.edit_text(
                     'Профили загружаются, пожалуйста, подождите...\n\n'
-                    'Нажмите кнопку "Обновить", чтобы проверить наличие новых профилей.',
+                    'Первая анкета появится здесь сама, как только подборка будет готова.',
                     reply_markup=keyboard.as_markup(),
                 )
+                await wait_for_deck(callback.bot, user_id, callback.message.chat.id, callback.message.message_id)
         elif isinstance(profile, dict) and profile.get('last_profile'):
             # This was the last profile in the selection
             # Create keyboard with refresh button
@@ -340,23 +328,22 @@ async def handle_refresh_profiles(callback: CallbackQuery, state: FSMContext) ->
                     reply_markup=keyboard.as_markup(),
                 )
         else:
-            # Create keyboard for next profile
-            keyboard = InlineKeyboardBuilder()
-            keyboard.button(text='❤️ Like', callback_data=f'like_{profile["user_id"]}')
-            keyboard.button(text='👎 Dislike', callback_data=f'dislike_{profile["user_id"]}')
-            keyboard.adjust(2)
+            # Caption and keyboard are rendered by the consumer together with the card
+            caption = get_profile_caption(profile)
+            reply_markup = get_profile_markup(profile)
 
             # Update message with next profile
             if callback.message:
                 if profile.get('photo_url'):
-                    await callback.message.edit_media(
-                        media=InputMediaPhoto(media=profile['photo_url'], caption=format_profile_text(profile)),
-                        reply_markup=keyboard.as_markup(),
+                    await send_profile_photo(
+                        profile['photo_url'],
+                        lambda photo: callback.message.edit_media(
+                            media=InputMediaPhoto(media=photo, caption=caption),
+                            reply_markup=reply_markup,
+                        ),
                     )
                 else:
-                    await callback.message.edit_text(
-                        text=format_profile_text(profile), reply_markup=keyboard.as_markup()
-                    )
+                    await callback.message.edit_text(text=caption, reply_markup=reply_markup)
 
         await callback.answer('🔄 Профили обновляются...')
     except Exception as e:
@@ -376,21 +363,3 @@ async def handle_refresh_profiles(callback: CallbackQuery, state: FSMContext) ->
         except Exception as edit_error:
             logger.error('Error editing message after exception: %s', str(edit_error))
             await callback.answer('Произошла ошибка при обновлении профилей')
-
-
-def format_profile_text(profile: Dict[str, Any]) -> str:
-    """Format profile information into a readable text."""
-    text = (
-        f'👤 <b>Profile</b>\n\n'
-        f'📝 <b>Name:</b> {profile["first_name"]}\n'
-        f'🎂 <b>Age:</b> {profile["age"]}\n'
-        f'👫 <b>Gender:</b> {profile["gender"]}\n'
-    )
-
-    if profile.get('bio'):
-        text += f'📖 <b>Bio:</b> {profile["bio"]}\n'
-
-    if profile.get('interests'):
-        text += f'🎯 <b>Interests:</b> {", ".join(profile["interests"])}\n'
-
-    return text
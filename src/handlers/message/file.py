@@ -17,6 +17,7 @@ from src.schema.registration import RegistrationMessage
 from src.schema.user import UserCreate
 from src.storage.minio_client import check_minio_connection, get_file_path, upload_file
 from src.storage.rabbit import channel_pool
+from src.storage.redis import forget_photo_file_id
 
 from .router import router
 
@@ -81,6 +82,8 @@ async def handle_file_upload(message: types.Message, state: FSMContext) -> None:
     try:
         unique_name = upload_file(user_id, file_name, file_bytes.read())
         logger.info('Файл %s загружен. ID пользователя: %s. Путь к файлу: %s', file_name, user_id, unique_name)
+        # Объект мог быть перезаписан, старый file_id в Telegram указывает на прежнюю фотографию
+        await forget_photo_file_id(unique_name)
 
         # Подключаемся к очереди
         async with channel_pool.acquire() as channel:
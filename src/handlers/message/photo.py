@@ -16,6 +16,7 @@ from src.schema.registration import RegistrationMessage
 from src.schema.user import UserCreate
 from src.storage.minio_client import get_file_path, upload_file
 from src.storage.rabbit import channel_pool
+from src.storage.redis import store_photo_file_id
 
 from .router import router
 
@@ -52,6 +53,8 @@ async def handle_photo(message: types.Message, state: FSMContext) -> None:
     # Upload photo to MinIO
     file_name = f'profile_photo_{message.from_user.id}.jpg'
     minio_path = upload_file(message.from_user.id, file_name, file_bytes.read())
+    # Фото уже есть в Telegram, поэтому анкеты будут показывать его по file_id без загрузки из MinIO
+    await store_photo_file_id(minio_path, photo.file_id)
 
     # Get MinIO URL for the photo
     photo_url = get_file_path(minio_path)
@@ -3,7 +3,7 @@ import functools
 import time
 from typing import Any, Callable, Coroutine, TypeVar, Union
 
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 from src.logger import logger
 
@@ -40,6 +40,45 @@ TOTAL_SEND_MESSAGES = Counter(
     labelnames=['operation'],
 )
 
+CARD_CACHE_REQUESTS = Counter(
+    'card_cache_requests_total',
+    'Обращения к кэшу карточек анкет в памяти бота',
+    labelnames=['result'],
+)
+
+CARD_CACHE_HIT_RATIO = Gauge(
+    'card_cache_hit_ratio',
+    'Доля обращений к кэшу карточек анкет, обслуженных без Redis',
+)
+
+CARD_CACHE_SIZE = Gauge(
+    'card_cache_size',
+    'Количество карточек анкет в кэше бота',
+)
+
+PHOTO_SENDS = Counter(
+    'photo_sends_total',
+    'Отправки фотографий анкет: по file_id Telegram или с загрузкой из хранилища',
+    labelnames=['source'],
+)
+
+OUTBOX_DEPTH = Gauge(
+    'outbox_depth',
+    'Сообщения в локальном outbox бота, еще не опубликованные в RabbitMQ',
+)
+
+OUTBOX_FLUSH_LATENCY = Histogram(
+    'outbox_flush_latency_seconds',
+    'Время от постановки сообщения в outbox до его публикации в RabbitMQ',
+    buckets=BUCKETS,
+)
+
+DUPLICATE_TAPS = Counter(
+    'duplicate_taps_total',
+    'Повторные нажатия кнопок под той же карточкой, отброшенные до обработки',
+    labelnames=['action'],
+)
+
 T = TypeVar('T', bound=Union[Callable[..., Coroutine[Any, Any, Any]], Callable[..., Any]])
 
 
@@ -4,6 +4,7 @@ from . import file
 from .city import City
 from .dislike import Dislike
 from .file import FileRecord
+from .interaction_counter import InteractionCounter
 from .interest import Interest
 from .like import Like
 from .meta import Base, metadata
@@ -26,4 +27,5 @@ __all__ = [
     'FileRecord',
     'Like',
     'Dislike',
+    'InteractionCounter',
 ]
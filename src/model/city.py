@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Float, Integer, String
 
 from .meta import Base
 
@@ -8,3 +8,5 @@ class City(Base):
 
     city_id = Column(Integer, primary_key=True)
     name = Column(String(64), unique=True, nullable=False)
+    latitude = Column(Float)
+    longitude = Column(Float)
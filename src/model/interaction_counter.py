@@ -0,0 +1,15 @@
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer
+
+from .meta import Base
+
+
+class InteractionCounter(Base):
+    """Денормализованные счетчики взаимодействий пользователя."""
+
+    __tablename__ = 'interaction_counters'
+
+    user_id = Column(BigInteger, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    likes_received = Column(Integer, nullable=False, default=0, server_default='0')
+    dislikes_received = Column(Integer, nullable=False, default=0, server_default='0')
+    likes_given = Column(Integer, nullable=False, default=0, server_default='0')
+    matches = Column(Integer, nullable=False, default=0, server_default='0')
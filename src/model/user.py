@@ -14,6 +14,10 @@ class User(Base):
     age = Column(Integer)
     gender = Column(String(10))
     city_id = Column(Integer, ForeignKey("cities.city_id"))
+    # Bit (interest_id - 1) % 64 is set for every interest of the user, see src.services.interest
+    interests_mask = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Genders and ages this user's profile accepts, see src.services.eligibility
+    accepts_mask = Column(BigInteger, nullable=False, default=0, server_default="0")
     created_at = Column(TIMESTAMP, server_default=func.now())
 
     # Define relationships explicitly
@@ -0,0 +1,68 @@
+"""
+Card service for rendering what the bot shows for a profile card.
+
+The consumer renders the caption and the like/dislike keyboard once, when it writes
+the shared card, so a swipe only has to deserialize them. Cards written before that
+are rendered on the fly the same way.
+"""
+
+from typing import Any, Dict
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+def format_profile_text(profile: Dict[str, Any]) -> str:
+    """Format profile information into a readable text."""
+    text = (
+        f'👤 <b>Profile</b>\n\n'
+        f'📝 <b>Name:</b> {profile["first_name"]}\n'
+        f'🎂 <b>Age:</b> {profile["age"]}\n'
+        f'👫 <b>Gender:</b> {profile["gender"]}\n'
+    )
+
+    if profile.get('bio'):
+        text += f'📖 <b>Bio:</b> {profile["bio"]}\n'
+
+    if profile.get('interests'):
+        text += f'🎯 <b>Interests:</b> {", ".join(profile["interests"])}\n'
+
+    return text
+
+
+def build_profile_markup(user_id: int) -> InlineKeyboardMarkup:
+    """Build the like/dislike keyboard of a profile card."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text='❤️ Like', callback_data=f'like_{user_id}'),
+                InlineKeyboardButton(text='👎 Dislike', callback_data=f'dislike_{user_id}'),
+            ]
+        ]
+    )
+
+
+def render_profile_card(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add the rendered caption and serialized keyboard to a profile card.
+
+    Args:
+        profile: Profile card dictionary
+
+    Returns:
+        The same dictionary with 'caption' and 'reply_markup' set
+    """
+    profile['caption'] = format_profile_text(profile)
+    profile['reply_markup'] = build_profile_markup(profile['user_id']).model_dump_json(exclude_none=True)
+    return profile
+
+
+def get_profile_caption(profile: Dict[str, Any]) -> str:
+    """Get the caption of a card, rendering it if the card predates pre-rendering."""
+    return profile.get('caption') or format_profile_text(profile)
+
+
+def get_profile_markup(profile: Dict[str, Any]) -> InlineKeyboardMarkup:
+    """Get the keyboard of a card, building it if the card predates pre-rendering."""
+    if profile.get('reply_markup'):
+        return InlineKeyboardMarkup.model_validate_json(profile['reply_markup'])
+    return build_profile_markup(profile['user_id'])
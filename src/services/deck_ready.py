@@ -0,0 +1,134 @@
+"""
+Deck-ready service for showing the first card as soon as a deck arrives.
+
+When a user's deck is empty the bot shows a "please wait" message and remembers it.
+The consumer publishes the user_id on the deck-ready channel once the new deck is
+stored, and the listener replaces that message with the first card, so the user
+does not have to press Refresh until the deck shows up. A request that ends without
+a new deck is announced too, and the message then says there is nothing new yet.
+"""
+
+import asyncio
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InputMediaPhoto
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.api.outbox import queue_profile_request
+from src.bg_tasks import background_tasks
+from src.logger import logger
+from src.services.card import get_profile_caption, get_profile_markup
+from src.services.photo import send_profile_photo
+from src.storage.deck import deck_store
+from src.storage.deck_redis import DECK_READY_CHANNEL
+from src.storage.redis import get_redis, store_waiting_message, take_waiting_message
+
+# Seconds to wait before subscribing again after the channel fails
+RESUBSCRIBE_DELAY = 1
+
+
+async def show_first_card(bot: Bot, user_id: int) -> None:
+    """
+    Replace the user's "please wait" message with the first card of the new deck.
+
+    Args:
+        bot: Bot to edit the message with
+        user_id: The ID of the user
+    """
+    waiting = await take_waiting_message(user_id)
+    if not waiting:
+        return
+    chat_id, message_id = waiting
+
+    profile, remaining, refill = await deck_store.get_next_profile(user_id)
+    if refill:
+        await queue_profile_request(user_id, action='search')
+    if not profile:
+        # Nothing new was found, or the deck was emptied by a swipe in the meantime
+        keyboard = InlineKeyboardBuilder()
+        keyboard.button(text='🔄 Обновить', callback_data='refresh_profiles')
+        keyboard.adjust(1)
+        await bot.edit_message_text(
+            text='Новых анкет пока нет.\n\nНажмите кнопку "Обновить", чтобы проверить наличие новых профилей.',
+            chat_id=chat_id,
+            message_id=message_id,
+            reply_markup=keyboard.as_markup(),
+        )
+        logger.info('No new deck for user %s, waiting message resolved', user_id)
+        return
+
+    caption = get_profile_caption(profile)
+    reply_markup = get_profile_markup(profile)
+
+    try:
+        if profile.get('photo_url'):
+            await send_profile_photo(
+                profile['photo_url'],
+                lambda photo: bot.edit_message_media(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    media=InputMediaPhoto(media=photo, caption=caption),
+                    reply_markup=reply_markup,
+                ),
+            )
+        else:
+            await bot.edit_message_text(text=caption, chat_id=chat_id, message_id=message_id, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        # Telegram does not turn a text message into a photo one and back, so the card is sent anew
+        logger.info('Could not edit waiting message of user %s, sending the card instead: %s', user_id, e)
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+        if profile.get('photo_url'):
+            await send_profile_photo(
+                profile['photo_url'],
+                lambda photo: bot.send_photo(chat_id=chat_id, photo=photo, caption=caption, reply_markup=reply_markup),
+            )
+        else:
+            await bot.send_message(chat_id=chat_id, text=caption, reply_markup=reply_markup)
+
+    logger.info('Showed the first card of the new deck to user %s, %d left', user_id, remaining)
+
+
+async def wait_for_deck(bot: Bot, user_id: int, chat_id: int, message_id: int) -> None:
+    """
+    Remember the "please wait" message shown to a user with an empty deck.
+
+    A deck stored between the empty pop and this call has already been announced,
+    so the deck is checked once more after the message is remembered.
+
+    Args:
+        bot: Bot to edit the message with
+        user_id: The ID of the user
+        chat_id: Chat the message was sent to
+        message_id: The ID of the "please wait" message
+    """
+    await store_waiting_message(user_id, chat_id, message_id)
+    if await deck_store.get_deck_length(user_id):
+        await show_first_card(bot, user_id)
+
+
+async def handle_deck_ready(bot: Bot, user_id: int) -> None:
+    """Show the first card to a user whose deck has arrived, logging failures."""
+    try:
+        await show_first_card(bot, user_id)
+    except Exception as e:
+        logger.error('Error showing the first card of the new deck to user %s: %s', user_id, e)
+
+
+async def run_deck_ready_listener(bot: Bot) -> None:
+    """Listen for stored decks for the lifetime of the bot."""
+    while True:
+        try:
+            redis = await get_redis()
+            async with redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(DECK_READY_CHANNEL)
+                async for message in pubsub.listen():
+                    # Telegram calls run in the background so one slow edit does not hold up the others
+                    task = asyncio.create_task(handle_deck_ready(bot, int(message['data'])))
+                    background_tasks.add(task)
+                    task.add_done_callback(background_tasks.discard)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error('Deck-ready channel failed, subscribing again: %s', e)
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
@@ -0,0 +1,91 @@
+"""
+Eligibility service for keeping packed preference bitsets of users up to date.
+
+User.accepts_mask answers "would this user accept a searcher of gender G and age A"
+with a single AND: bits 0-2 are the accepted genders, bits 3-62 the accepted ages
+from ELIGIBILITY_AGE_MIN on. A searcher is accepted when every bit of its
+eligibility key (one gender bit and one age bit) is set in the mask.
+"""
+
+from typing import Iterable, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.model.profile import Profile
+from src.model.user import User
+
+ELIGIBILITY_GENDER_BITS = {'male': 0, 'female': 1, 'other': 2}
+ELIGIBILITY_AGE_OFFSET = len(ELIGIBILITY_GENDER_BITS)
+ELIGIBILITY_AGE_MIN = 18
+# Keep bit 63 clear so the mask stays a non-negative BIGINT; older ages share the last bit
+ELIGIBILITY_AGE_BITS = 63 - ELIGIBILITY_AGE_OFFSET
+
+
+def get_age_bit(age: int) -> int:
+    """Bit of the mask that stands for the given age."""
+    return ELIGIBILITY_AGE_OFFSET + min(max(age - ELIGIBILITY_AGE_MIN, 0), ELIGIBILITY_AGE_BITS - 1)
+
+
+def get_eligibility_key(gender: Optional[str], age: Optional[int]) -> int:
+    """
+    Build the bits a searcher needs in a candidate's accepts_mask.
+
+    Args:
+        gender: Gender of the searcher
+        age: Age of the searcher
+
+    Returns:
+        The key, or 0 if the searcher's gender or age is unknown
+    """
+    if gender not in ELIGIBILITY_GENDER_BITS or age is None:
+        return 0
+    return (1 << ELIGIBILITY_GENDER_BITS[gender]) | (1 << get_age_bit(age))
+
+
+def get_accepts_mask(
+    preferred_gender: Optional[str], preferred_age_min: Optional[int], preferred_age_max: Optional[int]
+) -> int:
+    """
+    Pack the preferences of a profile into an accepts_mask.
+
+    Missing preferences accept nobody, the same way the ranking treats them as a mismatch.
+
+    Args:
+        preferred_gender: Preferred gender
+        preferred_age_min: Minimum preferred age
+        preferred_age_max: Maximum preferred age
+
+    Returns:
+        The packed mask
+    """
+    mask = 0
+    if preferred_gender in ELIGIBILITY_GENDER_BITS:
+        mask |= 1 << ELIGIBILITY_GENDER_BITS[preferred_gender]
+    if preferred_age_min is not None and preferred_age_max is not None and preferred_age_min <= preferred_age_max:
+        low, high = get_age_bit(preferred_age_min), get_age_bit(preferred_age_max)
+        mask |= ((1 << (high - low + 1)) - 1) << low
+    return mask
+
+
+async def refresh_accepts_masks(session: AsyncSession, user_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Rebuild User.accepts_mask from profile preferences.
+
+    Must be called after preferred_gender or the preferred age range of a profile changes.
+
+    Args:
+        session: Database session
+        user_ids: IDs of users whose preferences changed, all users if None
+    """
+    query = select(Profile.user_id, Profile.preferred_gender, Profile.preferred_age_min, Profile.preferred_age_max)
+    if user_ids is not None:
+        query = query.where(Profile.user_id.in_(list(user_ids)))
+
+    result = await session.execute(query)
+    masks = [
+        {'user_id': user_id, 'accepts_mask': get_accepts_mask(preferred_gender, age_min, age_max)}
+        for user_id, preferred_gender, age_min, age_max in result
+    ]
+    if masks:
+        await session.execute(update(User), masks)
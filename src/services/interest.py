@@ -0,0 +1,41 @@
+"""
+Interest service for keeping packed interest bitsets of users up to date.
+"""
+
+from typing import Iterable, Optional
+
+from sqlalchemy import BigInteger, func, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.model.user import User
+from src.model.user_interest import UserInterest
+
+# Width of User.interests_mask; interests beyond it share bits modulo the width
+INTEREST_MASK_BITS = 64
+
+
+async def refresh_interests_masks(session: AsyncSession, user_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Rebuild User.interests_mask from user_interests rows.
+
+    Must be called after UserInterest rows of a user are added or removed.
+
+    Args:
+        session: Database session
+        user_ids: IDs of users whose interests changed, all users if None
+    """
+    mask = (
+        select(
+            func.coalesce(
+                func.bit_or(literal(1, BigInteger).op('<<')((UserInterest.interest_id - 1) % INTEREST_MASK_BITS)),
+                0,
+            )
+        )
+        .where(UserInterest.user_id == User.user_id)
+        .scalar_subquery()
+    )
+    stmt = update(User).values(interests_mask=mask)
+    if user_ids is not None:
+        stmt = stmt.where(User.user_id.in_(list(user_ids)))
+
+    await session.execute(stmt)
@@ -0,0 +1,49 @@
+"""
+Photo service for sending profile photos through Telegram file_ids.
+
+A photo is uploaded to Telegram only the first time it is shown; the file_id from
+that response is stored in Redis and every later send or edit reuses it, so
+Telegram no longer fetches the photo from storage on each card view.
+"""
+
+from typing import Awaitable, Callable, Optional, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InputFile, Message
+
+from src.logger import logger
+from src.metrics import PHOTO_SENDS
+from src.storage.minio_client import get_object_name
+from src.storage.redis import forget_photo_file_id, get_photo_file_id, store_photo_file_id
+
+PhotoSource = Union[str, InputFile]
+
+
+async def send_profile_photo(
+    photo_url: str,
+    send: Callable[[PhotoSource], Awaitable[Union[Message, bool]]],
+    load: Optional[Callable[[], Awaitable[PhotoSource]]] = None,
+) -> None:
+    """
+    Send a profile photo by its file_id, uploading it only if Telegram has not seen it yet.
+
+    Args:
+        photo_url: URL of the photo in storage
+        send: Sends or edits the message with the given photo and returns Telegram's response
+        load: Builds the upload for the first send, the photo URL itself if None
+    """
+    photo_key = get_object_name(photo_url)
+    file_id = await get_photo_file_id(photo_key)
+    if file_id:
+        try:
+            await send(file_id)
+            PHOTO_SENDS.labels(source='file_id').inc()
+            return
+        except TelegramBadRequest as e:
+            logger.warning('Telegram rejected file_id of photo %s, uploading it again: %s', photo_key, e)
+            await forget_photo_file_id(photo_key)
+
+    sent = await send(await load() if load else photo_url)
+    PHOTO_SENDS.labels(source='upload').inc()
+    if isinstance(sent, Message) and sent.photo:
+        await store_photo_file_id(photo_key, sent.photo[-1].file_id)
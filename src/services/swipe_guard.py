@@ -0,0 +1,88 @@
+"""
+Swipe guard service for handling each tap under a profile card once.
+
+A fast double tap fires two callbacks at once. Without a guard both publish an
+interaction and pop a card, so one card is skipped unseen. Callbacks of a user are
+handled one at a time in this process, and a tap on a button that has already been
+claimed, here or by another worker, is answered and dropped before it costs a queue
+publish or a deck pop.
+"""
+
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Set, Tuple
+
+from aiogram.types import CallbackQuery
+
+from src.logger import logger
+from src.metrics import DUPLICATE_TAPS
+from src.storage.redis import claim_tap
+
+
+class SwipeGuard:
+    """Per-user lock with duplicate tap suppression for card callbacks."""
+
+    def __init__(self) -> None:
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.holders: Dict[int, int] = {}
+        self.in_flight: Set[Tuple[int, int, str]] = set()
+
+    @asynccontextmanager
+    async def hold(self, user_id: int, message_id: int, tap: str) -> AsyncIterator[bool]:
+        """
+        Hold the user's lock for the duration of a tap.
+
+        Args:
+            user_id: The ID of the user who tapped the button
+            message_id: The ID of the message the button belongs to
+            tap: What was tapped: the profile id for like/dislike, the callback data otherwise
+
+        Yields:
+            True if the tap should be handled, False if it repeats a claimed one
+        """
+        key = (user_id, message_id, tap)
+        if key in self.in_flight:
+            # The same tap is being handled here already, no need to ask Redis
+            yield False
+            return
+
+        self.in_flight.add(key)
+        lock = self.locks.setdefault(user_id, asyncio.Lock())
+        self.holders[user_id] = self.holders.get(user_id, 0) + 1
+        try:
+            async with lock:
+                yield await claim_tap(user_id, message_id, tap)
+        finally:
+            self.in_flight.discard(key)
+            self.holders[user_id] -= 1
+            if not self.holders[user_id]:
+                # Locks of users with no taps in flight are dropped, so the dictionary does not grow
+                del self.holders[user_id]
+                del self.locks[user_id]
+
+
+swipe_guard = SwipeGuard()
+
+
+def guard_swipe(handler: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Run a card callback handler under the swipe guard, dropping repeated taps."""
+
+    @functools.wraps(handler)
+    async def wrapper(callback: CallbackQuery, *args: Any, **kwargs: Any) -> Any:
+        if not callback.data or not callback.from_user:
+            return await handler(callback, *args, **kwargs)
+
+        message_id = callback.message.message_id if callback.message else 0
+        # Like and dislike under one card share the profile id, so tapping one after the other is a repeat too
+        action, _, target = callback.data.partition('_')
+        tap = target if action in ('like', 'dislike') else callback.data
+        async with swipe_guard.hold(callback.from_user.id, message_id, tap) as first_tap:
+            if not first_tap:
+                DUPLICATE_TAPS.labels(action=action).inc()
+                logger.info('Dropped repeated tap %s from user %s', callback.data, callback.from_user.id)
+                await callback.answer()
+                return None
+            return await handler(callback, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,71 @@
+"""
+Compact binary encoding of profile cards stored in Redis.
+
+A card is a msgpack array whose first element is the format version and the rest
+are the values of CARD_SCHEMAS[version] in order, so field names are not repeated
+in every card. Cards written as JSON objects before the binary format are still
+decoded, which keeps old decks readable during a rollout.
+"""
+
+import json
+from typing import Any, Dict, Optional, Union
+
+import msgpack
+
+# Field order of every card format version; only ever append new versions
+CARD_SCHEMAS = {
+    1: (
+        'user_id',
+        'first_name',
+        'age',
+        'gender',
+        'bio',
+        'photo_url',
+        'profile_score',
+        'activity_score',
+        'likes_count',
+        'dislikes_count',
+    ),
+}
+# Version 2 adds the caption and keyboard rendered by the consumer
+CARD_SCHEMAS[2] = CARD_SCHEMAS[1] + ('caption', 'reply_markup')
+
+# Version written by encode_card
+CARD_FORMAT_VERSION = 2
+
+
+def encode_card(profile: Dict[str, Any]) -> bytes:
+    """
+    Encode a profile card into the current binary format.
+
+    Args:
+        profile: Profile card dictionary; fields missing from the schema are dropped
+
+    Returns:
+        Encoded card
+    """
+    return msgpack.packb([CARD_FORMAT_VERSION, *(profile.get(field) for field in CARD_SCHEMAS[CARD_FORMAT_VERSION])])
+
+
+def is_legacy_card(data: Union[bytes, str]) -> bool:
+    """Check whether the data is a card written as a JSON object."""
+    return data[:1] in (b'{', '{')
+
+
+def decode_card(data: Union[bytes, str, None]) -> Optional[Dict[str, Any]]:
+    """
+    Decode a card written in any known format.
+
+    Args:
+        data: Encoded card or None
+
+    Returns:
+        Profile card dictionary or None if there is no data
+    """
+    if not data:
+        return None
+    if is_legacy_card(data):
+        return json.loads(data)
+
+    version, *values = msgpack.unpackb(data)
+    return dict(zip(CARD_SCHEMAS[version], values))
@@ -0,0 +1,194 @@
+"""
+In-process LRU of profile cards kept coherent by Redis server-assisted client-side caching.
+
+A dedicated RESP3 connection enables CLIENT TRACKING in broadcast mode for the card key
+prefix, so Redis pushes an invalidation for every card that is rewritten, expires or is
+evicted, no matter which connection read it. The cache only serves cards while that
+connection is alive; when it drops, everything cached is discarded because invalidations
+may have been missed. If the server cannot track keys at all, the cache turns itself off
+and every card is read from Redis.
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from redis import asyncio as aioredis
+from redis._parsers import _AsyncRESP3Parser
+from redis.exceptions import ResponseError
+
+from config.redis import get_redis_client
+from config.settings import settings
+from src.logger import logger
+from src.metrics import CARD_CACHE_HIT_RATIO, CARD_CACHE_REQUESTS, CARD_CACHE_SIZE
+
+# Seconds to wait before reconnecting the invalidation connection
+RECONNECT_DELAY = 1
+
+
+class TrackingUnsupported(Exception):
+    """The Redis server refused RESP3 or CLIENT TRACKING, so retrying cannot help."""
+
+
+class CardCache:
+    """
+    Bounded LRU of decoded profile cards keyed by user_id.
+
+    Every invalidation bumps an epoch. A card read from Redis is only stored if the
+    epoch has not moved since the read was issued, so a push that overtakes the reply
+    of a concurrent read cannot leave a stale card behind.
+    """
+
+    def __init__(self, prefix: str, max_size: int) -> None:
+        self.prefix = prefix
+        self.max_size = max_size
+        self.cards: OrderedDict[int, Dict[str, Any]] = OrderedDict()
+        # user_id -> id of the next card in the user's deck, reported by the last pop
+        self.next_ids: OrderedDict[int, int] = OrderedDict()
+        self.epoch = 0
+        self.tracking = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    @property
+    def enabled(self) -> bool:
+        return self.tracking and self.max_size > 0
+
+    def get(self, card_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached card and count the lookup.
+
+        Args:
+            card_id: ID of the profile
+
+        Returns:
+            Copy of the card or None on a miss
+        """
+        card = self.cards.get(card_id) if self.enabled else None
+        if card is None:
+            self.record_miss()
+            return None
+
+        self.cards.move_to_end(card_id)
+        self.hits += 1
+        CARD_CACHE_REQUESTS.labels(result='hit').inc()
+        return dict(card)
+
+    def record_miss(self) -> None:
+        """Count a card that had to be read from Redis."""
+        self.misses += 1
+        CARD_CACHE_REQUESTS.labels(result='miss').inc()
+
+    def put(self, card: Dict[str, Any], epoch: int) -> None:
+        """
+        Store a card read from Redis.
+
+        Args:
+            card: Decoded card
+            epoch: Value of self.epoch taken before the read was sent
+        """
+        if not self.enabled or epoch != self.epoch:
+            return
+
+        self.cards[card['user_id']] = card
+        self.cards.move_to_end(card['user_id'])
+        while len(self.cards) > self.max_size:
+            self.cards.popitem(last=False)
+        CARD_CACHE_SIZE.set(len(self.cards))
+
+    def get_hint(self, user_id: int) -> Optional[int]:
+        """ID of the next card in the user's deck if that card is cached."""
+        card_id = self.next_ids.get(user_id)
+        if card_id is not None and self.enabled and card_id in self.cards:
+            return card_id
+        return None
+
+    def set_hint(self, user_id: int, card_id: Optional[int]) -> None:
+        """Remember the next card in the user's deck reported by a pop."""
+        if card_id is None or not self.enabled:
+            self.next_ids.pop(user_id, None)
+            return
+
+        self.next_ids[user_id] = card_id
+        self.next_ids.move_to_end(user_id)
+        while len(self.next_ids) > self.max_size:
+            self.next_ids.popitem(last=False)
+
+    def invalidate(self, keys: Optional[Iterable[bytes]]) -> None:
+        """
+        Drop cards whose keys changed in Redis.
+
+        Args:
+            keys: Invalidated keys, None if Redis flushed the whole database
+        """
+        self.epoch += 1
+        if keys is None:
+            self.cards.clear()
+        else:
+            for key in keys:
+                card_id = key[len(self.prefix) :]
+                if card_id.isdigit():
+                    self.cards.pop(int(card_id), None)
+        CARD_CACHE_SIZE.set(len(self.cards))
+
+    def reset(self) -> None:
+        """Forget every card; used when invalidations may have been lost."""
+        self.tracking = False
+        self.invalidate(None)
+        self.next_ids.clear()
+
+    def handle_push(self, response: List[Any]) -> None:
+        if response and response[0] == b'invalidate':
+            self.invalidate(response[1])
+
+    async def track(self) -> None:
+        """Enable tracking on a dedicated connection and apply its invalidations until it drops."""
+        redis = get_redis_client(decode_responses=False)
+        # Push handlers only exist on the pure Python RESP3 parser; the hiredis one, picked by
+        # default when hiredis is installed, would drop the invalidations
+        connection = aioredis.Connection(
+            **{**redis.connection_pool.connection_kwargs, 'protocol': 3, 'parser_class': _AsyncRESP3Parser}
+        )
+        try:
+            try:
+                await connection.connect()
+                connection._parser.set_push_handler(self.handle_push)
+                await connection.send_command('CLIENT', 'TRACKING', 'ON', 'BCAST', 'PREFIX', self.prefix)
+                await connection.read_response()
+            except ResponseError as e:
+                # HELLO 3 or CLIENT TRACKING is unknown to the server (Redis before 6)
+                raise TrackingUnsupported(str(e)) from e
+            self.tracking = True
+            logger.info('Card cache is tracking %s* keys', self.prefix)
+
+            while True:
+                # Pushes are handled by the parser while we wait; a quiet connection is pinged
+                if await connection.read_response(timeout=settings.REDIS_HEALTH_CHECK_INTERVAL) is None:
+                    await connection.send_command('PING')
+                    await connection.read_response()
+        finally:
+            self.reset()
+            await connection.disconnect()
+
+    async def run(self) -> None:
+        """Keep the invalidation connection up for the lifetime of the bot."""
+        if self.max_size <= 0:
+            return
+
+        CARD_CACHE_HIT_RATIO.set_function(lambda: self.hits / (self.hits + self.misses or 1))
+        while True:
+            try:
+                await self.track()
+            except asyncio.CancelledError:
+                raise
+            except TrackingUnsupported as e:
+                logger.warning('Card cache disabled, Redis does not support client tracking: %s', e)
+                self.max_size = 0
+                return
+            except Exception as e:
+                logger.error('Card cache lost its invalidation connection: %s', e)
+
+            await asyncio.sleep(RECONNECT_DELAY)
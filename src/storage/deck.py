@@ -0,0 +1,171 @@
+"""
+Deck storage backends behind the bot's deck operations.
+
+RedisDeckStore keeps decks in Redis, where the consumer writes them. MemoryDeckStore keeps
+them in a bounded in-process store with the same semantics: decks hold ids of shared cards,
+expire DECK_TTL after the last write or swipe, skip cards that are gone, and ask for
+a refill once per DECK_REFILL_FLAG_TTL below the low watermark. It needs no Redis,
+so it only suits a process that both writes and reads decks, such as benchmarks and
+tests, which create it directly. The bot always uses Redis, because decks are written
+by the consumer, another process.
+"""
+
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from src.logger import logger
+from src.storage import redis
+
+
+class RedisDeckStore:
+    """Decks in Redis, shared by every bot and consumer process."""
+
+    async def store_user_profiles(self, user_id: int, profiles: List[dict]) -> None:
+        await redis.store_user_profiles(user_id, profiles)
+
+    async def get_user_profiles(self, user_id: int) -> Optional[List[dict]]:
+        return await redis.get_user_profiles(user_id)
+
+    async def get_next_profile(self, user_id: int) -> Tuple[Optional[dict], int, bool]:
+        return await redis.get_next_profile(user_id)
+
+    async def get_deck_length(self, user_id: int) -> int:
+        return await redis.get_deck_length(user_id)
+
+
+class MemoryDeckStore:
+    """
+    Bounded in-process decks.
+
+    Decks and cards are kept in LRU order; the least recently used ones are dropped
+    once there are more than max_decks decks or max_cards cards, the same way Redis
+    would evict them under maxmemory.
+    """
+
+    def __init__(self, max_decks: int, max_cards: int) -> None:
+        self.max_decks = max_decks
+        self.max_cards = max_cards
+        # user_id -> (ids of the cards, expiry time)
+        self.decks: OrderedDict[int, Tuple[Deque[int], float]] = OrderedDict()
+        # user_id -> (card, expiry time)
+        self.cards: OrderedDict[int, Tuple[Dict[str, Any], float]] = OrderedDict()
+        # user_id -> expiry time of the refill flag
+        self.refill_flags: Dict[int, float] = {}
+
+    def _get_deck(self, user_id: int, now: float) -> Optional[Deque[int]]:
+        deck = self.decks.get(user_id)
+        if deck is None:
+            return None
+        if deck[1] <= now:
+            del self.decks[user_id]
+            return None
+        self.decks.move_to_end(user_id)
+        return deck[0]
+
+    def _get_card(self, card_id: int, now: float) -> Optional[Dict[str, Any]]:
+        card = self.cards.get(card_id)
+        if card is None:
+            return None
+        if card[1] <= now:
+            del self.cards[card_id]
+            return None
+        self.cards.move_to_end(card_id)
+        return dict(card[0])
+
+    async def store_user_profiles(self, user_id: int, profiles: List[dict]) -> None:
+        """
+        Store user profiles as a list of ids, replacing the previous one.
+
+        Args:
+            user_id: The ID of the user
+            profiles: List of profile dictionaries to store
+        """
+        if not profiles:
+            self.decks.pop(user_id, None)
+            return
+
+        expires_at = time.monotonic() + settings.DECK_TTL
+        for profile in profiles:
+            self.cards[profile['user_id']] = (dict(profile), expires_at)
+            self.cards.move_to_end(profile['user_id'])
+        while len(self.cards) > self.max_cards:
+            self.cards.popitem(last=False)
+
+        self.decks[user_id] = (deque(profile['user_id'] for profile in profiles), expires_at)
+        self.decks.move_to_end(user_id)
+        while len(self.decks) > self.max_decks:
+            self.decks.popitem(last=False)
+
+        # A new deck has arrived, so the next low watermark may request a refill again
+        self.refill_flags.pop(user_id, None)
+        logger.info('Stored %d profiles for user %s in memory', len(profiles), user_id)
+
+    async def get_user_profiles(self, user_id: int) -> Optional[List[dict]]:
+        """
+        Get user profiles without removing them from the deck.
+
+        Args:
+            user_id: The ID of the user
+
+        Returns:
+            List of profile dictionaries or None if not found
+        """
+        now = time.monotonic()
+        deck = self._get_deck(user_id, now)
+        if not deck:
+            return None
+
+        profiles = [self._get_card(card_id, now) for card_id in deck]
+        return [profile for profile in profiles if profile]
+
+    async def get_next_profile(self, user_id: int) -> Tuple[Optional[dict], int, bool]:
+        """
+        Pop the next profile from the user's deck.
+
+        Args:
+            user_id: The ID of the user
+
+        Returns:
+            The next profile dictionary (None if the deck is empty), the number of profiles
+            left and whether the caller should request a refill
+        """
+        now = time.monotonic()
+        deck = self._get_deck(user_id, now)
+        profile = None
+        while deck and profile is None:
+            profile = self._get_card(deck.popleft(), now)
+
+        remaining = len(deck) if deck else 0
+        if remaining:
+            # A deck in use lives DECK_TTL after the last swipe, not after it was written
+            self.decks[user_id] = (deck, now + settings.DECK_TTL)
+        else:
+            self.decks.pop(user_id, None)
+
+        refill = False
+        if remaining < settings.DECK_LOW_WATERMARK and self.refill_flags.get(user_id, 0) <= now:
+            self.refill_flags[user_id] = now + settings.DECK_REFILL_FLAG_TTL
+            refill = True
+            if len(self.refill_flags) > self.max_decks:
+                self.refill_flags = {
+                    key: expires_at for key, expires_at in self.refill_flags.items() if expires_at > now
+                }
+        return profile, remaining, refill
+
+    async def get_deck_length(self, user_id: int) -> int:
+        """
+        Get the number of profiles left in the user's deck.
+
+        Args:
+            user_id: The ID of the user
+
+        Returns:
+            Number of card ids in the deck, 0 if there is no deck
+        """
+        deck = self._get_deck(user_id, time.monotonic())
+        return len(deck) if deck else 0
+
+
+deck_store = RedisDeckStore()
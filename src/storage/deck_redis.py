@@ -0,0 +1,148 @@
+"""
+Layout of decks and shared profile cards in Redis, used by both the bot and the consumer.
+
+A deck is a list of user_ids under user:{id}:profiles; the cards themselves are one
+hash per profile under card:{id} with the encoded card (see src.storage.card) and its
+version. Both processes write and pop decks through the helpers here, so the key
+names, TTLs, the atomic replacement and the pop script cannot drift apart.
+"""
+
+from typing import List, Optional, Tuple
+from uuid import uuid4
+
+from redis import asyncio as aioredis
+from redis.asyncio.client import Pipeline
+
+from config.settings import settings
+from src.storage.card import encode_card
+
+# Shared profile cards; decks only hold user_ids and cards are looked up when a profile is served
+CARD_KEY_PREFIX = 'card:'
+
+# Channel the bot listens on; a user_id is published once a deck for that user is stored
+DECK_READY_CHANNEL = 'decks:ready'
+
+# Pops the next profile and reports how many are left in one atomic step.
+# Ids whose card has expired are skipped. When the deck drops below the watermark,
+# only the caller that manages to set the refill flag is told to request a refill;
+# the flag is cleared with the new deck. The card is not sent back when its id is
+# the one the caller has cached (ARGV[5]), and the id of the next card is returned
+# so the caller can name it on the following pop.
+POP_PROFILE_SCRIPT = """
+local entry, data = false, false
+local found = false
+repeat
+    entry = redis.call('LPOP', KEYS[1])
+    if not entry then
+        break
+    end
+    if string.sub(entry, 1, 1) == '{' then
+        -- Decks written before cards were shared hold the JSON card itself
+        data = entry
+        found = true
+    elseif entry == ARGV[5] then
+        data = false
+        found = redis.call('EXISTS', ARGV[3] .. entry) == 1
+    else
+        data = redis.call('HGET', ARGV[3] .. entry, 'data')
+        found = data ~= false
+    end
+until found
+local remaining = redis.call('LLEN', KEYS[1])
+if remaining > 0 then
+    -- A deck in use lives DECK_TTL after the last swipe, not after it was written
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+end
+local refill = 0
+if remaining < tonumber(ARGV[1]) and redis.call('SET', KEYS[2], 1, 'NX', 'EX', ARGV[2]) then
+    refill = 1
+end
+return {entry, data, remaining, refill, redis.call('LINDEX', KEYS[1], 0)}
+"""
+
+
+def queue_card_writes(pipe: Pipeline, profiles: List[dict]) -> None:
+    """
+    Queue the commands writing shared profile cards into a pipeline.
+
+    Every write bumps the card version, so readers caching a card can tell it changed.
+
+    Args:
+        pipe: Pipeline to queue the commands into
+        profiles: List of profile dictionaries to store
+    """
+    for profile in profiles:
+        key = f"{CARD_KEY_PREFIX}{profile['user_id']}"
+        pipe.hset(key, 'data', encode_card(profile))
+        pipe.hincrby(key, 'version', 1)
+        pipe.expire(key, settings.DECK_TTL)
+
+
+def queue_deck_write(pipe: Pipeline, user_id: int, profiles: List[dict], replace: bool) -> None:
+    """
+    Queue the commands writing a profile list into a pipeline.
+
+    The list holds only user_ids, the cards themselves are written once per profile.
+    A replacement is built under a temporary key and renamed over the live one,
+    so with MULTI/EXEC readers never see an empty or half-built deck.
+    A non-empty write ends with a deck-ready message, published only after the deck
+    is in place, so a user waiting for it gets the first card without pressing Refresh.
+
+    Args:
+        pipe: Pipeline to queue the commands into
+        user_id: The ID of the user
+        profiles: List of profile dictionaries to store
+        replace: Drop the old list instead of appending to it
+    """
+    key = f"user:{user_id}:profiles"
+
+    if not profiles:
+        if replace:
+            pipe.delete(key)
+        return
+
+    # A new deck has arrived, so the next low watermark may request a refill again
+    pipe.delete(f"user:{user_id}:refill_pending")
+
+    queue_card_writes(pipe, profiles)
+    payload = [profile['user_id'] for profile in profiles]
+    if replace:
+        # RENAME keeps the TTL of the temporary key
+        tmp_key = f"{key}:tmp:{uuid4().hex}"
+        pipe.rpush(tmp_key, *payload)
+        pipe.expire(tmp_key, settings.DECK_TTL)
+        pipe.rename(tmp_key, key)
+    else:
+        pipe.rpush(key, *payload)
+        pipe.expire(key, settings.DECK_TTL)
+    pipe.publish(DECK_READY_CHANNEL, user_id)
+
+
+async def pop_deck_entry(
+    redis: aioredis.Redis, user_id: int, low_watermark: int, cached_card_id: Optional[int] = None
+) -> Tuple[Optional[bytes], Optional[bytes], int, bool, Optional[bytes]]:
+    """
+    Pop the next entry of the user's profile list with POP_PROFILE_SCRIPT.
+
+    Args:
+        redis: Client returning raw bytes
+        user_id: The ID of the user
+        low_watermark: Ask for a refill once fewer profiles are left; 0 never asks
+        cached_card_id: ID of a card the caller has cached, whose data need not be sent back
+
+    Returns:
+        The popped entry, its card data (None when skipped as cached), the number of
+        profiles left, whether the caller should request a refill and the next entry
+    """
+    pop_profile = redis.register_script(POP_PROFILE_SCRIPT)
+    entry, data, remaining, refill, next_entry = await pop_profile(
+        keys=[f"user:{user_id}:profiles", f"user:{user_id}:refill_pending"],
+        args=[
+            low_watermark,
+            settings.DECK_REFILL_FLAG_TTL,
+            CARD_KEY_PREFIX,
+            settings.DECK_TTL,
+            cached_card_id if cached_card_id is not None else '',
+        ],
+    )
+    return entry, data, remaining, bool(refill), next_entry
@@ -1,5 +1,6 @@
 import io
 from io import BytesIO
+from urllib.parse import unquote, urlsplit
 
 from minio import Minio
 
@@ -96,3 +97,23 @@ def check_minio_connection() -> bool:
     except Exception as e:
         logger.error('Ошибка подключения к MinIO: %s', e)
         return False
+
+
+def get_object_name(url: str) -> str:
+    """
+    Возвращает имя объекта по подписанному URL.
+
+    Подпись в URL меняется при каждом вызове get_file_path, а имя объекта нет,
+    поэтому по нему можно узнавать одну и ту же фотографию.
+
+    Args:
+        url (str): Подписанный URL или любой другой URL фотографии.
+
+    Returns:
+        str: Имя объекта в бакете или URL без параметров, если он указывает не на бакет.
+    """
+    parts = urlsplit(url)
+    prefix = f'/{settings.MINIO_BUCKET_NAME}/'
+    if parts.path.startswith(prefix):
+        return unquote(parts.path[len(prefix) :])
+    return f'{parts.netloc}{parts.path}'
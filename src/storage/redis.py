@@ -1,38 +1,46 @@
-import json
-from typing import List, Optional, Set
+from typing import List, Optional, Set, Tuple
 
 from redis import asyncio as aioredis
+
+from config.redis import get_redis_client
+from config.settings import settings
 from src.logger import logger
+from src.storage.card import decode_card, is_legacy_card
+from src.storage.card_cache import CardCache
+from src.storage.deck_redis import CARD_KEY_PREFIX, pop_deck_entry, queue_deck_write
+
+# Hash photo object name -> Telegram file_id of the photo once it has been sent
+PHOTO_FILE_IDS_KEY = 'photo:file_ids'
 
-# Redis connection pool
-redis_pool = aioredis.ConnectionPool(
-    host='redis', port=6379, db=0, decode_responses=True  # Using service name from docker-compose
-)
+card_cache = CardCache(CARD_KEY_PREFIX, settings.CARD_CACHE_SIZE)
 
 
 async def get_redis() -> aioredis.Redis:
-    """Get Redis connection from the pool."""
-    return aioredis.Redis(connection_pool=redis_pool)
+    """Get the shared Redis client."""
+    return get_redis_client()
+
+
+async def get_raw_redis() -> aioredis.Redis:
+    """Get Redis connection that returns raw bytes."""
+    return get_redis_client(decode_responses=False)
 
 
 async def store_user_profiles(user_id: int, profiles: List[dict]) -> None:
     """
-    Store user profiles in Redis as a list.
+    Store user profiles in Redis as a list of ids, replacing the previous one.
+
+    The deck is written the same way the consumer writes it (see src.storage.deck_redis).
 
     Args:
         user_id: The ID of the user
         profiles: List of profile dictionaries to store
     """
     redis = await get_redis()
-    key = f"user:{user_id}:profiles"
 
     try:
-        # Clear existing profiles for this user
-        await redis.delete(key)
-
-        # Store each profile as a separate JSON string in the list
-        for profile in profiles:
-            await redis.rpush(key, json.dumps(profile))
+        async with redis.pipeline(transaction=True) as pipe:
+            queue_deck_write(pipe, user_id, profiles, replace=True)
+            await pipe.execute()
 
         logger.info('Stored %d profiles for user %s in Redis', len(profiles), user_id)
     except Exception as e:
@@ -50,15 +58,30 @@ async def get_user_profiles(user_id: int) -> Optional[List[dict]]:
     Returns:
         List of profile dictionaries or None if not found
     """
-    redis = await get_redis()
+    redis = await get_raw_redis()
     key = f"user:{user_id}:profiles"
 
     try:
-        # Get all profiles from the list
-        data = await redis.lrange(key, 0, -1)
-        if data:
-            # Parse each JSON string in the list
-            profiles = [json.loads(profile) for profile in data]
+        # Get all profile ids from the list; cards missing from the local cache are read from Redis
+        entries = await redis.lrange(key, 0, -1)
+        if entries:
+            cards = {}
+            for entry in entries:
+                if not is_legacy_card(entry):
+                    cards[entry] = card_cache.get(int(entry))
+            missing = [card_id for card_id, card in cards.items() if card is None]
+            if missing:
+                epoch = card_cache.epoch
+                async with redis.pipeline(transaction=False) as pipe:
+                    for card_id in missing:
+                        pipe.hget(f"{CARD_KEY_PREFIX}{int(card_id)}", 'data')
+                    for card_id, data in zip(missing, await pipe.execute()):
+                        cards[card_id] = decode_card(data)
+                        if cards[card_id]:
+                            card_cache.put(cards[card_id], epoch)
+            # Legacy decks hold JSON cards themselves, cards that have already expired are skipped
+            profiles = [decode_card(entry) if is_legacy_card(entry) else cards[entry] for entry in entries]
+            profiles = [profile for profile in profiles if profile]
             logger.info('Retrieved %d profiles for user %s from Redis', len(profiles), user_id)
             return profiles
         return None
@@ -67,32 +90,132 @@ async def get_user_profiles(user_id: int) -> Optional[List[dict]]:
         raise
 
 
-async def get_next_profile(user_id: int) -> Optional[dict]:
+async def get_next_profile(user_id: int) -> Tuple[Optional[dict], int, bool]:
     """
-    Get the next profile from the user's profile list.
+    Pop the next profile from the user's profile list.
 
     Args:
         user_id: The ID of the user
 
     Returns:
-        The next profile dictionary or None if not found
+        The next profile dictionary (None if the list is empty), the number of profiles
+        left and whether the caller should request a refill
     """
-    redis = await get_redis()
-    key = f"user:{user_id}:profiles"
+    redis = await get_raw_redis()
 
     try:
-        # Get the first profile from the list
-        data = await redis.lpop(key)
-        if data:
-            profile = json.loads(data)
-            logger.info('Retrieved next profile for user %s from Redis', user_id)
-            return profile
-        return None
+        hint = card_cache.get_hint(user_id)
+        epoch = card_cache.epoch
+        entry, data, remaining, refill, next_entry = await pop_deck_entry(
+            redis, user_id, settings.DECK_LOW_WATERMARK, hint
+        )
+        card_cache.set_hint(user_id, int(next_entry) if next_entry and not is_legacy_card(next_entry) else None)
+
+        if data or not entry:
+            profile = decode_card(data)
+            if profile and not is_legacy_card(data):
+                card_cache.record_miss()
+                card_cache.put(profile, epoch)
+        else:
+            # The card was skipped because it is cached; it may have been invalidated since
+            profile = card_cache.get(int(entry))
+            if profile is None:
+                profile = decode_card(await redis.hget(f"{CARD_KEY_PREFIX}{int(entry)}", 'data'))
+
+        if profile:
+            logger.info('Retrieved next profile for user %s from Redis, %d left', user_id, remaining)
+        return profile, remaining, refill
     except Exception as e:
         logger.error('Error retrieving next profile from Redis for user %s: %s', user_id, e)
         raise
 
 
+async def get_deck_length(user_id: int) -> int:
+    """
+    Get the number of profiles left in the user's profile list.
+
+    Args:
+        user_id: The ID of the user
+
+    Returns:
+        Number of profile ids in the list, 0 if there is no list
+    """
+    redis = await get_redis()
+
+    try:
+        return await redis.llen(f"user:{user_id}:profiles")
+    except Exception as e:
+        logger.error('Error retrieving deck length from Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def store_waiting_message(user_id: int, chat_id: int, message_id: int) -> None:
+    """
+    Remember the "please wait" message shown to a user with an empty deck.
+
+    Args:
+        user_id: The ID of the user
+        chat_id: Chat the message was sent to
+        message_id: The ID of the message to replace with the first card
+    """
+    redis = await get_redis()
+
+    try:
+        await redis.set(f"user:{user_id}:waiting_message", f"{chat_id}:{message_id}", ex=settings.DECK_WAIT_TTL)
+    except Exception as e:
+        logger.error('Error storing waiting message in Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def take_waiting_message(user_id: int) -> Optional[Tuple[int, int]]:
+    """
+    Take the "please wait" message of a user, so only one caller replaces it.
+
+    Args:
+        user_id: The ID of the user
+
+    Returns:
+        Chat and message IDs, or None if the user is not waiting for a deck
+    """
+    redis = await get_redis()
+
+    try:
+        waiting = await redis.getdel(f"user:{user_id}:waiting_message")
+        if not waiting:
+            return None
+        chat_id, message_id = waiting.split(':')
+        return int(chat_id), int(message_id)
+    except Exception as e:
+        logger.error('Error retrieving waiting message from Redis for user %s: %s', user_id, e)
+        raise
+
+
+async def claim_tap(user_id: int, message_id: int, tap: str) -> bool:
+    """
+    Claim a button tap, so a repeated tap on the same card is handled only once.
+
+    The claim is not released: the card message is edited in place, and a repeated
+    tap still carries the old button data, so it must be dropped even after the
+    first one has been handled.
+
+    Args:
+        user_id: The ID of the user who tapped the button
+        message_id: The ID of the message the button belongs to
+        tap: What was tapped, the profile id for like/dislike
+
+    Returns:
+        True for the first tap, False for a repeated one
+    """
+    redis = await get_redis()
+
+    try:
+        claimed = await redis.set(f"tap:{user_id}:{message_id}:{tap}", 1, nx=True, ex=settings.SWIPE_GUARD_TTL)
+        return bool(claimed)
+    except Exception as e:
+        logger.error('Error claiming tap of user %s in Redis: %s', user_id, e)
+        raise
+
+
 async def store_like(user_id: int, target_user_id: int) -> None:
     """
     Store a like in Redis.
@@ -134,3 +257,56 @@ async def get_likes(user_id: int) -> Set[str]:
     except Exception as e:
         logger.error('Error retrieving likes from Redis for user %s: %s', user_id, e)
         raise
+
+
+async def get_photo_file_id(photo_key: str) -> Optional[str]:
+    """
+    Get the Telegram file_id a photo was given when it was first sent.
+
+    Args:
+        photo_key: Object name of the photo in storage
+
+    Returns:
+        The file_id or None if the photo has not been sent yet
+    """
+    redis = await get_redis()
+
+    try:
+        return await redis.hget(PHOTO_FILE_IDS_KEY, photo_key)
+    except Exception as e:
+        logger.error('Error retrieving file_id of photo %s from Redis: %s', photo_key, e)
+        raise
+
+
+async def store_photo_file_id(photo_key: str, file_id: str) -> None:
+    """
+    Remember the Telegram file_id of a photo so it is never uploaded again.
+
+    Args:
+        photo_key: Object name of the photo in storage
+        file_id: file_id from Telegram's response
+    """
+    redis = await get_redis()
+
+    try:
+        await redis.hset(PHOTO_FILE_IDS_KEY, photo_key, file_id)
+        logger.info('Stored file_id of photo %s in Redis', photo_key)
+    except Exception as e:
+        logger.error('Error storing file_id of photo %s in Redis: %s', photo_key, e)
+        raise
+
+
+async def forget_photo_file_id(photo_key: str) -> None:
+    """
+    Drop the file_id of a photo whose object was replaced or rejected by Telegram.
+
+    Args:
+        photo_key: Object name of the photo in storage
+    """
+    redis = await get_redis()
+
+    try:
+        await redis.hdel(PHOTO_FILE_IDS_KEY, photo_key)
+    except Exception as e:
+        logger.error('Error removing file_id of photo %s from Redis: %s', photo_key, e)
+        raise
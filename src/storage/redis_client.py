@@ -1,10 +1,7 @@
-from redis.asyncio import ConnectionPool, Redis
+from config.redis import get_redis_client
 
-from config.settings import settings
-
-# Настройка пула подключений
-pool = ConnectionPool(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
-redis_storage = Redis(connection_pool=pool)
+# Общий клиент процесса; ответы не декодируются, как ожидает RedisStorage aiogram
+redis_storage = get_redis_client(decode_responses=False)
 
 
 async def set_user_state(user_id: int, state: str) -> None: